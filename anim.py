@@ -16,39 +16,98 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import logging
+
 from gi.repository import GLib
 
+from framestats import FrameStats
+
+_logger = logging.getLogger('implode-activity.anim')
+
 # Animation timer interval (in msec)
 _TIMER_INTERVAL = 20
 
 
 class Anim(object):
     """Manages an animation."""
-    def __init__(self, update_func, end_anim_func):
+    def __init__(self, update_func, end_anim_func, widget=None):
         """update_func is a function returns True if the animation should
            continue, False otherwise.  end_anim_func is a function that takes a
-           boolean indicating whether the animation was stopped prematurely."""
+           boolean indicating whether the animation was stopped prematurely.
+           If widget is given, update_func is called once per frame from the
+           widget's frame clock, in step with the display, and otherwise it
+           is called from a timer."""
         self._update_func = update_func
         self._end_anim_func = end_anim_func
+        self._widget = widget
+        self._tick_id = None
+        self._unmap_id = None
         self._animating = False
+        self._frame_stats = FrameStats()
 
     def start(self):
         self._animating = True
+        self._frame_stats = FrameStats()
         self._update_func()
-        GLib.timeout_add(_TIMER_INTERVAL, self._timer)
+        # An unmapped widget gets no frames, so it would never finish.
+        if self._widget is not None and self._widget.get_mapped():
+            self._tick_id = self._widget.add_tick_callback(self._tick)
+            # The frame clock also stops if the widget is unmapped part way
+            # through, so finish on the timer instead.
+            self._unmap_id = self._widget.connect('unmap', self._unmap_cb)
+        else:
+            GLib.timeout_add(_TIMER_INTERVAL, self._timer)
 
     def stop(self):
         if self._animating:
+            self._remove_tick()
             self._end_anim(anim_stopped=True)
 
+    def get_frame_stats(self):
+        """Returns the FrameStats for the frames of the animation so far."""
+        return self._frame_stats
+
     def _timer(self):
         if not self._animating:
             return False
+        self._frame_stats.add_frame(GLib.get_monotonic_time() / 1e6,
+                                    _TIMER_INTERVAL / 1000.0)
+        if self._update_func():
+            return True
+        self._end_anim(anim_stopped=False)
+        return False
+
+    def _remove_tick(self):
+        # Stops updating from the widget's frame clock.
+        if self._tick_id is not None:
+            self._widget.remove_tick_callback(self._tick_id)
+            self._tick_id = None
+        if self._unmap_id is not None:
+            self._widget.disconnect(self._unmap_id)
+            self._unmap_id = None
+
+    def _unmap_cb(self, widget):
+        self._remove_tick()
+        if self._animating:
+            GLib.timeout_add(_TIMER_INTERVAL, self._timer)
+
+    def _tick(self, widget, frame_clock):
+        if not self._animating:
+            return False
+        frame_time = frame_clock.get_frame_time()
+        (refresh_interval, presentation_time) = \
+            frame_clock.get_refresh_info(frame_time)
+        self._frame_stats.add_frame(frame_time / 1e6,
+                                    refresh_interval / 1e6)
         if self._update_func():
             return True
+        # Returning False removes the tick callback itself.
+        self._tick_id = None
+        self._remove_tick()
         self._end_anim(anim_stopped=False)
         return False
 
     def _end_anim(self, anim_stopped):
         self._animating = False
+        _logger.debug('Animation frames: %r', self._frame_stats.get_summary())
         self._end_anim_func(anim_stopped=anim_stopped)
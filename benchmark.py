@@ -0,0 +1,345 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Benchmarks for the board, generator and renderer hot paths.
+#
+# Run "python3 benchmark.py" to run them all and print the average time of
+# each, or give the names of benchmark groups to run just those.  With
+# --json FILE, the results are also written as JSON (to standard output for
+# "-"), for comparing runs over time.  The boards used are generated from
+# fixed seeds, so runs are comparable from one version to the next.
+#
+# The drawing benchmarks need cairo, and are skipped without it.
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import board
+import boardgen
+import history
+import savegame
+
+# Minimum amount of time to spend timing each function, in seconds.
+_MIN_TIME = 0.2
+
+# Size of the surface used by the drawing benchmarks, in pixels.
+_DRAW_SIZE = (1200, 900)
+
+
+def _time(func):
+    # Returns the average time taken by a call to func, in seconds.
+    count = 0
+    start_time = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        delta = time.perf_counter() - start_time
+        if delta >= _MIN_TIME:
+            return delta / count
+
+
+def _make_stuck_board(width, height):
+    # Returns a board with no moves, which is the worst case for lose
+    # detection.
+    b = board.Board()
+    for x in range(width):
+        for y in range(height):
+            b.set_value(x, y, 1 + (x + y) % 2)
+    return b
+
+
+def _get_level_boards():
+    # Returns a list of (name, board, winning moves) tuples for each
+    # difficulty level.
+    boards = []
+    for (level, (size, fragmentation)) in sorted(boardgen.LEVELS.items()):
+        (b, winning_moves) = boardgen.generate_board(
+            seed=0, fragmentation=fragmentation, max_size=size)
+        boards.append(('level %d' % level, b, winning_moves))
+    return boards
+
+
+def _get_test_boards():
+    # Returns a list of (name, board) pairs covering each difficulty level
+    # and some larger synthetic boards.
+    boards = [(name, b) for (name, b, winning_moves) in _get_level_boards()]
+    for size in ((30, 20), (100, 100)):
+        boards.append(('test %dx%d' % size, board.make_test_board(*size)))
+        boards.append(('stuck %dx%d' % size, _make_stuck_board(*size)))
+    return boards
+
+
+def _get_game_state(b, winning_moves):
+    # Returns a game state dictionary, as from ImplodeGame.get_game_state(),
+    # for a game half way through the winning moves with the last move
+    # undone.
+    b = b.clone()
+    records = []
+    for move in winning_moves[:max(2, len(winning_moves) // 2)]:
+        records.append(history.make_move(b, b.get_contiguous(*move)))
+    records[-1].undo(b)
+    return {
+        'difficulty': 0,
+        'seed': 0,
+        'size': (b.width, b.height),
+        'fragmentation': 0,
+        'board': savegame.encode_board(b),
+        'undo_moves': [record.encode() for record in records[:-1]],
+        'redo_moves': [records[-1].encode()],
+        'win_draw_flag': False,
+        'win_color': 0,
+        'winning_moves': winning_moves,
+    }
+
+
+def bench_generate():
+    results = []
+    for (level, (size, fragmentation)) in sorted(boardgen.LEVELS.items()):
+        def func():
+            boardgen.generate_board(seed=0, fragmentation=fragmentation,
+                                    max_size=size)
+        results.append(('generate_board level %d' % level, _time(func)))
+    return results
+
+
+def bench_contiguous():
+    results = []
+    for (name, b) in _get_test_boards():
+        results.append(('get_all_contiguous %s' % name,
+                        _time(b.get_all_contiguous)))
+        results.append(('has_any_move %s' % name, _time(b.has_any_move)))
+        results.append(('iter_moves %s' % name,
+                        _time(lambda: list(b.iter_moves()))))
+    return results
+
+
+def bench_board():
+    # The move benchmark includes a clone of the board, which is timed
+    # separately.
+    results = []
+    for (name, b, winning_moves) in _get_level_boards():
+        for board_class in (board.Board, board.ArrayBoard):
+            b2 = board_class()
+            for ((x, y), value) in b.get_value_map().items():
+                b2.set_value(x, y, value)
+            contiguous = b2.get_contiguous(*winning_moves[0])
+
+            def move():
+                b3 = b2.clone()
+                b3.clear_pieces(contiguous)
+                b3.drop_pieces()
+                b3.remove_empty_columns()
+
+            def apply_move():
+                b2.clone().apply_move(contiguous)
+
+            class_name = board_class.__name__
+            results.append(('clone %s %s' % (class_name, name),
+                            _time(b2.clone)))
+            results.append(('move %s %s' % (class_name, name), _time(move)))
+            results.append(('apply_move %s %s' % (class_name, name),
+                            _time(apply_move)))
+    return results
+
+
+def bench_save():
+    results = []
+    for (name, b, winning_moves) in _get_level_boards():
+        state = _get_game_state(b, winning_moves)
+        data = savegame.dumps(state)
+        results.append(('save %s' % name,
+                        _time(lambda: savegame.dumps(state))))
+        results.append(('load %s' % name,
+                        _time(lambda: savegame.loads(data))))
+    return results
+
+
+def bench_draw():
+    try:
+        import drawers
+        import offscreen
+    except ImportError:
+        print('Skipping drawing benchmarks (cairo is needed)',
+              file=sys.stderr)
+        return []
+    canvas = offscreen.Canvas(*_DRAW_SIZE)
+    results = []
+    for mode in (drawers.DRAW_BLOCKS, drawers.DRAW_SPRITES,
+                 drawers.DRAW_BATCHED):
+        for (name, b) in _get_test_boards():
+            drawer = drawers.BoardDrawer(canvas.get_size,
+                                         canvas.invalidate_rect)
+            drawer.set_board(b)
+            drawer.set_draw_mode(mode)
+
+            def draw():
+                # Resizing throws away the cached board surface and sprites.
+                drawer.resize(*_DRAW_SIZE)
+                canvas.draw(drawer)
+
+            results.append(('draw %s %s' % (mode, name), _time(draw)))
+            if mode == drawers.DRAW_SPRITES:
+                results.append(('redraw %s' % name,
+                                _time(lambda: canvas.draw(drawer))))
+    return results
+
+
+def bench_frame():
+    # Times a frame half way through the removal of the largest shape on
+    # each board, and half way through the win animation, with the number of
+    # fills in each frame.
+    try:
+        import cairo
+        import drawers
+        import offscreen
+    except ImportError:
+        print('Skipping drawing benchmarks (cairo is needed)',
+              file=sys.stderr)
+        return []
+    canvas = offscreen.Canvas(*_DRAW_SIZE)
+    cases = []
+    for (name, b) in _get_test_boards():
+        drawer = drawers.RemovalDrawer(canvas.get_size,
+                                       canvas.invalidate_rect)
+        drawer.init(b, _get_largest_transition(b))
+        cases.append(('removal %s' % name, drawer))
+    drawer = drawers.WinDrawer(canvas.get_size, canvas.invalidate_rect)
+    drawer.init(0)
+    cases.append(('win', drawer))
+
+    results = []
+    for mode in (drawers.DRAW_BLOCKS, drawers.DRAW_SPRITES,
+                 drawers.DRAW_BATCHED):
+        for (name, drawer) in cases:
+            drawer.set_draw_mode(mode)
+            drawer.set_anim_time(drawer.get_anim_length() / 2)
+            counter = _FillCounter(cairo.Context(canvas.surface))
+            drawer.draw(counter, *_DRAW_SIZE)
+            results.append(('frame %s %s' % (mode, name),
+                            _time(lambda: canvas.draw(drawer)),
+                            counter.fills))
+    return results
+
+
+def bench_tween():
+    # Times working out the block coordinates for a frame half way through
+    # the removal of the largest shape on each board, and working them out
+    # again after a resize.
+    import drawers
+    results = []
+    for (name, b) in _get_test_boards():
+        drawer = drawers.RemovalDrawer(lambda: _DRAW_SIZE, lambda rect: None)
+        drawer.init(b, _get_largest_transition(b))
+        t = drawer.get_anim_length() / 2
+        results.append(('tween removal %s' % name,
+                        _time(lambda: drawer.set_anim_time(t))))
+        results.append(('resize removal %s' % name,
+                        _time(lambda: drawer.resize(*_DRAW_SIZE))))
+    return results
+
+
+def _get_largest_transition(b):
+    # Returns the history.MoveTransition for removing the largest shape on
+    # the board, or for removing nothing if there are no shapes.
+    groups = b.groups()
+    if not groups:
+        size = (b.width, b.height)
+        return history.MoveTransition(set(), {}, {}, size, size)
+    return history.get_transition(b, max(groups, key=len))
+
+
+class _FillCounter(object):
+    # Cairo context wrapper that counts the calls to fill().
+    def __init__(self, cr):
+        self._cr = cr
+        self.fills = 0
+
+    def fill(self):
+        self.fills += 1
+        self._cr.fill()
+
+    def __getattr__(self, name):
+        return getattr(self._cr, name)
+
+
+# Benchmark groups by name, in the order they are run.
+_BENCHMARKS = (
+    ('generate', bench_generate),
+    ('contiguous', bench_contiguous),
+    ('board', bench_board),
+    ('save', bench_save),
+    ('draw', bench_draw),
+    ('frame', bench_frame),
+    ('tween', bench_tween),
+)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Times the board, generator and renderer hot paths.')
+    parser.add_argument('groups', nargs='*', metavar='group',
+                        help='benchmark groups to run (%s); all by default' %
+                             ', '.join(name for (name, func) in _BENCHMARKS))
+    parser.add_argument('--json', metavar='FILE',
+                        help='file to write the results to as JSON, or - for '
+                             'standard output')
+    args = parser.parse_args(argv)
+    names = [name for (name, func) in _BENCHMARKS]
+    for group in args.groups:
+        if group not in names:
+            parser.error('unknown benchmark group %s' % group)
+
+    # Keep standard output for the JSON if it is going there.
+    out = sys.stderr if args.json == '-' else sys.stdout
+    results = {}
+    fills = {}
+    for (name, func) in _BENCHMARKS:
+        if args.groups and name not in args.groups:
+            continue
+        # Drawing benchmarks may also give the number of fills.
+        for result in func():
+            (bench_name, seconds) = result[:2]
+            line = '%-36s %12.1f us' % (bench_name, seconds * 1e6)
+            results[bench_name] = seconds
+            if len(result) > 2:
+                line += ' %8d fills' % result[2]
+                fills[bench_name] = result[2]
+            print(line, file=out)
+
+    if args.json is not None:
+        data = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+            'fills': fills,
+        }
+        if args.json == '-':
+            json.dump(data, sys.stdout, indent=1, sort_keys=True)
+            print()
+        else:
+            f = open(args.json, 'w')
+            json.dump(data, f, indent=1, sort_keys=True)
+            f.close()
+
+
+if __name__ == '__main__':
+    main()
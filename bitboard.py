@@ -0,0 +1,225 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Boards held as one bitmask per color, for searching many positions fast.
+#
+# Cells are numbered column by column from the bottom left, with a fixed
+# stride of one more than the board height between columns, so the cell at
+# (x, y) is bit x * stride + y.  The extra bit at the top of each column is
+# always clear, which stops shapes growing from the top of one column into
+# the bottom of the next.  A BitBoard is never changed once made; remove()
+# returns a new one.
+#
+# With the cells in bitmasks:
+#
+#   - A contiguous shape is found by flood fill, growing a single cell by
+#     shifting it by one cell and by one column each way and masking with
+#     its color until it stops growing.
+#   - Pieces drop by squeezing the removed cells out of each column they were
+#     removed from.
+#   - An emptied column is removed by splicing the columns above it down by
+#     one stride.
+#
+# Boards must have no holes in their columns, as is the case in play.
+
+
+class BitBoard(object):
+    """Board held as one bitmask per color."""
+    def __init__(self, width, height, values, masks):
+        """values is a tuple of the colors on the board and masks a tuple of
+           the matching bitmasks.  height is the most pieces a column can
+           hold, which sets the stride between columns."""
+        self.width = width
+        self.height = height
+        self.values = values
+        self.masks = masks
+        self._stride = height + 1
+        self._column_mask = (1 << self._stride) - 1
+
+    def is_empty(self):
+        return self.width == 0
+
+    def get_value(self, x, y):
+        """Returns the value of the cell at the given coordinates, or None."""
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        bit = 1 << (x * self._stride + y)
+        for (value, mask) in zip(self.values, self.masks):
+            if mask & bit:
+                return value
+        return None
+
+    def get_counts(self):
+        """Returns a list of the number of pieces of each color, in the order
+           of the values."""
+        return [count_bits(mask) for mask in self.masks]
+
+    def groups(self, min_size=3):
+        """Returns a list of (color index, bitmask) tuples for the contiguous
+           shapes of at least the given size."""
+        stride = self._stride
+        groups = []
+        for (i, mask) in enumerate(self.masks):
+            rest = mask
+            if min_size >= 2:
+                # Only cells with a neighbor of the same color can be in a
+                # shape of two or more.
+                rest &= ((mask << 1) | (mask >> 1) |
+                         (mask << stride) | (mask >> stride))
+            while rest:
+                group = self._flood(rest & -rest, mask)
+                rest &= ~group
+                if min_size <= 1 or count_bits(group) >= min_size:
+                    groups.append((i, group))
+        return groups
+
+    def _flood(self, group, mask):
+        # Grows the group to the contiguous shape in the mask containing it.
+        stride = self._stride
+        while True:
+            grown = (group | (group << 1) | (group >> 1) |
+                     (group << stride) | (group >> stride)) & mask
+            if grown == group:
+                return group
+            group = grown
+
+    def get_coords(self, mask):
+        """Returns the coordinates of the cells in the bitmask, in order."""
+        coords = []
+        while mask:
+            bit = mask & -mask
+            coords.append(divmod(bit.bit_length() - 1, self._stride))
+            mask ^= bit
+        return coords
+
+    def get_min_coord(self, mask):
+        """Returns the lexographically smallest coordinate in the bitmask."""
+        return divmod((mask & -mask).bit_length() - 1, self._stride)
+
+    def remove(self, group):
+        """Returns a new board with the cells in the bitmask removed, the
+           pieces above them dropped and any emptied columns removed."""
+        stride = self._stride
+        column_mask = self._column_mask
+        masks = [mask & ~group for mask in self.masks]
+        width = self.width
+        # Work from the rightmost column, so that splicing out a column
+        # doesn't move the columns still to do.
+        while group:
+            x = (group.bit_length() - 1) // stride
+            shift = x * stride
+            removed = group >> shift
+            group &= (1 << shift) - 1
+            empty = True
+            for i in range(len(masks)):
+                col = (masks[i] >> shift) & column_mask
+                if not col:
+                    continue
+                col = _squeeze(col, removed)
+                masks[i] = ((masks[i] & ~(column_mask << shift)) |
+                            (col << shift))
+                empty = False
+            if empty:
+                low_mask = (1 << shift) - 1
+                for i in range(len(masks)):
+                    masks[i] = ((masks[i] & low_mask) |
+                                ((masks[i] >> (shift + stride)) << shift))
+                width -= 1
+        return BitBoard(width, self.height, self.values, tuple(masks))
+
+    def get_key(self):
+        """Returns a key that is the same for boards that differ only in
+           which colors are which."""
+        return tuple(sorted(self.masks))
+
+    def get_mirrored_key(self):
+        """Returns the key of the board mirrored left to right."""
+        return tuple(sorted(self._mirror(mask) for mask in self.masks))
+
+    def _mirror(self, mask):
+        # Returns the mask with the order of the columns reversed.
+        stride = self._stride
+        column_mask = self._column_mask
+        mirrored = 0
+        shift = (self.width - 1) * stride
+        while mask:
+            mirrored |= (mask & column_mask) << shift
+            mask >>= stride
+            shift -= stride
+        return mirrored
+
+    def to_columns(self):
+        """Returns the board as a tuple of column tuples of values."""
+        cols = []
+        for x in range(self.width):
+            col = []
+            for y in range(self.height):
+                value = self.get_value(x, y)
+                if value is None:
+                    break
+                col.append(value)
+            cols.append(tuple(col))
+        return tuple(cols)
+
+
+def from_columns(cols, height=None):
+    """Returns a BitBoard for a board given as a sequence of column sequences
+       of values from the bottom up, with no empty columns.  height is the
+       most pieces a column can hold, by default the height of the tallest
+       column.  Raises ValueError if a column has a hole in it."""
+    if height is None:
+        height = max([len(col) for col in cols] or [0])
+    stride = height + 1
+    masks = {}
+    for (x, col) in enumerate(cols):
+        for (y, value) in enumerate(col):
+            if value is None:
+                raise ValueError('Column %d has a hole' % x)
+            masks[value] = masks.get(value, 0) | (1 << (x * stride + y))
+    values = tuple(sorted(masks))
+    return BitBoard(len(cols), height, values,
+                    tuple(masks[value] for value in values))
+
+
+def from_board(b):
+    """Returns a BitBoard for the given board, with its columns numbered from
+       zero."""
+    cols = []
+    for x in range(b.min_x, b.max_x):
+        cols.append([b.get_value(x, y)
+                     for y in range(b.get_column_height(x))])
+    return from_columns(cols)
+
+
+try:
+    count_bits = int.bit_count
+except AttributeError:
+    def count_bits(mask):
+        """Returns the number of set bits in the bitmask."""
+        return bin(mask).count('1')
+
+
+def _squeeze(col, removed):
+    # Returns the column bits with the bits set in removed taken out and the
+    # bits above each one moved down into its place.
+    while removed:
+        y = removed.bit_length() - 1
+        removed ^= 1 << y
+        if y < col.bit_length():
+            col = (col & ((1 << y) - 1)) | ((col >> (y + 1)) << y)
+    return col
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import random
+import unittest
+
+import bitboard
+import board
+import history
+import testutil
+
+
+class TestBitBoard(unittest.TestCase):
+
+    def testColumns(self):
+        cols = ((1, 2), (2,), (3, 3, 1))
+        bb = bitboard.from_columns(cols)
+        self.assertEqual(bb.to_columns(), cols)
+        self.assertEqual((bb.width, bb.height), (3, 3))
+        self.assertEqual(bb.values, (1, 2, 3))
+        self.assertEqual(bb.get_counts(), [2, 2, 2])
+        self.assertEqual(bb.get_value(2, 1), 3)
+        self.assertEqual(bb.get_value(1, 1), None)
+
+    def testGroups(self):
+        b = testutil.make_board("""1.2
+                                    112
+                                    212""")
+        bb = bitboard.from_board(b)
+        groups = sorted(sorted(bb.get_coords(group))
+                        for (i, group) in bb.groups())
+        self.assertEqual(groups, [[(0, 1), (0, 2), (1, 0), (1, 1)],
+                                  [(2, 0), (2, 1), (2, 2)]])
+        self.assertEqual(len(bb.groups(min_size=1)), 3)
+
+    def testRemove(self):
+        b = testutil.make_board("""1.2
+                                    112
+                                    212""")
+        bb = bitboard.from_board(b)
+        (i, group) = [g for g in bb.groups() if bb.values[g[0]] == 2][0]
+        self.assertEqual(bb.get_min_coord(group), (2, 0))
+        self.assertEqual(bb.remove(group).to_columns(), ((2, 1, 1), (1, 1)))
+        (i, group) = [g for g in bb.groups() if bb.values[g[0]] == 1][0]
+        self.assertEqual(bb.remove(group).to_columns(), ((2,), (2, 2, 2)))
+
+    def testRandomMoves(self):
+        # Plays random moves on random boards, comparing with Board.
+        r = random.Random(0)
+        for i in range(200):
+            b = board.Board()
+            for x in range(r.randint(1, 6)):
+                for y in range(r.randint(1, 5)):
+                    b.set_value(x, y, r.randint(0, 2))
+            bb = bitboard.from_board(b)
+            while True:
+                groups = bb.groups()
+                self.assertEqual(
+                    sorted(sorted(bb.get_coords(group))
+                           for (i, group) in groups),
+                    sorted(sorted(c) for c in b.get_all_contiguous()))
+                if not groups:
+                    break
+                (i, group) = r.choice(groups)
+                history.make_move(b, set(bb.get_coords(group)))
+                bb = bb.remove(group)
+                self.assertEqual(bb.to_columns(),
+                                 bitboard.from_board(b).to_columns())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,8 +16,25 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+from array import array
 import random
 
+import instrument
+
+# Offset added to a cell value before it is stored in an ArrayBoard cell byte,
+# so that zero can mean "no value" and the generator's -1 placeholder fits.
+_VALUE_OFFSET = 2
+
+# Board hashes are 64 bit.
+_HASH_MASK = (1 << 64) - 1
+
+# Salt mixed into column positions to keep their keys apart from cell keys.
+_COLUMN_SALT = 0x5bd1e9955bd1e995
+
+# Caches of the Zobrist keys for (y, value) cells and column positions.
+_cell_keys = {}
+_column_keys = {}
+
 
 class Board(object):
     """Object that defines a board containing pieces."""
@@ -26,14 +43,27 @@ class Board(object):
     # in the column at y=0, and subsequent values are for increasing values of
     # y.  Missing values are represented either with None in the column list or
     # a missing column in the dict.
+    #
+    # Boards keep a Zobrist hash of each column, which is the XOR of a key
+    # for each (y, value) cell in the column.  The hash of the board mixes
+    # each column hash with a key for the column position, so that
+    # inserting, deleting and sliding columns only moves column hashes
+    # around rather than rehashing their cells.  _col_hashes maps x
+    # coordinates to column hashes, leaving out empty columns, and _hash
+    # caches the board hash until the board next changes.
     def __init__(self):
         self._data = {}
+        self._group_index = None
+        self._col_hashes = {}
+        self._hash = None
 
     def clone(self):
         """Return a copy of the board."""
         b = Board()
         for (col_index, col) in list(self._data.items()):
             b._data[col_index] = col[:]
+        b._col_hashes = self._col_hashes.copy()
+        b._hash = self._hash
         return b
 
     def get_value(self, x, y):
@@ -51,6 +81,8 @@ class Board(object):
         """Set the value at coordinate (x,y) to the given value."""
         assert y >= 0
 
+        self._touch_column(x)
+        self._update_hash(x, y, value)
         col = self._data.get(x, None)
         if col is None:
             if value is not None:
@@ -130,6 +162,7 @@ class Board(object):
                 return
         del self._data[x]
 
+    @instrument.timed('board.get_all_contiguous')
     def get_all_contiguous(self):
         """Returns a collection of all contiguous shapes with size >= 3,
            where each contiguous shape is represented as a set of coordinate
@@ -147,6 +180,64 @@ class Board(object):
                         all_contiguous.append(contiguous)
         return all_contiguous
 
+    def has_any_move(self):
+        """Returns True if there is a contiguous shape with size >= 3.
+           Unlike get_all_contiguous(), stops at the first shape found."""
+        # Any shape of three or more cells contains a cell with at least two
+        # neighbors of the same value, so we look for such a cell.
+        data = self._data
+        for (i, col) in list(data.items()):
+            left = data.get(i - 1, ())
+            right = data.get(i + 1, ())
+            height = len(col)
+            for (j, value) in enumerate(col):
+                if value is None:
+                    continue
+                count = 0
+                if j > 0 and col[j - 1] == value:
+                    count += 1
+                if j + 1 < height and col[j + 1] == value:
+                    count += 1
+                if j < len(left) and left[j] == value:
+                    count += 1
+                if j < len(right) and right[j] == value:
+                    count += 1
+                if count >= 2:
+                    return True
+        return False
+
+    def iter_moves(self):
+        """Generates a tuple (coord, size, value) for each contiguous shape
+           with size >= 3, where coord is the smallest coordinate tuple in the
+           shape, as recorded for moves by history.make_move().  Unlike
+           get_all_contiguous(), no coordinate sets are built; pass coord to
+           get_contiguous() for the cells of a shape."""
+        # Columns are visited from left to right and cells from bottom to
+        # top, so the first cell found of each shape is its smallest.
+        data = self._data
+        examined = set()
+        for (i, col) in sorted(data.items()):
+            for (j, value) in enumerate(col):
+                if value is None or (i, j) in examined:
+                    continue
+                examined.add((i, j))
+                stack = [(i, j)]
+                size = 0
+                while stack:
+                    (x, y) = stack.pop()
+                    size += 1
+                    for coord in ((x + 1, y), (x - 1, y), (x, y + 1),
+                                  (x, y - 1)):
+                        if coord in examined:
+                            continue
+                        col2 = data.get(coord[0], ())
+                        if 0 <= coord[1] < len(col2) and \
+                                col2[coord[1]] == value:
+                            examined.add(coord)
+                            stack.append(coord)
+                if size >= 3:
+                    yield ((i, j), size, value)
+
     def get_contiguous(self, x, y):
         """Given a board coordinate, returns a set of all the coordinate
            tuples that are contiguous and have the same value."""
@@ -180,9 +271,67 @@ class Board(object):
     def remove_empty_columns(self):
         """Removes columns that are empty."""
         new_data = {}
+        col_map = {}
         for i in sorted(self._data.keys()):
+            if i != len(new_data):
+                self._touch_column(min(i, len(new_data)))
+                col_map[i] = len(new_data)
             new_data[len(new_data)] = self._data[i]
         self._data = new_data
+        self._move_col_hashes(col_map)
+
+    def apply_move(self, pieces):
+        """Given a set of coordinate tuples, removes their contents from the
+           board, drops the pieces above them and removes the emptied
+           columns, as clear_pieces(), drop_pieces() and
+           remove_empty_columns() do, but touching only the columns that
+           change.  Returns a tuple (drop map, slide map), where the drop map
+           is as from get_drop_map() after clear_pieces() and the slide map
+           as from get_slide_map() after drop_pieces(), except that the drop
+           map leaves out pieces that do not move."""
+        # The board is assumed to have columns 0 to width - 1 and no empty
+        # columns before the move, as generated boards and any board reached
+        # from them by moves do.
+        data = self._data
+        for (x, y) in pieces:
+            col = data.get(x)
+            if col is not None and 0 <= y < len(col):
+                col[y] = None
+        drop_map = {}
+        emptied = []
+        for x in set(x for (x, y) in pieces):
+            col = data.get(x)
+            if col is None:
+                continue
+            self._touch_column(x)
+            height = 0
+            for (y, value) in enumerate(col):
+                if value is not None:
+                    if y != height:
+                        col[height] = value
+                        drop_map[(x, y)] = (x, height)
+                    height += 1
+            del col[height:]
+            if height == 0:
+                del data[x]
+                emptied.append(x)
+            self._rehash_column(x)
+
+        # Slide the columns right of the first emptied column left, once.
+        slide_map = {}
+        if emptied and data:
+            start = min(emptied)
+            self._touch_column(start)
+            shift = 0
+            for x in range(start, max(data) + 1):
+                col = data.pop(x, None)
+                if col is None:
+                    shift += 1
+                else:
+                    data[x - shift] = col
+                    slide_map[x] = x - shift
+            self._move_col_hashes(slide_map)
+        return (drop_map, slide_map)
 
     def get_slide_map(self):
         """Returns a map showing where sliding pieces will go when empty
@@ -205,6 +354,7 @@ class Board(object):
         """Inserts empty columns at the given index, pushing higher-numbered
            columns higher."""
         assert num_columns >= 0
+        self._touch_column(col_index)
         new_data = {}
         for (i, col) in list(self._data.items()):
             if i < col_index:
@@ -212,11 +362,13 @@ class Board(object):
             else:
                 new_data[i + num_columns] = col
         self._data = new_data
+        self._shift_col_hashes(col_index, num_columns)
 
     def delete_columns(self, col_index, num_columns):
         """Removes columns from the given location of the board, lowering the
            higher-numbered columns to fill the space."""
         assert 0 <= num_columns
+        self._touch_column(col_index)
         new_data = {}
         for (i, col) in list(self._data.items()):
             if i < col_index:
@@ -224,6 +376,7 @@ class Board(object):
             elif i >= col_index + num_columns:
                 new_data[i - num_columns] = col
         self._data = new_data
+        self._shift_col_hashes(col_index + num_columns, -num_columns)
 
     def get_empty_columns(self):
         """Returns a list of empty (all zero) columns."""
@@ -235,7 +388,10 @@ class Board(object):
 
     def drop_pieces(self):
         for (i, col) in list(self._data.items()):
-            self._data[i] = [x for x in col if x is not None]
+            if None in col:
+                self._touch_column(i)
+                self._data[i] = [x for x in col if x is not None]
+                self._rehash_column(i)
 
     def get_drop_map(self):
         """Returns a map showing where dropped pieces will go (compacting
@@ -250,6 +406,94 @@ class Board(object):
                     offset += 1
         return drop_map
 
+    def groups(self):
+        """Returns the same collection of contiguous shapes as
+           get_all_contiguous(), from an index that is updated incrementally
+           as the board changes.  The returned sets must not be modified."""
+        return self._get_group_index().groups()
+
+    def group_at(self, x, y):
+        """Returns the same set as get_contiguous(x, y), from the incremental
+           group index.  The returned set must not be modified."""
+        return self._get_group_index().group_at(x, y)
+
+    def has_move(self):
+        """Returns True if there is a contiguous shape with size >= 3."""
+        return self._get_group_index().has_move()
+
+    def _get_group_index(self):
+        # Returns the group index, creating it or relabelling the columns
+        # changed since it was last used.
+        if self._group_index is None:
+            self._group_index = _GroupIndex(self.min_x)
+        self._group_index.refresh(self)
+        return self._group_index
+
+    def _touch_column(self, x):
+        # Notes that the contents of column x and possibly all columns to
+        # its right have changed.
+        if self._group_index is not None:
+            self._group_index.touch(x)
+
+    def hash(self):
+        """Returns a 64 bit hash of the board contents.  Boards that compare
+           equal have the same hash, including boards of different classes,
+           and the hash is the same from one run of the program to the
+           next."""
+        if self._hash is None:
+            h = 0
+            for (x, col_hash) in self._col_hashes.items():
+                h ^= _mix(col_hash ^ _column_key(x))
+            self._hash = h
+        return self._hash
+
+    def _update_hash(self, x, y, value):
+        # Updates the hash of column x for the value at (x,y) being set to
+        # the given value.
+        old_value = self.get_value(x, y)
+        if old_value == value:
+            return
+        col_hash = (self._col_hashes.get(x, 0) ^ _cell_key(y, old_value) ^
+                    _cell_key(y, value))
+        self._set_col_hash(x, col_hash)
+
+    def _rehash_column(self, x):
+        # Recomputes the hash of column x from its contents.
+        col_hash = 0
+        for y in range(self.get_column_height(x)):
+            col_hash ^= _cell_key(y, self.get_value(x, y))
+        self._set_col_hash(x, col_hash)
+
+    def _set_col_hash(self, x, col_hash):
+        if col_hash:
+            self._col_hashes[x] = col_hash
+        else:
+            self._col_hashes.pop(x, None)
+        self._hash = None
+
+    def _shift_col_hashes(self, col_index, offset):
+        # Moves the hashes of columns col_index and up by offset columns,
+        # dropping any moved below col_index (which have been deleted).
+        col_hashes = {}
+        for (x, col_hash) in self._col_hashes.items():
+            if x < col_index + min(0, offset):
+                col_hashes[x] = col_hash
+            elif x >= col_index:
+                col_hashes[x + offset] = col_hash
+        self._col_hashes = col_hashes
+        self._hash = None
+
+    def _move_col_hashes(self, col_map):
+        # Moves column hashes as given by a map from old to new x
+        # coordinates.  Columns that aren't in the map stay where they are.
+        if not col_map:
+            return
+        col_hashes = {}
+        for (x, col_hash) in self._col_hashes.items():
+            col_hashes[col_map.get(x, x)] = col_hash
+        self._col_hashes = col_hashes
+        self._hash = None
+
     def __eq__(self, other):
         return (self._data == other._data)
 
@@ -274,8 +518,542 @@ class Board(object):
         return '\n'.join(lines)
 
 
-def make_test_board(width, height):
-    b = Board()
+class ArrayBoard(Board):
+    """Board with the same interface as Board, stored as a compact grid."""
+    # Cells are stored column-major in a bytearray with room for
+    # max_size[0] columns of max_size[1] cells each, one byte per cell.  A
+    # zero byte is an empty cell; any other byte is the value plus
+    # _VALUE_OFFSET.  _heights holds the height of each column and _width the
+    # number of columns up to and including the last non-empty one.  Only
+    # non-negative x coordinates are supported.  The grid grows if a value is
+    # set outside of it, so max_size is a hint rather than a hard limit.
+    def __init__(self, max_size=(30, 20)):
+        (cap_width, cap_height) = max_size
+        self._cap_width = max(1, cap_width)
+        self._cap_height = max(1, cap_height)
+        self._cells = bytearray(self._cap_width * self._cap_height)
+        self._heights = array('H', [0] * self._cap_width)
+        self._width = 0
+        self._group_index = None
+        self._col_hashes = {}
+        self._hash = None
+
+    def clone(self):
+        """Return a copy of the board."""
+        b = ArrayBoard.__new__(ArrayBoard)
+        b._cap_width = self._cap_width
+        b._cap_height = self._cap_height
+        b._cells = self._cells[:]
+        b._heights = self._heights[:]
+        b._width = self._width
+        b._group_index = None
+        b._col_hashes = self._col_hashes.copy()
+        b._hash = self._hash
+        return b
+
+    def get_value(self, x, y):
+        """Return the value at coordinate (x,y), or None if no value is
+           present."""
+        if 0 <= x < self._width and 0 <= y < self._heights[x]:
+            value = self._cells[x * self._cap_height + y]
+            if value:
+                return value - _VALUE_OFFSET
+        return None
+
+    def set_value(self, x, y, value):
+        """Set the value at coordinate (x,y) to the given value."""
+        assert x >= 0
+        assert y >= 0
+
+        self._touch_column(x)
+        self._update_hash(x, y, value)
+        if value is None:
+            if x < self._width and y < self._heights[x]:
+                self._cells[x * self._cap_height + y] = 0
+                if y == self._heights[x] - 1:
+                    self._trim_column(x)
+            return
+
+        if x >= self._cap_width or y >= self._cap_height:
+            self._grow(max(self._cap_width, x + 1),
+                       max(self._cap_height, y + 1))
+        self._cells[x * self._cap_height + y] = value + _VALUE_OFFSET
+        if y >= self._heights[x]:
+            self._heights[x] = y + 1
+        if x >= self._width:
+            self._width = x + 1
+
+    def get_column_height(self, x):
+        """Return the height of column x."""
+        if 0 <= x < self._width:
+            return self._heights[x]
+        else:
+            return 0
+
+    @property
+    def min_x(self):
+        return 0
+
+    @property
+    def max_x(self):
+        return self._width
+
+    @property
+    def max_y(self):
+        if self._width == 0:
+            return 0
+        else:
+            return max(self._heights[:self._width])
+
+    def is_empty(self):
+        return (self._width == 0)
+
+    def get_value_map(self):
+        """Returns a map from coordinate tuples to values for all cells on the
+           board."""
+        value_map = {}
+        cells = self._cells
+        for i in range(self._width):
+            base = i * self._cap_height
+            for j in range(self._heights[i]):
+                value = cells[base + j]
+                if value:
+                    value_map[(i, j)] = value - _VALUE_OFFSET
+        return value_map
+
+    def _grow(self, cap_width, cap_height):
+        # Reallocates the grid with the given (larger) capacity, keeping the
+        # current contents.
+        cells = bytearray(cap_width * cap_height)
+        for i in range(self._width):
+            src = i * self._cap_height
+            dst = i * cap_height
+            height = self._heights[i]
+            cells[dst:dst + height] = self._cells[src:src + height]
+        self._heights.extend([0] * (cap_width - self._cap_width))
+        self._cells = cells
+        self._cap_width = cap_width
+        self._cap_height = cap_height
+
+    def _trim_column(self, x):
+        # Lowers the height of the given column past any empty cells at its
+        # top, then drops any empty columns at the right of the board.
+        cells = self._cells
+        base = x * self._cap_height
+        height = self._heights[x]
+        while height > 0 and not cells[base + height - 1]:
+            height -= 1
+        self._heights[x] = height
+        while self._width > 0 and self._heights[self._width - 1] == 0:
+            self._width -= 1
+
+    @instrument.timed('board.get_all_contiguous')
+    def get_all_contiguous(self):
+        """Returns a collection of all contiguous shapes with size >= 3,
+           where each contiguous shape is represented as a set of coordinate
+           tuples."""
+        examined = bytearray(len(self._cells))
+        all_contiguous = []
+        for i in range(self._width):
+            base = i * self._cap_height
+            for j in range(self._heights[i]):
+                if not examined[base + j] and self._cells[base + j]:
+                    indexes = self._flood(base + j, examined)
+                    if len(indexes) >= 3:
+                        all_contiguous.append(self._index_coords(indexes))
+        return all_contiguous
+
+    def iter_moves(self):
+        """Generates a tuple (coord, size, value) for each contiguous shape
+           with size >= 3, as Board.iter_moves() does."""
+        examined = bytearray(len(self._cells))
+        cells = self._cells
+        cap_height = self._cap_height
+        for i in range(self._width):
+            base = i * cap_height
+            for j in range(self._heights[i]):
+                if not examined[base + j] and cells[base + j]:
+                    size = len(self._flood(base + j, examined))
+                    if size >= 3:
+                        yield ((i, j), size, cells[base + j] - _VALUE_OFFSET)
+
+    def get_contiguous(self, x, y):
+        """Given a board coordinate, returns a set of all the coordinate
+           tuples that are contiguous and have the same value."""
+        if self.get_value(x, y) is None:
+            return set()
+        examined = bytearray(len(self._cells))
+        indexes = self._flood(x * self._cap_height + y, examined)
+        return self._index_coords(indexes)
+
+    def has_any_move(self):
+        """Returns True if there is a contiguous shape with size >= 3.
+           Unlike get_all_contiguous(), stops at the first shape found."""
+        # As in Board, look for a cell with two neighbors of the same value.
+        cells = self._cells
+        heights = self._heights
+        cap_height = self._cap_height
+        width = self._width
+        for i in range(width):
+            base = i * cap_height
+            height = heights[i]
+            if i > 0:
+                left_height = heights[i - 1]
+            else:
+                left_height = 0
+            if i + 1 < width:
+                right_height = heights[i + 1]
+            else:
+                right_height = 0
+            for j in range(height):
+                index = base + j
+                value = cells[index]
+                if not value:
+                    continue
+                count = 0
+                if j > 0 and cells[index - 1] == value:
+                    count += 1
+                if j + 1 < height and cells[index + 1] == value:
+                    count += 1
+                if j < left_height and cells[index - cap_height] == value:
+                    count += 1
+                if j < right_height and cells[index + cap_height] == value:
+                    count += 1
+                if count >= 2:
+                    return True
+        return False
+
+    def _flood(self, start, examined):
+        # Returns a list of the cell indexes contiguous with the cell at the
+        # given index and of the same value, marking them in examined.
+        cells = self._cells
+        heights = self._heights
+        cap_height = self._cap_height
+        width = self._width
+        value = cells[start]
+        examined[start] = 1
+        indexes = [start]
+        stack = [start]
+        while stack:
+            index = stack.pop()
+            (x, y) = divmod(index, cap_height)
+            if y + 1 < heights[x]:
+                neighbors = [index + 1]
+            else:
+                neighbors = []
+            if y > 0:
+                neighbors.append(index - 1)
+            if x > 0 and y < heights[x - 1]:
+                neighbors.append(index - cap_height)
+            if x + 1 < width and y < heights[x + 1]:
+                neighbors.append(index + cap_height)
+            for index2 in neighbors:
+                if not examined[index2] and cells[index2] == value:
+                    examined[index2] = 1
+                    indexes.append(index2)
+                    stack.append(index2)
+        return indexes
+
+    def _index_coords(self, indexes):
+        # Converts a list of cell indexes to a set of coordinate tuples.
+        cap_height = self._cap_height
+        return set(divmod(index, cap_height) for index in indexes)
+
+    def remove_empty_columns(self):
+        """Removes columns that are empty."""
+        self._remove_empty_columns(0)
+
+    def _remove_empty_columns(self, start):
+        # Removes the empty columns from column start up, and returns a map
+        # from the old to the new x coordinates of the columns that moved.
+        cells = self._cells
+        heights = self._heights
+        cap_height = self._cap_height
+        new_width = start
+        col_map = {}
+        for i in range(start, self._width):
+            height = heights[i]
+            if height == 0:
+                continue
+            if new_width != i:
+                self._touch_column(new_width)
+                col_map[i] = new_width
+                src = i * cap_height
+                dst = new_width * cap_height
+                cells[dst:dst + cap_height] = cells[src:src + cap_height]
+                heights[new_width] = height
+            new_width += 1
+        start = new_width * cap_height
+        end = self._width * cap_height
+        cells[start:end] = bytes(end - start)
+        for i in range(new_width, self._width):
+            heights[i] = 0
+        self._width = new_width
+        self._move_col_hashes(col_map)
+        return col_map
+
+    def apply_move(self, pieces):
+        """Same as Board.apply_move()."""
+        cells = self._cells
+        heights = self._heights
+        cap_height = self._cap_height
+        columns = set()
+        for (x, y) in pieces:
+            if 0 <= x < self._width and 0 <= y < heights[x]:
+                cells[x * cap_height + y] = 0
+                columns.add(x)
+        drop_map = {}
+        start = None
+        for x in columns:
+            self._touch_column(x)
+            base = x * cap_height
+            height = 0
+            for y in range(heights[x]):
+                value = cells[base + y]
+                if value:
+                    if y != height:
+                        cells[base + height] = value
+                        drop_map[(x, y)] = (x, height)
+                    height += 1
+            cells[base + height:base + heights[x]] = \
+                bytes(heights[x] - height)
+            heights[x] = height
+            if height == 0 and (start is None or x < start):
+                start = x
+            self._rehash_column(x)
+        if start is None:
+            return (drop_map, {})
+        return (drop_map, self._remove_empty_columns(start))
+
+    def get_slide_map(self):
+        """Returns a map showing where sliding pieces will go when empty
+           columns are removed, as a dictionary mapping old x coordinates
+           to new x coordinates.  Does not include entries where the old
+           x coordinates are the same as the new ones."""
+        slide_map = {}
+        new_x = 0
+        for i in range(self._width):
+            if self._heights[i] > 0:
+                if i != new_x:
+                    slide_map[i] = new_x
+                new_x += 1
+        return slide_map
+
+    def insert_columns(self, col_index, num_columns):
+        """Inserts empty columns at the given index, pushing higher-numbered
+           columns higher."""
+        assert num_columns >= 0
+        assert col_index >= 0
+        if num_columns == 0 or col_index >= self._width:
+            return
+        self._touch_column(col_index)
+        new_width = self._width + num_columns
+        if new_width > self._cap_width:
+            self._grow(new_width, self._cap_height)
+        cap_height = self._cap_height
+        cells = self._cells
+        src = col_index * cap_height
+        end = self._width * cap_height
+        dst = (col_index + num_columns) * cap_height
+        cells[dst:dst + end - src] = cells[src:end]
+        cells[src:dst] = bytes(dst - src)
+        heights = self._heights
+        heights[col_index + num_columns:new_width] = \
+            heights[col_index:self._width]
+        for i in range(col_index, col_index + num_columns):
+            heights[i] = 0
+        self._width = new_width
+        self._shift_col_hashes(col_index, num_columns)
+
+    def delete_columns(self, col_index, num_columns):
+        """Removes columns from the given location of the board, lowering the
+           higher-numbered columns to fill the space."""
+        assert 0 <= num_columns
+        assert col_index >= 0
+        if num_columns == 0 or col_index >= self._width:
+            return
+        self._touch_column(col_index)
+        end_index = min(self._width, col_index + num_columns)
+        cap_height = self._cap_height
+        cells = self._cells
+        heights = self._heights
+        new_width = self._width - (end_index - col_index)
+        src = end_index * cap_height
+        end = self._width * cap_height
+        dst = col_index * cap_height
+        cells[dst:dst + end - src] = cells[src:end]
+        cells[new_width * cap_height:end] = \
+            bytes(end - new_width * cap_height)
+        heights[col_index:new_width] = heights[end_index:self._width]
+        for i in range(new_width, self._width):
+            heights[i] = 0
+        self._width = new_width
+        while self._width > 0 and self._heights[self._width - 1] == 0:
+            self._width -= 1
+        self._shift_col_hashes(col_index + num_columns, -num_columns)
+
+    def get_empty_columns(self):
+        """Returns a list of empty (all zero) columns."""
+        return [i for i in range(self._width) if self._heights[i] == 0]
+
+    def drop_pieces(self):
+        cells = self._cells
+        cap_height = self._cap_height
+        for i in range(self._width):
+            height = self._heights[i]
+            base = i * cap_height
+            col = cells[base:base + height]
+            dropped = col.replace(b'\x00', b'')
+            if len(dropped) != height:
+                self._touch_column(i)
+                cells[base:base + height] = \
+                    dropped + bytes(height - len(dropped))
+                self._heights[i] = len(dropped)
+                self._rehash_column(i)
+        while self._width > 0 and self._heights[self._width - 1] == 0:
+            self._width -= 1
+
+    def get_drop_map(self):
+        """Returns a map showing where dropped pieces will go (compacting
+           out None values vertically), as a dictionary mapping old
+           coordinate tuples to new coordinate tuples."""
+        drop_map = {}
+        cells = self._cells
+        for i in range(self._width):
+            base = i * self._cap_height
+            offset = 0
+            for j in range(self._heights[i]):
+                if cells[base + j]:
+                    drop_map[(i, j)] = (i, offset)
+                    offset += 1
+        return drop_map
+
+    def __eq__(self, other):
+        if isinstance(other, ArrayBoard):
+            if self._width != other._width:
+                return False
+            for i in range(self._width):
+                height = self._heights[i]
+                if height != other._heights[i]:
+                    return False
+                base1 = i * self._cap_height
+                base2 = i * other._cap_height
+                if (self._cells[base1:base1 + height] !=
+                        other._cells[base2:base2 + height]):
+                    return False
+            return True
+        return (self.get_value_map() == other.get_value_map())
+
+
+class _GroupIndex(object):
+    # Index of every contiguous shape on a board (of any size), kept up to
+    # date by relabelling only the columns that changed since the last
+    # refresh.
+    #
+    # The board reports the lowest changed column x through touch(); every
+    # column from x onwards may have changed (e.g. columns sliding left).
+    # Shapes that reach column x - 1 or beyond are discarded, as they may
+    # have merged with or lost changed cells, and the cells of columns x - 1
+    # onwards are flood filled again.  Any discarded shape's cells further
+    # left are connected to column x - 1, so the flood fill finds them too.
+    def __init__(self, min_x):
+        self._dirty_col = min_x
+        self._cell_groups = {}  # {coord: group id}
+        self._groups = {}  # {group id: set of coords}
+        self._col_groups = {}  # {x: set of ids of groups in column x}
+        self._next_id = 0
+        self._num_moves = 0
+
+    def touch(self, x):
+        if self._dirty_col is None or x < self._dirty_col:
+            self._dirty_col = x
+
+    def refresh(self, b):
+        if self._dirty_col is None:
+            return
+        start = self._dirty_col - 1
+        self._dirty_col = None
+
+        dropped = set()
+        for x in [x for x in self._col_groups if x >= start]:
+            dropped.update(self._col_groups.pop(x))
+        for group_id in dropped:
+            contiguous = self._groups.pop(group_id)
+            if len(contiguous) >= 3:
+                self._num_moves -= 1
+            for coord in contiguous:
+                del self._cell_groups[coord]
+                if coord[0] < start:
+                    self._col_groups[coord[0]].discard(group_id)
+
+        if start < b.min_x:
+            # Everything changed, so label the whole board in one go.  The
+            # labelling module is only imported here, since it loads NumPy.
+            import boardlabel
+            for contiguous in boardlabel.get_all_components(b):
+                self._add_group(contiguous)
+            return
+        for x in range(start, b.max_x):
+            for y in range(b.get_column_height(x)):
+                if ((x, y) not in self._cell_groups and
+                        b.get_value(x, y) is not None):
+                    self._add_group(b.get_contiguous(x, y))
+
+    def _add_group(self, contiguous):
+        group_id = self._next_id
+        self._next_id += 1
+        self._groups[group_id] = contiguous
+        if len(contiguous) >= 3:
+            self._num_moves += 1
+        for coord in contiguous:
+            self._cell_groups[coord] = group_id
+            self._col_groups.setdefault(coord[0], set()).add(group_id)
+
+    def groups(self):
+        return [contiguous for contiguous in self._groups.values()
+                if len(contiguous) >= 3]
+
+    def group_at(self, x, y):
+        group_id = self._cell_groups.get((x, y), None)
+        if group_id is None:
+            return set()
+        return self._groups[group_id]
+
+    def has_move(self):
+        return (self._num_moves > 0)
+
+
+def _mix(n):
+    # Scrambles a 64 bit integer (the SplitMix64 finalizer).
+    n = (n + 0x9e3779b97f4a7c15) & _HASH_MASK
+    n = ((n ^ (n >> 30)) * 0xbf58476d1ce4e5b9) & _HASH_MASK
+    n = ((n ^ (n >> 27)) * 0x94d049bb133111eb) & _HASH_MASK
+    return n ^ (n >> 31)
+
+
+def _cell_key(y, value):
+    # Returns the Zobrist key for the given value at height y in a column.
+    # Empty cells have a key of zero.
+    if value is None:
+        return 0
+    key = _cell_keys.get((y, value))
+    if key is None:
+        key = _mix(((y << 16) + value + _VALUE_OFFSET) & _HASH_MASK)
+        _cell_keys[(y, value)] = key
+    return key
+
+
+def _column_key(x):
+    # Returns the key for column position x.
+    key = _column_keys.get(x)
+    if key is None:
+        key = _mix((x & _HASH_MASK) ^ _COLUMN_SALT)
+        _column_keys[x] = key
+    return key
+
+
+def make_test_board(width, height, board_class=Board):
+    b = board_class()
     r = random.Random()
     r.seed(0)
     unchosen = []
@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Cache of generated boards.
+#
+# Generating a hard level board takes a noticeable amount of time, and the
+# same board is generated again on every replay, and by every peer in a
+# shared activity.  Since the generator always makes the same board from the
+# same parameters, we keep the boards we have generated, keyed on the full
+# set of generator parameters.
+#
+# Boards are kept in memory in least recently used order, up to a limit.
+# They can also be stored in a directory, one file per board in the compact
+# puzzle format from savegame, so that they survive from one session to the
+# next.  The directory is limited in the same way, with the file
+# modification times giving the order of use.
+#
+# Boards can be generated ahead of time in a background thread.  If a board
+# is asked for while it is still being generated in the background, we wait
+# for it rather than generate it a second time.  Files are read and written
+# outside of the lock, so a slow disk in one thread doesn't hold up cache
+# lookups in another.
+
+import collections
+import logging
+import os
+import threading
+
+import board
+import boardgen
+import savegame
+
+_logger = logging.getLogger('implode-activity.boardcache')
+
+# Number of boards kept in memory.
+_MAX_ENTRIES = 32
+
+# Number of boards kept in the cache directory.
+_MAX_FILES = 200
+
+# File name suffix of boards in the cache directory.
+_SUFFIX = '.puzzle'
+
+
+class BoardCache(object):
+    """Object that keeps recently generated boards."""
+    def __init__(self, path=None, max_entries=_MAX_ENTRIES,
+                 max_files=_MAX_FILES):
+        """path is the directory in which to store boards, or None to keep
+           them in memory only."""
+        self._path = path
+        self._max_entries = max_entries
+        self._max_files = max_files
+
+        # Map from parameter tuples to (board, winning moves) tuples, oldest
+        # first.
+        self._entries = collections.OrderedDict()
+
+        # Map from parameter tuples to threading.Event objects for boards
+        # being generated in the background, set when they are done.
+        self._pending = {}
+
+        # Boards may be generated in other threads, so all access to the
+        # entries and the pending events is under this lock.
+        self._lock = threading.Lock()
+
+    def generate_board(self, seed=0, fragmentation=1, fill=0.5, max_colors=5,
+                       max_size=(30, 20), compact=False):
+        """Same as boardgen.generate_board(), but returns a copy of the board
+           from the cache if it has been generated before."""
+        key = _get_key(seed, fragmentation, fill, max_colors, max_size,
+                       compact)
+        entry = self._get(key)
+        if entry is None:
+            with self._lock:
+                event = self._pending.get(key)
+            if event is not None:
+                event.wait()
+                entry = self._get(key)
+        if entry is None:
+            entry = _generate(key)
+            self._put(key, entry)
+        (b, winning_moves) = entry
+        return (b.clone(), list(winning_moves))
+
+    def prefetch(self, seed=0, fragmentation=1, fill=0.5, max_colors=5,
+                 max_size=(30, 20), compact=False):
+        """Starts generating the board for the given parameters in a
+           background thread, unless it is already in memory or being
+           generated."""
+        key = _get_key(seed, fragmentation, fill, max_colors, max_size,
+                       compact)
+        with self._lock:
+            if key in self._entries or key in self._pending:
+                return
+            event = threading.Event()
+            self._pending[key] = event
+
+        def run():
+            try:
+                if self._get(key) is None:
+                    self._put(key, _generate(key))
+            except Exception:
+                _logger.exception('Could not generate board %r', key)
+            finally:
+                with self._lock:
+                    del self._pending[key]
+                event.set()
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def contains(self, seed=0, fragmentation=1, fill=0.5, max_colors=5,
+                 max_size=(30, 20), compact=False):
+        """Returns True if the board for the given parameters is in memory."""
+        key = _get_key(seed, fragmentation, fill, max_colors, max_size,
+                       compact)
+        with self._lock:
+            return key in self._entries
+
+    def _get(self, key):
+        # Returns the entry for the given key, or None if it isn't cached.
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        entry = self._read_file(key)
+        if entry is not None:
+            with self._lock:
+                self._add_entry(key, entry)
+        return entry
+
+    def _put(self, key, entry):
+        # Adds a newly generated entry to the cache.
+        (b, winning_moves) = entry
+        entry = (b.clone(), tuple(winning_moves))
+        with self._lock:
+            self._add_entry(key, entry)
+        self._write_file(key, entry)
+
+    def _add_entry(self, key, entry):
+        # Adds an entry to memory, dropping the oldest if there are too many.
+        # Called with the lock held.
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _read_file(self, key):
+        # Returns the entry for the given key from the cache directory, or
+        # None if it isn't there.
+        if self._path is None:
+            return None
+        name = _get_name(key)
+        file_path = os.path.join(self._path, name + _SUFFIX)
+        try:
+            f = open(file_path, 'rb')
+            try:
+                data = f.read()
+            finally:
+                f.close()
+            (file_name, board_data, winning_moves) = \
+                savegame.loads_puzzle(data)
+            if file_name != name:
+                raise ValueError('Puzzle is for %s' % file_name)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            _logger.exception('Could not read cached board %s', file_path)
+            return None
+        try:
+            # Mark the file as recently used.
+            os.utime(file_path)
+        except OSError:
+            # The directory may be read-only, which still leaves us the
+            # board.
+            pass
+        return (_decode_board(board_data, key), tuple(winning_moves))
+
+    def _write_file(self, key, entry):
+        # Stores the entry for the given key in the cache directory, then
+        # removes the least recently used files if there are too many.
+        if self._path is None:
+            return
+        (b, winning_moves) = entry
+        name = _get_name(key)
+        file_path = os.path.join(self._path, name + _SUFFIX)
+        try:
+            os.makedirs(self._path, exist_ok=True)
+            # Other threads may be writing the same board, so each writes
+            # its own temporary file.
+            temp_path = '%s.%d.tmp' % (file_path, threading.get_ident())
+            f = open(temp_path, 'wb')
+            try:
+                f.write(savegame.dumps_puzzle(
+                    name, savegame.encode_board(b), winning_moves))
+            finally:
+                f.close()
+            os.replace(temp_path, file_path)
+
+            paths = [os.path.join(self._path, x)
+                     for x in os.listdir(self._path) if x.endswith(_SUFFIX)]
+            if len(paths) > self._max_files:
+                paths.sort(key=_get_mtime)
+                for old_path in paths[:len(paths) - self._max_files]:
+                    try:
+                        os.remove(old_path)
+                    except FileNotFoundError:
+                        # Another thread removed it first.
+                        pass
+        except OSError:
+            _logger.exception('Could not store cached board %s', file_path)
+
+
+def _get_key(seed, fragmentation, fill, max_colors, max_size, compact):
+    # Returns the cache key for the given generator parameters.
+    return (seed, fragmentation, fill, max_colors, tuple(max_size), compact)
+
+
+def _generate(key):
+    # Generates the board for the given key.
+    (seed, fragmentation, fill, max_colors, max_size, compact) = key
+    return boardgen.generate_board(
+        seed=seed, fragmentation=fragmentation, fill=fill,
+        max_colors=max_colors, max_size=max_size, compact=compact)
+
+
+def _get_mtime(path):
+    # Returns the modification time of the file, or 0 if another thread has
+    # removed it.
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _get_name(key):
+    # Returns the file name (without suffix) for the given key.  Compact and
+    # ordinary boards are stored in the same file.
+    (seed, fragmentation, fill, max_colors, max_size, compact) = key
+    return 'board-%d-%d-%r-%d-%dx%d' % (seed, fragmentation, fill,
+                                        max_colors, max_size[0], max_size[1])
+
+
+def _decode_board(data, key):
+    # Returns a board of the class given by the key from the encoded board.
+    (seed, fragmentation, fill, max_colors, max_size, compact) = key
+    if compact:
+        b = board.ArrayBoard(max_size)
+    else:
+        b = board.Board()
+    (width, height) = data[0:2]
+    for y in range(height):
+        for x in range(width):
+            value = data[2 + y * width + x]
+            if value is not None:
+                b.set_value(x, y, value)
+    return b
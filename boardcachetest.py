@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import board
+import boardcache
+import boardgen
+
+
+class TestBoardCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def testCopies(self):
+        cache = boardcache.BoardCache()
+        (b, moves) = cache.generate_board(seed=3, max_size=(12, 10))
+        self.assertEqual((b, moves),
+                         boardgen.generate_board(seed=3, max_size=(12, 10)))
+        self.assertTrue(cache.contains(seed=3, max_size=(12, 10)))
+        b.clear_pieces(b.get_contiguous(*moves[0]))
+        moves.pop()
+        self.assertEqual(cache.generate_board(seed=3, max_size=(12, 10)),
+                         boardgen.generate_board(seed=3, max_size=(12, 10)))
+
+    def testEviction(self):
+        cache = boardcache.BoardCache(max_entries=2)
+        for seed in range(3):
+            cache.generate_board(seed=seed, max_size=(8, 6))
+        self.assertFalse(cache.contains(seed=0, max_size=(8, 6)))
+        self.assertTrue(cache.contains(seed=1, max_size=(8, 6)))
+        self.assertTrue(cache.contains(seed=2, max_size=(8, 6)))
+
+    def testPrefetch(self):
+        cache = boardcache.BoardCache()
+        cache.prefetch(seed=5, fragmentation=2, max_size=(20, 15))
+        # Asking for the board while it is being generated waits for it.
+        self.assertEqual(cache.generate_board(seed=5, fragmentation=2,
+                                              max_size=(20, 15)),
+                         boardgen.generate_board(seed=5, fragmentation=2,
+                                                 max_size=(20, 15)))
+        self.assertTrue(cache.contains(seed=5, fragmentation=2,
+                                       max_size=(20, 15)))
+        self.assertEqual(cache._pending, {})
+
+    def testFiles(self):
+        cache = boardcache.BoardCache(self.path, max_files=2)
+        for seed in range(3):
+            cache.generate_board(seed=seed, fragmentation=2,
+                                 max_size=(20, 15))
+        self.assertEqual(len(os.listdir(self.path)), 2)
+
+        # A new cache finds the stored boards, for either board class.
+        cache = boardcache.BoardCache(self.path)
+        self.assertFalse(cache.contains(seed=2, fragmentation=2,
+                                        max_size=(20, 15), compact=True))
+        (b, moves) = cache.generate_board(seed=2, fragmentation=2,
+                                          max_size=(20, 15), compact=True)
+        self.assertTrue(isinstance(b, board.ArrayBoard))
+        self.assertEqual((b, moves),
+                         boardgen.generate_board(seed=2, fragmentation=2,
+                                                 max_size=(20, 15)))
+
+    def testBadFile(self):
+        cache = boardcache.BoardCache(self.path)
+        cache.generate_board(seed=0, max_size=(8, 6))
+        (name,) = os.listdir(self.path)
+        f = open(os.path.join(self.path, name), 'wb')
+        f.write(b'Implode\x01')
+        f.close()
+        cache = boardcache.BoardCache(self.path)
+        self.assertEqual(cache.generate_board(seed=0, max_size=(8, 6)),
+                         boardgen.generate_board(seed=0, max_size=(8, 6)))
+
+    def testReadOnlyFile(self):
+        # A board read from a directory where the modification time can't
+        # be set is still used.
+        boardcache.BoardCache(self.path).generate_board(seed=0,
+                                                        max_size=(8, 6))
+        cache = boardcache.BoardCache(self.path)
+        with mock.patch('os.utime', side_effect=PermissionError), \
+                mock.patch('boardcache._generate', side_effect=AssertionError):
+            self.assertEqual(cache.generate_board(seed=0, max_size=(8, 6)),
+                             boardgen.generate_board(seed=0, max_size=(8, 6)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,23 +16,41 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import argparse
 import math
+import multiprocessing
 import random
+import time
 
 import board
+import instrument
+import savegame
 
+# Board size and fragmentation for each difficulty level.
+LEVELS = {
+    0: ((8, 6), 0),
+    1: ((12, 10), 0),
+    2: ((20, 15), 2),
+}
 
+
+@instrument.timed('boardgen.generate_board')
 def generate_board(seed=0,
                    fragmentation=1,
                    fill=0.5,
                    max_colors=5,
-                   max_size=(30, 20)):
+                   max_size=(30, 20),
+                   compact=False):
     """Generates a new board of the given properties using the given random
        seed as a starting point.  Returns both the board and the list of
-       moves needed to solve it."""
+       moves needed to solve it.  If compact is True, the board is an
+       ArrayBoard sized to max_size instead of a Board."""
     r = random.Random(seed)
     piece_sizes = _get_piece_sizes(r, fragmentation, fill, max_size)
-    b = board.Board()
+    if compact:
+        b = board.ArrayBoard(max_size)
+    else:
+        b = board.Board()
     winning_moves = []
     for piece_size in piece_sizes:
         (b, move) = _try_add_piece(b, r, piece_size, max_colors, max_size)
@@ -47,14 +65,15 @@ def _try_add_piece(b, r, piece_size, max_colors, max_size):
     # Also returns the lowest coordinate of the added piece (i.e. the canonical
     # move to remove it) or None if no piece added.
     b2 = b.clone()
-    change = _get_starting_change(b2, r, max_colors, max_size)
+    piece = _NewPiece()
+    change = _get_starting_change(b2, r, max_colors, max_size, piece)
     if change is None:
         # If there are no valid starting points, return the original board.
         return (b, None)
-    _make_change(b2, change)
+    _make_change(b2, change, piece)
     total_added_cells = 1
     while total_added_cells < piece_size:
-        added_cells = _try_add_cells(b2, r, max_colors, max_size)
+        added_cells = _try_add_cells(b2, r, max_colors, max_size, piece)
         if added_cells > 0:
             total_added_cells += added_cells
         else:
@@ -65,19 +84,19 @@ def _try_add_piece(b, r, piece_size, max_colors, max_size):
             else:
                 # print "Aborted piece add."
                 return (b, None)
-    piece = _get_new_piece_coords(b2)
-    _color_piece_random(b2, r, max_colors)
-    return (b2, min(piece))
+    coords = piece.get_coords()
+    _color_piece_random(b2, r, max_colors, piece)
+    return (b2, min(coords))
 
 
-def _get_starting_change(b, r, max_colors, max_size):
+def _get_starting_change(b, r, max_colors, max_size, piece):
     # Gets a valid initial change that adds a one-cell colorable piece to the
     # board, returning None if no such starting change exists.
     changes = _enumerate_one_cell_changes(b, max_size)
     while len(changes) > 0:
         change = r.choice(changes)
         changes.remove(change)
-        if _change_is_colorable(b, change, max_colors):
+        if _change_is_colorable(b, change, max_colors, piece):
             return change
     return None
 
@@ -98,19 +117,19 @@ def _enumerate_one_cell_changes(b, max_size):
     return changes
 
 
-def _try_add_cells(b, r, max_colors, max_size):
+def _try_add_cells(b, r, max_colors, max_size, piece):
     # Tries to add a cell or cells to the new piece on the board in a way that
     # ensures the resulting board is within the given board size and is
     # colorable with the given colors.  Returns the number of cells added
     # (zero, if no cell could be added).
-    (cell_h_changes, cell_v_changes) = _get_cell_changes(b, max_size)
-    col_changes = _get_col_changes(b, max_size)
+    (cell_h_changes, cell_v_changes) = _get_cell_changes(b, max_size, piece)
+    col_changes = _get_col_changes(b, max_size, piece)
     while (len(cell_h_changes) > 0 or
            len(cell_v_changes) > 0 or
            len(col_changes) > 0):
         change = _remove_change(r, cell_h_changes, cell_v_changes, col_changes)
-        if _change_is_colorable(b, change, max_colors):
-            _make_change(b, change)
+        if _change_is_colorable(b, change, max_colors, piece):
+            _make_change(b, change, piece)
             # print
             # print change
             # print b
@@ -121,41 +140,45 @@ def _try_add_cells(b, r, max_colors, max_size):
     return 0
 
 
-def _get_cell_changes(b, max_size):
-    # Returns a list of all possible standard cell insertions.
+def _get_cell_changes(b, max_size, piece=None):
+    # Returns a list of all possible standard cell insertions.  Only the
+    # cells next to the new piece are candidates, so we only look at those.
     (max_width, max_height) = max_size
+    if piece is None:
+        piece = _NewPiece(b)
+    width = b.width
+    candidates = set()
+    for (x, y) in piece.get_coords():
+        for (x_ofs, y_ofs) in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            (i, j) = (x + x_ofs, y + y_ofs)
+            if 0 <= i < width and j >= 0:
+                col_height = b.get_column_height(i)
+                if col_height < max_height and j <= col_height:
+                    candidates.add((i, j))
     h_changes = []
     v_changes = []
-    width = b.width
-    for i in range(width):
-        col_height = b.get_column_height(i)
-        if col_height < max_height:
-            for j in range(col_height + 1):
-                if b.get_value(i, j) != -1:
-                    if (b.get_value(i + 1, j) == -1 or
-                            b.get_value(i - 1, j) == -1):
-                        h_changes.append(_InsertCellChange(i, j))
-                    elif (b.get_value(i, j - 1) == -1 or
-                          b.get_value(i, j + 1) == -1):
-                        v_changes.append(_InsertCellChange(i, j))
+    for (i, j) in sorted(candidates):
+        if b.get_value(i, j) != -1:
+            if (b.get_value(i + 1, j) == -1 or
+                    b.get_value(i - 1, j) == -1):
+                h_changes.append(_InsertCellChange(i, j))
+            elif (b.get_value(i, j - 1) == -1 or
+                  b.get_value(i, j + 1) == -1):
+                v_changes.append(_InsertCellChange(i, j))
     return h_changes, v_changes
 
 
-def _get_col_changes(b, max_size):
+def _get_col_changes(b, max_size, piece=None):
     # Returns a list of all possible column insertions.
     (max_width, max_height) = max_size
     width = b.width
     if width == max_width or max_height < 1:
         return []
-    highest_new_pieces = []
-    for i in range(width):
-        col_height = b.get_column_height(i)
-        highest_new_piece = 0
-        for j in range(col_height):
-            value = b.get_value(i, j)
-            if value == -1:
-                highest_new_piece = j + 1
-        highest_new_pieces.append(highest_new_piece)
+    if piece is None:
+        piece = _NewPiece(b)
+    highest_new_pieces = [0] * width
+    for (i, col) in piece.cols.items():
+        highest_new_pieces[i] = col[-1] + 1
     changes = []
     for (i, (height1, height2)) in enumerate(zip(highest_new_pieces + [0],
                                                  [0] + highest_new_pieces)):
@@ -185,80 +208,127 @@ def _pick(r, items):
     return items.pop(index)
 
 
-def _change_is_colorable(b, change, max_colors):
+def _change_is_colorable(b, change, max_colors, piece=None):
     # Returns True if the board is still colorable after the given change is
-    # made, False otherwise.
-    b2 = b.clone()
-    _make_change(b2, change)
-    colors = _get_new_piece_colors(b2, max_colors)
-    return len(colors) > 0
+    # made, False otherwise.  Rather than making the change on a copy of the
+    # board, we work out where the new piece would be after the change and
+    # check the colors of its neighbors, looking through the change.
+    if piece is None:
+        piece = _NewPiece(b)
+    if isinstance(change, _InsertColumnChange):
+        (col, height) = (change.col, change.height)
+        coords = [(col, j) for j in range(height)]
+        for (i, j) in piece.get_coords():
+            if i >= col:
+                coords.append((i + 1, j))
+            else:
+                coords.append((i, j))
 
+        def get_value(i, j):
+            if i == col:
+                if 0 <= j < height:
+                    return -1
+                return None
+            elif i > col:
+                return b.get_value(i - 1, j)
+            else:
+                return b.get_value(i, j)
+    elif isinstance(change, _InsertCellChange):
+        col = change.col
+        data = _get_inserted_column(b, change)
+        coords = [(col, j) for (j, value) in enumerate(data) if value == -1]
+        for (i, j) in piece.get_coords():
+            if i != col:
+                coords.append((i, j))
+
+        def get_value(i, j):
+            if i == col:
+                if 0 <= j < len(data):
+                    return data[j]
+                return None
+            else:
+                return b.get_value(i, j)
+    else:
+        assert False
 
-def _make_change(b, change):
-    # Makes the given change to the board (side-affects board parameter).
+    colors = set(range(1, max_colors + 1))
+    for (i, j) in coords:
+        for (x_ofs, y_ofs) in ((-1, 0), (1, 0), (0, -1), (0, 1)):
+            colors.discard(get_value(i + x_ofs, j + y_ofs))
+        if len(colors) == 0:
+            return False
+    return True
+
+
+def _make_change(b, change, piece=None):
+    # Makes the given change to the board (side-affects board parameter),
+    # updating the given new piece to match.
     if isinstance(change, _InsertColumnChange):
         b.insert_columns(change.col, 1)
         for i in range(change.height):
             b.set_value(change.col, i, -1)
     elif isinstance(change, _InsertCellChange):
-        new_indexes = []
-        data = []
-        col_height = b.get_column_height(change.col)
-        assert change.height <= col_height
-        for i in range(col_height):
-            value = b.get_value(change.col, i)
-            if i == change.height:
-                data.append(-1)
-            if value == -1:
-                new_indexes.append(i)
-            else:
-                data.append(value)
-        if change.height == col_height:
-            data.append(-1)
-        for index in new_indexes:
-            data.insert(index, -1)
+        data = _get_inserted_column(b, change)
         for (i, value) in enumerate(data):
             b.set_value(change.col, i, value)
     else:
         assert False
+    if piece is not None:
+        piece.update(b, change)
+
+
+def _get_inserted_column(b, change):
+    # Returns the list of values in the column of the given _InsertCellChange
+    # after the change is made.  Cells of the new piece stay where they are
+    # while the other cells from the change's height up move up one.
+    new_indexes = []
+    data = []
+    col_height = b.get_column_height(change.col)
+    assert change.height <= col_height
+    for i in range(col_height):
+        value = b.get_value(change.col, i)
+        if i == change.height:
+            data.append(-1)
+        if value == -1:
+            new_indexes.append(i)
+        else:
+            data.append(value)
+    if change.height == col_height:
+        data.append(-1)
+    for index in new_indexes:
+        data.insert(index, -1)
+    return data
 
 
-def _color_piece_random(b, r, max_colors):
+def _color_piece_random(b, r, max_colors, piece=None):
     # Colors in the new piece on the board with a random color using the given
     # random number generator and number of colors.
-    colors = _get_new_piece_colors(b, max_colors)
+    if piece is None:
+        piece = _NewPiece(b)
+    colors = _get_new_piece_colors(b, max_colors, piece)
     color = r.choice(list(colors))
-    _color_piece(b, color)
+    _color_piece(b, color, piece)
 
 
-def _color_piece(b, color):
+def _color_piece(b, color, piece=None):
     # Colors in the new piece on the board with the given color.
-    coords = _get_new_piece_coords(b)
-    for (i, j) in coords:
+    if piece is None:
+        piece = _NewPiece(b)
+    for (i, j) in piece.get_coords():
         b.set_value(i, j, color)
 
 
-def _get_new_piece_colors(b, max_colors):
+def _get_new_piece_colors(b, max_colors, piece=None):
     # Returns the set of possible colors for the new piece.
+    if piece is None:
+        piece = _NewPiece(b)
     colors = set(range(1, max_colors + 1))
-    coords = _get_new_piece_coords(b)
-    for (i, j) in coords:
+    for (i, j) in piece.get_coords():
         for (x_ofs, y_ofs) in ((-1, 0), (1, 0), (0, -1), (0, 1)):
             colors.discard(b.get_value(i + x_ofs, j + y_ofs))
     return colors
 
 
-def _get_new_piece_coords(b):
-    # Returns a list of new piece coordinates.
-    coords = []
-    for i in range(b.width):
-        col_height = b.get_column_height(i)
-        for j in range(col_height):
-            if b.get_value(i, j) == -1:
-                coords.append((i, j))
-    return coords
-
-
 def _get_piece_sizes(r, fragmentation, fill, max_size):
     # Returns a list containing the new piece sizes for the board using the
     # given random number generator, fragmentation, fill, and board size.
@@ -283,6 +353,51 @@ def _get_piece_size(r, fragmentation, max_area):
     return piece_size
 
 
+class _NewPiece(object):
+    # Tracks the coordinates of the new piece (the cells with value -1) as
+    # changes are made to the board, so that the generator does not have to
+    # scan the whole board to find it.
+    def __init__(self, b=None):
+        # Map from x coordinates to sorted lists of the y coordinates of the
+        # new piece's cells in that column.
+        self.cols = {}
+        if b is not None:
+            for i in range(b.width):
+                self._scan_column(b, i)
+
+    def get_coords(self):
+        # Returns a list of the new piece's coordinates, in the order of a
+        # column-by-column scan of the board.
+        coords = []
+        for i in sorted(self.cols.keys()):
+            for j in self.cols[i]:
+                coords.append((i, j))
+        return coords
+
+    def update(self, b, change):
+        # Updates the piece for the given change, which has just been made to
+        # the board.
+        if isinstance(change, _InsertColumnChange):
+            cols = {}
+            for (i, col) in self.cols.items():
+                if i >= change.col:
+                    cols[i + 1] = col
+                else:
+                    cols[i] = col
+            cols[change.col] = list(range(change.height))
+            self.cols = cols
+        else:
+            self._scan_column(b, change.col)
+
+    def _scan_column(self, b, i):
+        col = [j for j in range(b.get_column_height(i))
+               if b.get_value(i, j) == -1]
+        if len(col) > 0:
+            self.cols[i] = col
+        else:
+            self.cols.pop(i, None)
+
+
 class _InsertColumnChange(object):
     # Represents the action of inserting a column into the board at column
     # "col" containing "height" cells.
@@ -321,12 +436,89 @@ class _InsertCellChange(object):
         return "_InsertCellChange(%d, %d)" % (self.col, self.height)
 
 
-def main():
-    b = generate_board(seed=1,
-                       fragmentation=1,
-                       max_colors=5,
-                       max_size=(20, 10))
-    print(repr(b))
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Generates implode boards.  With --count, generates a '
+                    'batch of boards from consecutive seeds in parallel.')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='seed of the (first) board')
+    parser.add_argument('--count', type=int,
+                        help='number of boards to generate')
+    parser.add_argument('--level', type=int, choices=sorted(LEVELS),
+                        help='difficulty level, setting the board size and '
+                             'fragmentation')
+    parser.add_argument('--size', type=_parse_size, default=(20, 10),
+                        help='board size as WIDTHxHEIGHT')
+    parser.add_argument('--fragmentation', type=int, default=1)
+    parser.add_argument('--colors', type=int, default=5,
+                        help='maximum number of colors')
+    parser.add_argument('--processes', type=int,
+                        help='number of worker processes (default: one per '
+                             'CPU)')
+    parser.add_argument('--output',
+                        help='file to write the boards to as a puzzle pack')
+    args = parser.parse_args(argv)
+    (max_size, fragmentation) = (args.size, args.fragmentation)
+    if args.level is not None:
+        (max_size, fragmentation) = LEVELS[args.level]
+
+    if args.count is None:
+        b = generate_board(seed=args.seed,
+                           fragmentation=fragmentation,
+                           max_colors=args.colors,
+                           max_size=max_size)
+        print(repr(b))
+        return
+
+    jobs = [(seed, fragmentation, args.colors, max_size)
+            for seed in range(args.seed, args.seed + args.count)]
+    start_time = time.time()
+    pool = multiprocessing.Pool(args.processes)
+    try:
+        puzzles = pool.map(_generate_puzzle, jobs,
+                           chunksize=max(1, len(jobs) // (4 * _cpu_count())))
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start_time
+
+    if args.output is not None:
+        f = open(args.output, 'wb')
+        try:
+            f.write(savegame.dumps_puzzle_pack(puzzles))
+        finally:
+            f.close()
+    print('Generated %d boards in %.2f s (%.1f boards/s)' %
+          (len(puzzles), elapsed, len(puzzles) / max(elapsed, 1e-6)))
+
+
+def _parse_size(s):
+    # Parses a board size given as WIDTHxHEIGHT.
+    try:
+        (width, height) = [int(x) for x in s.split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('size must be WIDTHxHEIGHT')
+    return (width, height)
+
+
+def _cpu_count():
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def _generate_puzzle(job):
+    # Generates a board for a batch, returning it as a (name, board data,
+    # winning moves) tuple for a puzzle pack.
+    (seed, fragmentation, max_colors, max_size) = job
+    (b, winning_moves) = generate_board(seed=seed,
+                                        fragmentation=fragmentation,
+                                        max_colors=max_colors,
+                                        max_size=max_size)
+    name = 'seed %d, fragmentation %d, %d colors, %dx%d' % (
+        seed, fragmentation, max_colors, max_size[0], max_size[1])
+    return (name, savegame.encode_board(b), winning_moves)
 
 
 if __name__ == '__main__':
@@ -16,10 +16,15 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+import os
+import shutil
+import tempfile
 import unittest
 
 import board
 import boardgen
+import savegame
+import testutil
 
 
 class TestEnumerateOneCellChanges(unittest.TestCase):
@@ -43,8 +48,8 @@ class TestEnumerateOneCellChanges(unittest.TestCase):
         self._assertChanges(changes, expChanges)
 
     def test4(self):
-        b = _make_board(""".1.
-                           211""")
+        b = testutil.make_board(""".1.
+                                    211""")
         cell = boardgen._InsertCellChange
         col = boardgen._InsertColumnChange
         expChanges = [col(0, 1),
@@ -214,40 +219,55 @@ class TestMakeChange(unittest.TestCase):
         self._assertMakeChange(before, change, after)
 
     def _assertMakeChange(self, before, change, after):
-        b = _make_board(before)
-        expBoard = _make_board(after)
+        b = testutil.make_board(before)
+        expBoard = testutil.make_board(after)
         boardgen._make_change(b, change)
         self.assertEqual(b, expBoard)
 
 
 class TestChangeIsColorable(unittest.TestCase):
     def test1(self):
-        b = _make_board("""""")
+        b = testutil.make_board("""""")
         change = boardgen._InsertCellChange(0, 0)
         self.assertTrue(boardgen._change_is_colorable(b, change, 1))
 
     def test2(self):
-        b = _make_board("""1""")
+        b = testutil.make_board("""1""")
         change = boardgen._InsertCellChange(0, 0)
         self.assertFalse(boardgen._change_is_colorable(b, change, 1))
 
     def test3(self):
-        b = _make_board("""1""")
+        b = testutil.make_board("""1""")
         change = boardgen._InsertCellChange(0, 0)
         self.assertTrue(boardgen._change_is_colorable(b, change, 2))
 
     def test4(self):
-        b = _make_board("""1.2
-                           1*3""")
+        b = testutil.make_board("""1.2
+                                    1*3""")
         change = boardgen._InsertCellChange(1, 0)
         self.assertFalse(boardgen._change_is_colorable(b, change, 2))
 
     def test5(self):
-        b = _make_board("""1.2
-                           1*3""")
+        b = testutil.make_board("""1.2
+                                    1*3""")
         change = boardgen._InsertCellChange(1, 0)
         self.assertFalse(boardgen._change_is_colorable(b, change, 3))
 
+    def testPiece(self):
+        # The tracked new piece must give the same answer as a board scan.
+        b = testutil.make_board("""1..
+                                    1*3""")
+        piece = boardgen._NewPiece(b)
+        for change in (boardgen._InsertColumnChange(1, 2),
+                       boardgen._InsertCellChange(0, 1),
+                       boardgen._InsertCellChange(2, 0)):
+            self.assertEqual(
+                boardgen._change_is_colorable(b, change, 3, piece),
+                boardgen._change_is_colorable(b, change, 3))
+            boardgen._make_change(b, change, piece)
+            self.assertEqual(piece.get_coords(),
+                             boardgen._NewPiece(b).get_coords())
+
 
 class TestGetCellChanges(unittest.TestCase):
 
@@ -284,7 +304,7 @@ class TestGetCellChanges(unittest.TestCase):
         self._assertCellChanges(s, expChanges, (3, 4))
 
     def _assertCellChanges(self, s, expChanges, board_size):
-        b = _make_board(s)
+        b = testutil.make_board(s)
         (h_changes, v_changes) = boardgen._get_cell_changes(b, board_size)
         changes = h_changes + v_changes
         print(changes)
@@ -324,7 +344,7 @@ class TestGetColChanges(unittest.TestCase):
         self._assertCellChanges(s, expChanges, (3, 3))
 
     def _assertCellChanges(self, s, expChanges, board_size):
-        b = _make_board(s)
+        b = testutil.make_board(s)
         changes = boardgen._get_col_changes(b, board_size)
         self.assertEqual(len(changes), len(expChanges))
         for change in changes:
@@ -333,27 +353,27 @@ class TestGetColChanges(unittest.TestCase):
             self.assertTrue(change in changes)
 
 
-def _make_board(s):
-    b = board.Board()
-    # Constructs a board using the given string.
-    lines = [x.strip() for x in s.strip().splitlines()]
-
-    if len(lines) == 0:
-        return b
-
-    # Make sure all lines are the same length.
-    lens = [len(x) for x in lines]
-    assert len(set(lens)) == 1
-
-    val_map = {'.': None, '*': -1}
-    for i in range(1, 9 + 1):
-        val_map[str(i)] = i
-
-    for (i, line) in enumerate(reversed(lines)):
-        for (j, ch) in enumerate(line):
-            b.set_value(j, i, val_map[ch])
-
-    return b
+class TestMain(unittest.TestCase):
+
+    def testBatch(self):
+        path = tempfile.mkdtemp()
+        try:
+            pack_path = os.path.join(path, 'pack')
+            boardgen.main(['--seed', '4', '--count', '3', '--level', '1',
+                           '--processes', '2', '--output', pack_path])
+            f = open(pack_path, 'rb')
+            puzzles = savegame.loads_puzzle_pack(f.read())
+            f.close()
+        finally:
+            shutil.rmtree(path)
+        self.assertEqual(len(puzzles), 3)
+        (size, fragmentation) = boardgen.LEVELS[1]
+        for (seed, puzzle) in zip(range(4, 7), puzzles):
+            (name, board_data, winning_moves) = puzzle
+            (b, expected_moves) = boardgen.generate_board(
+                seed=seed, fragmentation=fragmentation, max_size=size)
+            self.assertEqual(board_data, savegame.encode_board(b))
+            self.assertEqual(winning_moves, expected_moves)
 
 
 if __name__ == '__main__':
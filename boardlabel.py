@@ -0,0 +1,105 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Connected-component labelling of boards.  When NumPy is available, large
+# boards are labelled with vectorized label propagation over a 2-D array,
+# which keeps the cost of finding every group flat as boards grow; otherwise
+# the board's own flood fill is used.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Cell value used in label arrays for empty cells.
+_EMPTY = -128
+
+# Boards with fewer cells than this are labelled with the board's own flood
+# fill, which is faster than NumPy at small sizes.
+_NUMPY_MIN_AREA = 400
+
+
+def get_all_components(b):
+    """Returns every contiguous shape on the board, of any size, as a list of
+       sets of coordinate tuples."""
+    if numpy is None or b.width * b.height < _NUMPY_MIN_AREA:
+        examined = set()
+        all_components = []
+        for x in range(b.min_x, b.max_x):
+            for y in range(b.get_column_height(x)):
+                if (x, y) not in examined and b.get_value(x, y) is not None:
+                    contiguous = b.get_contiguous(x, y)
+                    examined.update(contiguous)
+                    all_components.append(contiguous)
+        return all_components
+    roots = _label_array(_board_array(b))
+    (xs, ys) = numpy.nonzero(roots >= 0)
+    components = {}
+    for (x, y, root) in zip((xs + b.min_x).tolist(), ys.tolist(),
+                            roots[xs, ys].tolist()):
+        components.setdefault(root, set()).add((x, y))
+    return list(components.values())
+
+
+def _board_array(b):
+    # Returns a 2-D int8 array of the board's values, indexed by
+    # [x - b.min_x, y], with _EMPTY for empty cells.
+    grid = numpy.full((b.width, b.height), _EMPTY, dtype=numpy.int8)
+    value_map = b.get_value_map()
+    if len(value_map) > 0:
+        coords = numpy.array(list(value_map.keys()), dtype=numpy.intp)
+        values = numpy.array(list(value_map.values()), dtype=numpy.int8)
+        grid[coords[:, 0] - b.min_x, coords[:, 1]] = values
+    return grid
+
+
+def _label_array(grid):
+    # Labels the connected components of equal, non-empty values in grid.
+    # Returns an array of the same shape holding, for each cell, the flat
+    # index of the lowest-indexed cell in its component, or -1 for empty
+    # cells.
+    #
+    # Each pass takes the minimum label over each cell's equal-valued
+    # neighbors, then jumps every label to the label of the cell it points
+    # at.  Labels only ever point at cells in the same component with a
+    # lower or equal index, so this converges on the component minimum in a
+    # logarithmic number of passes for most shapes.
+    filled = (grid != _EMPTY)
+    same_x = filled[:-1, :] & (grid[:-1, :] == grid[1:, :])
+    same_y = filled[:, :-1] & (grid[:, :-1] == grid[:, 1:])
+    labels = numpy.arange(grid.size, dtype=numpy.intp).reshape(grid.shape)
+    labels[~filled] = -1
+    while True:
+        new_labels = labels.copy()
+        numpy.minimum(new_labels[:-1, :],
+                      numpy.where(same_x, labels[1:, :], labels[:-1, :]),
+                      out=new_labels[:-1, :])
+        numpy.minimum(new_labels[1:, :],
+                      numpy.where(same_x, labels[:-1, :], labels[1:, :]),
+                      out=new_labels[1:, :])
+        numpy.minimum(new_labels[:, :-1],
+                      numpy.where(same_y, labels[:, 1:], labels[:, :-1]),
+                      out=new_labels[:, :-1])
+        numpy.minimum(new_labels[:, 1:],
+                      numpy.where(same_y, labels[:, :-1], labels[:, 1:]),
+                      out=new_labels[:, 1:])
+        flat = new_labels.ravel()
+        jumped = numpy.where(filled, flat[numpy.maximum(new_labels, 0)], -1)
+        if numpy.array_equal(jumped, labels):
+            return labels
+        labels = jumped
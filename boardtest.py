@@ -0,0 +1,280 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import random
+import unittest
+
+import board
+import boardgen
+import boardlabel
+import testutil
+
+
+class TestArrayBoard(unittest.TestCase):
+
+    def testSetValue(self):
+        b = board.ArrayBoard((2, 2))
+        b.set_value(1, 3, 4)
+        self.assertEqual(b.get_value(1, 3), 4)
+        self.assertEqual(b.get_value(0, 0), None)
+        self.assertEqual((b.width, b.height), (2, 4))
+        b.set_value(1, 3, None)
+        self.assertTrue(b.is_empty())
+
+    def testNegativeValue(self):
+        b = board.ArrayBoard()
+        b.set_value(0, 0, -1)
+        self.assertEqual(b.get_value(0, 0), -1)
+
+    def testClone(self):
+        b = testutil.make_board("""12
+                                    31""", board.ArrayBoard)
+        b2 = b.clone()
+        b2.set_value(0, 0, 2)
+        self.assertEqual(b.get_value(0, 0), 3)
+        self.assertEqual(b2.get_value(0, 0), 2)
+
+    def testMove(self):
+        b = testutil.make_board(""".1.2
+                                    1123
+                                    2313""", board.ArrayBoard)
+        expected = testutil.make_board("""...2
+                                           ..23
+                                           2313""", board.ArrayBoard)
+        b.clear_pieces(b.get_contiguous(1, 2))
+        b.drop_pieces()
+        b.remove_empty_columns()
+        self.assertEqual(b, expected)
+        self.assertEqual(repr(b), repr(expected))
+
+    def testApplyMove(self):
+        b = testutil.make_board("""12.
+                                    11.
+                                    123""", board.ArrayBoard)
+        self.assertEqual(b.apply_move(b.get_contiguous(0, 0)),
+                         ({(1, 2): (1, 1)}, {1: 0, 2: 1}))
+        self.assertEqual(repr(b), '2.\n23')
+
+    def testApplyMoveMatchesSteps(self):
+        # Plays random moves with apply_move() and with the separate steps,
+        # and checks that they agree, along with the hashes and group
+        # indexes kept up to date through them.
+        r = random.Random(0)
+        for board_class in (board.Board, board.ArrayBoard):
+            for seed in range(5):
+                (b, moves) = boardgen.generate_board(seed=seed,
+                                                     max_size=(12, 10))
+                b = _copy_board(b, board_class())
+                b2 = b.clone()
+                while b.has_move():
+                    contiguous = r.choice(b.groups())
+                    b2.clear_pieces(contiguous)
+                    drop_map = dict((coord, coord2) for (coord, coord2)
+                                    in b2.get_drop_map().items()
+                                    if coord != coord2)
+                    b2.drop_pieces()
+                    slide_map = b2.get_slide_map()
+                    b2.remove_empty_columns()
+                    self.assertEqual(b.apply_move(set(contiguous)),
+                                     (drop_map, slide_map))
+                    self.assertEqual(b, b2)
+                    self.assertEqual((b.width, b.height),
+                                     (b2.width, b2.height))
+                    self.assertEqual(b.hash(), b2.hash())
+                    self.assertEqual(sorted(map(sorted, b.groups())),
+                                     sorted(map(sorted,
+                                                b2.get_all_contiguous())))
+
+    def testColumns(self):
+        b = testutil.make_board("""12
+                                    34""", board.ArrayBoard)
+        b.insert_columns(1, 2)
+        self.assertEqual(b.width, 4)
+        self.assertEqual(b.get_empty_columns(), [1, 2])
+        self.assertEqual(b.get_slide_map(), {3: 1})
+        b.delete_columns(0, 2)
+        self.assertEqual(repr(b), '.2\n.4')
+
+    def testMatchesBoard(self):
+        # Plays random moves on both board types and checks that they agree
+        # at every step.
+        r = random.Random(0)
+        for seed in range(10):
+            (b, moves) = boardgen.generate_board(seed=seed, max_size=(12, 10))
+            b2 = _copy_board(b, board.ArrayBoard((12, 10)))
+            while True:
+                self.assertEqual(b2, b)
+                self.assertEqual(b2.get_value_map(), b.get_value_map())
+                self.assertEqual((b2.width, b2.height), (b.width, b.height))
+                all_contiguous = b.get_all_contiguous()
+                self.assertEqual(sorted(map(sorted, all_contiguous)),
+                                 sorted(map(sorted, b2.get_all_contiguous())))
+                moves = sorted((min(contiguous), len(contiguous),
+                                b.get_value(*min(contiguous)))
+                               for contiguous in all_contiguous)
+                self.assertEqual(sorted(b.iter_moves()), moves)
+                self.assertEqual(sorted(b2.iter_moves()), moves)
+                if len(all_contiguous) == 0:
+                    break
+                contiguous = r.choice(all_contiguous)
+                for test_board in (b, b2):
+                    test_board.clear_pieces(contiguous)
+                self.assertEqual(b2.get_drop_map(), b.get_drop_map())
+                for test_board in (b, b2):
+                    test_board.drop_pieces()
+                self.assertEqual(b2.get_slide_map(), b.get_slide_map())
+                for test_board in (b, b2):
+                    test_board.remove_empty_columns()
+
+    def testGenerateCompact(self):
+        for seed in range(5):
+            (b, moves) = boardgen.generate_board(seed=seed, max_size=(8, 6))
+            (b2, moves2) = boardgen.generate_board(seed=seed,
+                                                   max_size=(8, 6),
+                                                   compact=True)
+            self.assertTrue(isinstance(b2, board.ArrayBoard))
+            self.assertEqual(b2, b)
+            self.assertEqual(moves2, moves)
+
+
+class TestGetAllComponents(unittest.TestCase):
+
+    def testComponents(self):
+        b = testutil.make_board(""".1.2
+                                    1123
+                                    2313""", board.ArrayBoard)
+        components = boardlabel.get_all_components(b)
+        self.assertEqual(len(components), 7)
+        self.assertIn(set([(0, 1), (1, 1), (1, 2)]), components)
+        self.assertIn(set([(3, 0), (3, 1)]), components)
+        self.assertIn(set([(0, 0)]), components)
+
+    @unittest.skipIf(boardlabel.numpy is None, "NumPy is not available")
+    def testMatchesFloodFill(self):
+        for size in ((11, 1), (30, 20), (60, 50)):
+            b = board.make_test_board(*size)
+            components = boardlabel.get_all_components(b)
+            self.assertEqual(sum(len(x) for x in components),
+                             len(b.get_value_map()))
+            for contiguous in components:
+                (x, y) = min(contiguous)
+                self.assertEqual(contiguous, b.get_contiguous(x, y))
+
+
+class TestGroupIndex(unittest.TestCase):
+
+    def testGroupAt(self):
+        b = testutil.make_board(""".1.2
+                                    1123
+                                    2313""", board.ArrayBoard)
+        self.assertEqual(b.group_at(0, 1), set([(0, 1), (1, 1), (1, 2)]))
+        self.assertEqual(b.group_at(3, 0), set([(3, 0), (3, 1)]))
+        self.assertEqual(b.group_at(2, 2), set())
+        self.assertTrue(b.has_move())
+        b.clear_pieces(b.group_at(0, 1))
+        b.drop_pieces()
+        self.assertFalse(b.has_move())
+        self.assertEqual(b.groups(), [])
+
+    def testHasAnyMove(self):
+        for board_class in (board.Board, board.ArrayBoard):
+            b = testutil.make_board("""12
+                                        21
+                                        12""", board_class)
+            self.assertFalse(b.has_any_move())
+            b.set_value(1, 1, 2)
+            self.assertTrue(b.has_any_move())
+            for size in ((11, 5), (30, 20)):
+                b = board.make_test_board(size[0], size[1], board_class)
+                self.assertEqual(b.has_any_move(),
+                                 len(b.get_all_contiguous()) > 0)
+
+    def testMatchesGetAllContiguous(self):
+        r = random.Random(0)
+        for board_class in (board.Board, board.ArrayBoard):
+            for seed in range(10):
+                (b, moves) = boardgen.generate_board(seed=seed,
+                                                     max_size=(12, 10))
+                b = _copy_board(b, board_class())
+                while b.has_move():
+                    groups = b.groups()
+                    self.assertEqual(sorted(map(sorted, groups)),
+                                     sorted(map(sorted,
+                                                b.get_all_contiguous())))
+                    (x, y) = min(r.choice(groups))
+                    self.assertEqual(b.group_at(x, y),
+                                     b.get_contiguous(x, y))
+                    b.clear_pieces(b.group_at(x, y))
+                    b.drop_pieces()
+                    b.remove_empty_columns()
+                self.assertEqual(b.get_all_contiguous(), [])
+
+
+class TestHash(unittest.TestCase):
+
+    def testEqualBoards(self):
+        b = testutil.make_board("""1..
+                                    2.1
+                                    213""", board.Board)
+        b2 = _copy_board(b, board.ArrayBoard())
+        self.assertEqual(b.hash(), b2.hash())
+        b2.set_value(2, 1, 3)
+        self.assertNotEqual(b.hash(), b2.hash())
+        b2.set_value(2, 1, 1)
+        self.assertEqual(b.hash(), b2.hash())
+        self.assertNotEqual(board.Board().hash(), b.hash())
+
+    def testColumns(self):
+        # Moving columns around changes the hash, and moving them back
+        # restores it.
+        b = testutil.make_board("""12
+                                    12""", board.ArrayBoard)
+        h = b.hash()
+        b.insert_columns(1, 1)
+        self.assertNotEqual(b.hash(), h)
+        b.remove_empty_columns()
+        self.assertEqual(b.hash(), h)
+        b.delete_columns(0, 1)
+        expected = testutil.make_board("""2
+                                           2""", board.ArrayBoard)
+        self.assertEqual(b.hash(), expected.hash())
+
+    def testMatchesNewBoard(self):
+        # The hash kept up to date through moves matches the hash of a new
+        # board with the same contents.
+        r = random.Random(0)
+        for board_class in (board.Board, board.ArrayBoard):
+            (b, moves) = boardgen.generate_board(seed=0, max_size=(12, 10))
+            b = _copy_board(b, board_class())
+            while b.has_any_move():
+                b.clear_pieces(r.choice(b.get_all_contiguous()))
+                b.drop_pieces()
+                b.remove_empty_columns()
+                self.assertEqual(b.hash(),
+                                 _copy_board(b, board.Board()).hash())
+
+
+def _copy_board(b, b2):
+    # Copies the contents of board b onto (empty) board b2.
+    for ((x, y), value) in b.get_value_map().items():
+        b2.set_value(x, y, value)
+    return b2
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,1082 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Drawing of the game board and its animations.
+#
+# The drawers don't depend on GTK, so that they can draw to any cairo
+# context.  Each is given a function returning the size of the area it draws
+# in, and a function that is called with a Rect when part of that area needs
+# to be redrawn.  GridWidget and HelpWidget draw them in a widget, and the
+# offscreen module draws them to image surfaces.
+
+import math
+import random
+
+try:
+    import cairo
+except ImportError:
+    # Only needed for drawing; the drawers can be set up without it.
+    cairo = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import color
+import instrument
+
+# Color of the background.
+_BG_COLOR = (0.35, 0.35, 0.7)
+
+# Color of the selection border.
+_SELECTED_COLOR = (1.0, 1.0, 1.0)
+
+# Outline color of the others selected dots.
+_OTHERS_CELLS_COLOR = (0.0, 0.0, 0.0)
+
+# Ratio of the width/height (whichever is smaller) to leave as a margin
+# around the playing board.
+_BORDER = 0.05
+
+# Ratio of the cell width to leave as a space between blocks.
+_BLOCK_GAP = 0.1
+
+# Ratio of the cell width to overdraw the selection border.
+_SELECTED_MARGIN = 0.1
+
+# Ratio of the cell width to use for the radius of the selection cursor circle.
+_SELECTED_DOT_RADIUS = 0.1
+
+# Smiley face.
+_SMILEY = """
+    ..xxxxxx..
+    .x......x.
+    x........x
+    x..x..x..x
+    x........x
+    x.x....x.x
+    x..xxxx..x
+    .x......x.
+    ..xxxxxx..
+"""
+
+# Removal animation stages.
+_ANIM_STAGE_NONE = 0
+_ANIM_STAGE_SHRINK = 1
+_ANIM_STAGE_FALL = 2
+_ANIM_STAGE_ZOOM = 3
+
+_ANIM_STAGES = [
+    _ANIM_STAGE_NONE,
+    _ANIM_STAGE_SHRINK,
+    _ANIM_STAGE_FALL,
+    _ANIM_STAGE_ZOOM,
+]
+
+# Animation time scaling factor (in seconds per tick).
+_ANIM_SCALE = 0.04
+
+# Number of steps to round the size of shrinking and growing blocks to, so
+# that their sprites can be cached.
+_SCALE_BUCKETS = 16
+
+# Maximum number of sprites kept by each drawer.
+_MAX_SPRITES = 256
+
+# Ways of drawing blocks: copying pre-rendered sprites, filling one path per
+# color, or filling each block on its own, which is slowest but simplest.
+DRAW_SPRITES = 'sprites'
+DRAW_BATCHED = 'batched'
+DRAW_BLOCKS = 'blocks'
+
+
+class Rect(object):
+    """Rectangle of the drawing area that needs to be redrawn."""
+    def __init__(self, x=0, y=0, width=0, height=0):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def __eq__(self, other):
+        return (isinstance(other, Rect) and
+                (self.x, self.y, self.width, self.height) ==
+                (other.x, other.y, other.width, other.height))
+
+    def __repr__(self):
+        return 'Rect(%d, %d, %d, %d)' % (self.x, self.y, self.width,
+                                         self.height)
+
+
+# NOTE: We separate the drawing/interaction code from the GTK widget code so
+# that we can reuse the drawing in a widget that draws more on top; apparently
+# GTK doesn't like overlapping widgets.
+
+class BoardDrawer(object):
+    """Object to manage drawing of the game board."""
+
+    def __init__(self, get_size_func, invalidate_rect_func, *args, **kwargs):
+        super(BoardDrawer, self).__init__(*args, **kwargs)
+        self._board = None
+        self._board_width = 0
+        self._board_height = 0
+        self._selected_cell = None
+        self._others_cells = {}  # {key: [fg, bg, x, y]}
+        self._contiguous_map = {}
+
+        # (x, y, scale, value) tuples for the blocks on the board.
+        self._blocks = []
+
+        # Drawing offset and scale.
+        self._board_transform = None
+        self._sprites = _SpriteCache()
+        self._draw_mode = DRAW_SPRITES
+
+        # Surface holding the background and blocks, made on the next draw
+        # after the board or size changes, and its size.
+        self._board_surface = None
+        self._board_surface_size = None
+
+        # Callback functions set by owner.
+        self._get_size_func = get_size_func
+        self._invalidate_rect_func = invalidate_rect_func
+
+    def set_board(self, value):
+        self._board = value
+        self._recalc_board_dimensions()
+        self._recalc_contiguous_map()
+        self._recalc_blocks()
+        self._board_surface = None
+        (width, height) = self._get_size_func()
+        self.resize(width, height)
+        if self._selected_cell is not None:
+            # If a cell is selected, clamp it to new board boundaries.
+            (x, y) = self._selected_cell
+            x = max(0, min(self._board_width - 1, x))
+            y = max(0, min(self._board_height - 1, y))
+            self._selected_cell = (x, y)
+        self._others_cells = {}
+        self._invalidate_board()
+
+    def _recalc_contiguous_map(self):
+        self._contiguous_map = {}
+        if self._board is None:
+            return
+        all_contiguous = self._board.groups()
+        for contiguous in all_contiguous:
+            for coord in contiguous:
+                self._contiguous_map[coord] = contiguous
+
+    def set_draw_mode(self, mode):
+        """Sets how blocks are drawn, to DRAW_SPRITES, DRAW_BATCHED or
+           DRAW_BLOCKS."""
+        self._draw_mode = mode
+        self._board_surface = None
+        self._invalidate_board()
+
+    def _recalc_blocks(self):
+        self._blocks = []
+        if self._board is None:
+            return
+        for ((x, y), value) in self._board.get_value_map().items():
+            self._blocks.append((x, y, 1.0, value))
+
+    def set_others_cells(self, key, fg, bg, x, y):
+        if key in self._others_cells:
+            self._invalidate_selection(self._others_cells[key][2:])
+        self._others_cells[key] = (fg, bg, x, y)
+        self._invalidate_selection(self._others_cells[key][2:])
+
+    def get_selected_cell(self):
+        return self._selected_cell
+
+    def set_selected_cell(self, value):
+        self._selected_cell = value
+
+    def select_center_cell(self):
+        if not self.board_is_valid():
+            return
+        if self._selected_cell is not None:
+            self._invalidate_selection(self._selected_cell)
+        self._selected_cell = (int(self._board_width // 2),
+                               self._board_height - 1)
+        self._invalidate_selection(self._selected_cell)
+
+    def move_selected_cell(self, x_offset, y_offset):
+        # Moves the selected cell in the direction of the given offset,
+        # returning True if the cell changed after clamping, False otherwise.
+        (x, y) = self._selected_cell
+        x = max(0, min(self._board_width - 1, x + x_offset))
+        y = max(0, min(self._board_height - 1, y + y_offset))
+        if self._selected_cell == (x, y):
+            return False
+        else:
+            self._invalidate_selection(self._selected_cell)
+            self._selected_cell = (x, y)
+            self._invalidate_selection(self._selected_cell)
+            return True
+
+    def set_mouse_selection(self, x, y):
+        # Sets the mouse selection to the block corresponding to the given x
+        # and y coordinates.
+        if not self.board_is_valid():
+            self._selected_cell = None
+            return False
+        old_selection = self._selected_cell
+        (x1, y1) = self._display_to_cell(x, y)
+        if (0 <= x1 < self._board_width and 0 <= y1 < self._board_height):
+            if self._selected_cell != (x1, y1):
+                self._selected_cell = (x1, y1)
+                self._invalidate_selection(old_selection)
+                self._invalidate_selection(self._selected_cell)
+                return True
+        return False
+
+    def get_block_coord(self, x, y):
+        if not self.board_is_valid():
+            return (0, 0)
+        (block_x, block_y) = self._cell_to_display(x + 0.5, y + 0.5)
+        return (block_x, block_y)
+
+    def _invalidate_board(self):
+        (width, height) = self._get_size_func()
+        self._invalidate_rect_func(Rect(0, 0, width, height))
+
+    def _invalidate_selection(self, selection_coord):
+        contiguous = self._contiguous_map.get(selection_coord, None)
+        if contiguous is not None and len(contiguous) >= 3:
+            self._invalidate_block_set(contiguous, _SELECTED_MARGIN)
+        elif selection_coord is not None:
+            self._invalidate_block_set(set((selection_coord,)), 0)
+
+    def _invalidate_block_set(self, block_set, margin):
+        if len(block_set) == 0:
+            return
+        x_coords = [q[0] for q in block_set]
+        y_coords = [q[1] for q in block_set]
+        min_x1 = min(x_coords) - margin
+        max_x1 = max(x_coords) + margin + 1
+        min_y1 = min(y_coords) - margin
+        max_y1 = max(y_coords) + margin + 1
+        pt1 = self._cell_to_display(min_x1, min_y1)
+        pt2 = self._cell_to_display(max_x1, max_y1)
+        min_x2 = math.floor(min(pt1[0], pt2[0])) - 1
+        max_x2 = math.ceil(max(pt1[0], pt2[0])) + 1
+        min_y2 = math.floor(min(pt1[1], pt2[1])) - 1
+        max_y2 = math.ceil(max(pt1[1], pt2[1])) + 1
+        self._invalidate_rect_func(Rect(
+            int(min_x2), int(min_y2),
+            int(max_x2 - min_x2), int(max_y2 - min_y2)))
+
+    def _display_to_cell(self, x, y):
+        # Converts from display coordinate to a cell coordinate.
+        return self._board_transform.inverse_transform(x, y)
+
+    def _cell_to_display(self, x, y):
+        # Converts from a cell coordinate to a display coordinate.
+        return self._board_transform.transform(x, y)
+
+    def resize(self, width, height):
+        self._board_surface = None
+        if not self.board_is_valid():
+            self._board_transform = _BoardTransform()
+        else:
+            self._board_transform = _BoardTransform()
+            self._board_transform.setup(width, height, self._board_width,
+                                        self._board_height)
+            self._sprites.set_cell_size(self._board_transform.scale_x)
+
+    @instrument.timed('drawers.BoardDrawer.draw')
+    def draw(self, cr, width, height):
+        # Draws the widget.  The background and blocks are copied from the
+        # board surface, which is only drawn to when the board or size
+        # changes, so redrawing a selection costs no more than the part of
+        # the board cairo has been clipped to.
+        if (self._board_surface is None or
+                self._board_surface_size != (width, height)):
+            self._board_surface = self._make_board_surface(cr, width, height)
+            self._board_surface_size = (width, height)
+        cr.set_source_surface(self._board_surface, 0, 0)
+        cr.paint()
+        cr.save()
+        self._board_transform.set_up_cairo(cr)
+        self._draw_board(cr)
+        cr.restore()
+
+    def _make_board_surface(self, cr, width, height):
+        # Returns a surface like the target of cr with the background and
+        # blocks drawn on it.
+        surface = cr.get_target().create_similar(cairo.CONTENT_COLOR,
+                                                 width, height)
+        cr2 = cairo.Context(surface)
+        _draw_background(cr2, width, height)
+        self._board_transform.set_up_cairo(cr2)
+        self._draw_blocks(cr2)
+        return surface
+
+    def _draw_board(self, cr):
+        # Draws the selection and cursors over the board, where each unit
+        # corresponds to a cell on the board.
+        self._draw_selected(cr)
+        self._draw_others_selected_dot(cr)
+        self._draw_selected_dot(cr)
+
+    def _draw_blocks(self, cr):
+        if not self.board_is_valid():
+            return
+        _draw_blocks(cr, self._draw_mode, self._sprites, self._blocks)
+
+    def _draw_selected(self, cr):
+        # Draws a white background to selected blocks, then redraws blocks
+        # on top.
+        if (self._selected_cell is None or
+                self._selected_cell not in self._contiguous_map):
+            return
+        contiguous = self._contiguous_map[self._selected_cell]
+        value = self._board.get_value(*self._selected_cell)
+        cr.set_source_rgb(*_SELECTED_COLOR)
+        for (x, y) in contiguous:
+            self._add_square(cr, x, y, _SELECTED_MARGIN)
+        cr.fill()
+        _draw_blocks(cr, self._draw_mode, self._sprites,
+                     [(x, y, 1.0, value) for (x, y) in contiguous])
+
+    def _add_square(self, cr, x, y, margin):
+        # Adds a square in the given grid cell with the given margin to the
+        # current path.
+        x1 = float(x) - margin
+        y1 = float(y) - margin
+        size = 1.0 + margin * 2
+        cr.rectangle(x1, y1, size, size)
+
+    def _draw_selected_dot(self, cr):
+        if self._selected_cell is None:
+            return
+        # Draws a dot indicating the selected cell.
+        cr.set_source_rgb(*_SELECTED_COLOR)
+
+        (x, y) = self._selected_cell
+        cr.arc(x + 0.5, y + 0.5, _SELECTED_DOT_RADIUS, 0, math.pi * 2.0)
+        cr.fill()
+
+    def _draw_others_selected_dot(self, cr):
+        if self._others_cells is None:
+            return
+
+        # Draws dots indicating others selected cells
+        for key, value in self._others_cells.items():
+            (fg, bg, x, y) = value
+            arcs = [
+                [_SELECTED_DOT_RADIUS * 2, _OTHERS_CELLS_COLOR],
+                [_SELECTED_DOT_RADIUS * 1.8, fg.get_rgba()],
+                [_SELECTED_DOT_RADIUS, bg.get_rgba()],
+            ]
+
+            for radius, rgba in arcs:
+                cr.arc(x + 0.5, y + 0.5, radius, 0, math.pi * 2.0)
+                cr.set_source_rgba(*rgba)
+                cr.fill()
+
+    def _recalc_board_dimensions(self):
+        if self.board_is_valid():
+            self._board_width = self._board.width
+            self._board_height = self._board.height
+        else:
+            self._board_width = 1
+            self._board_height = 1
+
+    def board_is_valid(self):
+        # Returns True if the board is set and has valid dimensions (>=1).
+        return (self._board is not None and not self._board.is_empty())
+
+
+class RemovalDrawer(object):
+    """Object to manage the drawing of the animation of removing blocks."""
+
+    def __init__(self, get_size_func, invalidate_rect_func, *args, **kwargs):
+        super(RemovalDrawer, self).__init__(*args, **kwargs)
+        self._board = None
+        self._board_width = 0
+        self._board_height = 0
+        self._transition = None
+        self._anim_time = 0.0
+        self._anim_stage = _ANIM_STAGE_SHRINK
+
+        # Game animation variables.  The frames are the block coordinates at
+        # the end of each stage, in board units, and the transforms the
+        # board transform at the end of each stage for the current size.
+        self._anim_coords = []
+        self._anim_frames = {}
+        self._anim_transforms = {}
+        self._anim_lengths = {}
+
+        # Map from stages to (start, change) arrays for tweening the
+        # coordinates with NumPy, when it is available.
+        self._anim_tweens = {}
+
+        # Drawing offset and scale.
+        self._board_transform = _BoardTransform()
+        self._sprites = _SpriteCache()
+        self._draw_mode = DRAW_SPRITES
+
+        # Callback functions set by owner.
+        self._get_size_func = get_size_func
+        self._invalidate_rect_func = invalidate_rect_func
+
+    def init(self, board, transition):
+        """Sets up the animation of a move, given the board before the move
+           and the history.MoveTransition of the move."""
+        self._board = board
+        self._recalc_board_dimensions()
+        self._transition = transition
+        self._anim_stage = _ANIM_STAGE_SHRINK
+        self._recalc_game_anim_frames()
+        self._recalc_anim_transforms()
+        self._recalc_anim_coords()
+        self._invalidate_board()
+
+    def next_stage(self):
+        """Sets the current animation stage; returns False if there are no
+           more stages, True otherwise."""
+        stage = self._anim_stage + 1
+        while stage < len(self._anim_lengths) and \
+                not self._anim_lengths[stage]:
+            stage += 1
+        if stage == len(self._anim_lengths):
+            return False
+        self._anim_stage = stage
+        self._invalidate_board()
+        return True
+
+    def set_draw_mode(self, mode):
+        """Sets how blocks are drawn, to DRAW_SPRITES, DRAW_BATCHED or
+           DRAW_BLOCKS."""
+        self._draw_mode = mode
+        self._invalidate_board()
+
+    def set_anim_time(self, value):
+        """Sets the time passed for the current stage."""
+        self._anim_time = value
+        self._recalc_anim_coords()
+        self._invalidate_board()
+
+    def get_anim_length(self):
+        """Returns the length of the current stage in seconds."""
+        return self._anim_lengths[self._anim_stage]
+
+    def _invalidate_board(self):
+        (width, height) = self._get_size_func()
+        self._invalidate_rect_func(Rect(0, 0, width, height))
+
+    @instrument.timed('drawers.RemovalDrawer._recalc_game_anim_frames')
+    def _recalc_game_anim_frames(self):
+        # Works out the frames from the move's transition.  They don't
+        # depend on the size of the drawing area, so they are only worked
+        # out once per move.
+        if not self.board_is_valid():
+            self._anim_frames = {}
+            self._anim_lengths = {}
+            self._anim_tweens = {}
+            return
+
+        transition = self._transition
+        frames = {}
+        lengths = {}
+
+        # Calculate starting coords.
+        starting_frame = []
+        value_map = self._board.get_value_map()
+        for ((i, j), value) in list(value_map.items()):
+            starting_frame.append((i, j, 1.0, value))
+        frames[_ANIM_STAGE_NONE] = starting_frame
+        lengths[_ANIM_STAGE_NONE] = 0.0
+
+        # Calculate shrinking coords.
+        shrinking_frame = []
+        for (i, j, scale, value) in starting_frame:
+            if (i, j) in transition.removed:
+                shrinking_frame.append((i, j, 0.0, value))
+            else:
+                shrinking_frame.append((i, j, scale, value))
+        frames[_ANIM_STAGE_SHRINK] = shrinking_frame
+        if len(transition.removed) > 0:
+            lengths[_ANIM_STAGE_SHRINK] = 3 * _ANIM_SCALE
+        else:
+            lengths[_ANIM_STAGE_SHRINK] = 0.0
+
+        # Calculate falling coords.
+        falling_frame = []
+        drop_map = transition.drop_map
+        max_change = 0
+        for (i, j, scale, value) in shrinking_frame:
+            coord = drop_map.get((i, j), None)
+            if coord is None:
+                falling_frame.append((i, j, scale, value))
+            else:
+                falling_frame.append((coord[0], coord[1], scale, value))
+                max_change = max(max_change, j - coord[1])
+        frames[_ANIM_STAGE_FALL] = falling_frame
+        if max_change > 0:
+            lengths[_ANIM_STAGE_FALL] = 3 * _ANIM_SCALE
+        else:
+            lengths[_ANIM_STAGE_FALL] = 0.0
+
+        # Calculate sliding/zooming coords.
+        zooming_frame = []
+        slide_map = transition.slide_map
+        max_change = 0
+        for(i, j, scale, value) in falling_frame:
+            if i in slide_map:
+                zooming_frame.append((slide_map[i], j, scale, value))
+                max_change = max(max_change, i - slide_map[i])
+            else:
+                zooming_frame.append((i, j, scale, value))
+        frames[_ANIM_STAGE_ZOOM] = zooming_frame
+        if max_change > 0 or self._is_zooming():
+            lengths[_ANIM_STAGE_ZOOM] = 4 * _ANIM_SCALE
+        else:
+            lengths[_ANIM_STAGE_ZOOM] = 0.0
+
+        self._anim_frames = frames
+        self._anim_lengths = lengths
+
+        self._anim_tweens = {}
+        if numpy is not None:
+            # Keep each frame as an array of (x, y, scale, value) rows, and
+            # the change from the previous frame.  The values don't change,
+            # so they come through the tween exactly.
+            arrays = {}
+            for (stage, coords) in frames.items():
+                arrays[stage] = numpy.array(coords, dtype=float).reshape(-1, 4)
+            for (i, stage) in enumerate(_ANIM_STAGES[1:]):
+                start = arrays[_ANIM_STAGES[i]]
+                self._anim_tweens[stage] = (start, arrays[stage] - start)
+
+    def _recalc_anim_transforms(self):
+        # Works out the board transform at the end of each stage for the
+        # current size.  The board only changes size in the last stage.
+        if not self.board_is_valid():
+            self._anim_transforms = {}
+            return
+
+        (width, height) = self._get_size_func()
+        transform = _BoardTransform()
+        transform.setup(width,
+                        height,
+                        self._board_width,
+                        self._board_height)
+        transforms = dict((stage, transform) for stage in _ANIM_STAGES)
+        self._sprites.set_cell_size(transform.scale_x)
+        if self._is_zooming():
+            (board_width2, board_height2) = self._transition.new_size
+            zooming_transform = _BoardTransform()
+            zooming_transform.setup(width,
+                                    height,
+                                    board_width2,
+                                    board_height2)
+            transforms[_ANIM_STAGE_ZOOM] = zooming_transform
+        self._anim_transforms = transforms
+
+    def _is_zooming(self):
+        # Returns True if the board changes size in the move.
+        return (self._transition.new_size !=
+                (self._board_width, self._board_height))
+
+    def _recalc_anim_coords(self):
+        if not self.board_is_valid():
+            self._anim_coords = []
+            self._board_transform = _BoardTransform()
+            return
+
+        stage = self._anim_stage
+        prev_stage = _ANIM_STAGES[_ANIM_STAGES.index(stage, 1) - 1]
+        start_coords = self._anim_frames[prev_stage]
+        end_coords = self._anim_frames[stage]
+        start_transform = self._anim_transforms[prev_stage]
+        end_transform = self._anim_transforms[stage]
+
+        length = self.get_anim_length()
+        if length == 0.0:
+            w = 0.0
+        else:
+            w = float(min(1.0, max(0.0, self._anim_time / length)))
+        inv_w = (1.0 - w)
+
+        if start_coords is end_coords:
+            self._anim_coords = start_coords
+        elif self._anim_tweens:
+            (start, change) = self._anim_tweens[stage]
+            self._anim_coords = (start + change * w).tolist()
+        else:
+            coords = []
+            for i in range(len(start_coords)):
+                (x1, y1, s1, color1) = start_coords[i]
+                (x2, y2, s2, color2) = end_coords[i]
+                x = (x1 * inv_w + x2 * w)
+                y = (y1 * inv_w + y2 * w)
+                s = (s1 * inv_w + s2 * w)
+                coords.append((x, y, s, color1))
+            self._anim_coords = coords
+
+        if start_transform is end_transform:
+            self._board_transform = start_transform
+        else:
+            self._board_transform = _tween(start_transform, end_transform, w)
+
+    def resize(self, width, height):
+        self._recalc_anim_transforms()
+        self._recalc_anim_coords()
+        self._invalidate_board()
+
+    @instrument.timed('drawers.RemovalDrawer.draw')
+    def draw(self, cr, width, height):
+        # Draws the widget.
+        _draw_background(cr, width, height)
+        cr.save()
+        self._board_transform.set_up_cairo(cr)
+        self._animate_board(cr)
+        cr.restore()
+
+    def _animate_board(self, cr):
+        _draw_blocks(cr, self._draw_mode, self._sprites, self._anim_coords)
+
+    def _recalc_board_dimensions(self):
+        if self.board_is_valid():
+            self._board_width = self._board.width
+            self._board_height = self._board.height
+        else:
+            self._board_width = 1
+            self._board_height = 1
+
+    def board_is_valid(self):
+        # Returns True if the board is set and has valid dimensions (>=1).
+        return (self._board is not None and not self._board.is_empty())
+
+
+class WinDrawer(object):
+    """Object to manage the drawing of the win animation."""
+
+    def __init__(self, get_size_func, invalidate_rect_func, *args, **kwargs):
+        super(WinDrawer, self).__init__(*args, **kwargs)
+
+        self._anim_time = 0.0
+
+        self._win_coords = []
+        self._win_starts = []
+        self._win_ends = []
+
+        # Arrays of the start times, time lengths, start (x, y, scale) and
+        # change in (x, y, scale) of the tiles, for tweening the coordinates
+        # with NumPy when it is available.
+        self._win_tween = None
+        self._anim_length = 0
+        self._win_size = (0, 0)
+        self._win_transform = None
+        self._win_color = 0
+        self._sprites = _SpriteCache()
+        self._draw_mode = DRAW_SPRITES
+
+        (tiles, width, height) = self._get_win_tiles()
+        self._win_size = (width, height)
+
+        # Callback functions set by owner.
+        self._get_size_func = get_size_func
+        self._invalidate_rect_func = invalidate_rect_func
+
+    def set_draw_mode(self, mode):
+        """Sets how blocks are drawn, to DRAW_SPRITES, DRAW_BATCHED or
+           DRAW_BLOCKS."""
+        self._draw_mode = mode
+        self._invalidate_board()
+
+    def set_anim_time(self, t):
+        if self._anim_time != t:
+            self._anim_time = t
+            self._recalc_anim_coords()
+            self._invalidate_board()
+
+    def _recalc_anim_coords(self):
+        t = max(0.0, min(self._anim_length, self._anim_time))
+        if self._win_tween is not None:
+            (start_times, lengths, start, change) = self._win_tween
+            w = numpy.clip((t - start_times) / lengths, 0.0, 1.0)
+            self._win_coords = (start + change * w[:, numpy.newaxis]).tolist()
+            return
+        coords = []
+        for i in range(len(self._win_starts)):
+            (s_time, s_x, s_y, s_scale) = self._win_starts[i]
+            (e_time, e_x, e_y, e_scale) = self._win_ends[i]
+            delta_time = e_time - s_time
+            w = max(0.0, min(1.0, (t - s_time) / delta_time))
+            inv_w = (1.0 - w)
+            x = s_x * inv_w + e_x * w
+            y = s_y * inv_w + e_y * w
+            scale = s_scale * inv_w + e_scale * w
+            coords.append((x, y, scale))
+        self._win_coords = coords
+
+    def get_win_color(self):
+        return self._win_color
+
+    def set_win_state(self, draw_flag, win_color):
+        if draw_flag:
+            self.init()
+            self._win_color = win_color
+            self.set_anim_time(self.get_anim_length())
+
+    def get_anim_length(self):
+        """Returns the length of the win animation (in seconds)."""
+        return self._anim_length
+
+    def init(self, seed=None):
+        # Chooses a new random order and color for the tiles, from the given
+        # seed if there is one.
+        r = random.Random()
+        r.seed(seed)
+        (tiles, width, height) = self._get_win_tiles()
+        tiles = self._reorder_win_tiles(r, tiles, width, height)
+        self._win_starts = self._get_win_starts(tiles, width, height)
+        self._win_ends = self._get_win_ends(tiles)
+        self._win_tween = None
+        if numpy is not None and tiles:
+            starts = numpy.array(self._win_starts, dtype=float)
+            ends = numpy.array(self._win_ends, dtype=float)
+            self._win_tween = (starts[:, 0], ends[:, 0] - starts[:, 0],
+                               starts[:, 1:], ends[:, 1:] - starts[:, 1:])
+        self._anim_length = self._get_win_length(tiles)
+        self._win_size = (width, height)
+        self._win_color = r.randint(1, 5)
+        (width, height) = self._get_size_func()
+        self.resize(width, height)
+
+    def _invalidate_board(self):
+        (width, height) = self._get_size_func()
+        self._invalidate_rect_func(Rect(0, 0, width, height))
+
+    def _get_win_tiles(self):
+        # Returns a list of ending tile coordinates making up the smiley face,
+        # as well as the width and height in tiles.
+        data = [list(x.strip()) for x in _SMILEY.strip().splitlines()]
+        height = len(data)
+        widths = set([len(x) for x in data])
+        assert len(widths) == 1
+        width = widths.pop()
+        assert width > 0
+        assert height > 0
+        tiles = []
+        for i in range(height):
+            for j in range(width):
+                if data[i][j] == 'x':
+                    # Invert y axis because we use the board tile engine to
+                    # display, which uses cartesian coordinates instead of
+                    # display coordinates.
+                    tiles.append((j, height - i - 1))
+        return (tiles, width, height)
+
+    def _reorder_win_tiles(self, r, tiles, width, height):
+        # Re-sorts tiles by several randomly chosen criteria.
+        def radial(coord):
+            (x, y) = coord
+            x = float(x) / width - 0.5
+            y = float(y) / height - 0.5
+            return 2 * math.sqrt(x * x + y * y)
+
+        def x(coord):
+            return float(coord[0]) / width
+
+        def y(coord):
+            return float(coord[1]) / height
+
+        def angle(coord):
+            (x, y) = coord
+            x = float(x) / width - 0.5
+            y = float(y) / height - 0.5
+            angle = math.atan2(y, x)
+            return (angle / math.pi + 1) / 2
+        funcs = [radial, x, y, angle]
+        r.shuffle(funcs)
+        invs = [r.choice((-1, 1)), r.choice((-1, 1))]
+        pairs = []
+        w = r.random()
+        for coord in tiles:
+            score = funcs[0](coord) * invs[0] + funcs[1](coord) * invs[1] * w
+            pairs.append((score, coord))
+        pairs.sort()
+        # Re-interleave pairs, if desired.
+        if r.randint(0, 1):
+            index1 = int(len(pairs) // 2)
+            list1 = pairs[:index1]
+            list2 = pairs[index1:]
+            if r.randint(0, 1):
+                list2.reverse()
+            pairs = _interleave(list1, list2)
+        return [pair[1] for pair in pairs]
+
+    def _get_win_starts(self, tiles, width, height):
+        # Returns a list of starting coordinates for tiles.
+        starts = []
+        assert width > 0
+        assert height > 0
+        start_x = width / 2.0 - 0.5
+        start_y = height / 2.0 - 0.5
+        for (i, (x, y)) in enumerate(tiles):
+            starts.append((i * _ANIM_SCALE, start_x, start_y, 0.0))
+            # starts.append((i, x, y, 0.0))
+        return starts
+
+    def _get_win_ends(self, tiles):
+        # Returns a list of ending coordinates for the tiles in the unit
+        # square.
+        ends = []
+        for (i, (x, y)) in enumerate(tiles):
+            ends.append(((i + 8) * _ANIM_SCALE, x, y, 1.0))
+        return ends
+
+    def _get_win_length(self, tiles):
+        # Returns the length of the win animation for the given set of tiles
+        # (in seconds).
+        return (len(tiles) + 8) * _ANIM_SCALE
+
+    def resize(self, width, height):
+        if self._win_size == (0, 0):
+            return
+        self._win_transform = _BoardTransform()
+        self._win_transform.setup(width,
+                                  height,
+                                  self._win_size[0],
+                                  self._win_size[1])
+        self._sprites.set_cell_size(self._win_transform.scale_x)
+
+    @instrument.timed('drawers.WinDrawer.draw')
+    def draw(self, cr, width, height):
+        # Draws the widget.
+        _draw_background(cr, width, height)
+        cr.save()
+        self._win_transform.set_up_cairo(cr)
+        self._draw_win(cr)
+        cr.restore()
+
+    def _draw_win(self, cr):
+        _draw_blocks(cr, self._draw_mode, self._sprites,
+                     [(x, y, scale, self._win_color)
+                      for (x, y, scale) in self._win_coords])
+
+
+def _draw_background(cr, width, height):
+    # Draws the board background using the given cairo context and
+    # width/height.
+    cr.set_source_rgb(*_BG_COLOR)
+    cr.rectangle(0, 0, width, height)
+    cr.fill()
+
+
+def _draw_blocks(cr, draw_mode, sprites, blocks):
+    # Draws (x, y, scale, value) blocks in the board space set up on cr, in
+    # the given way.  The values may be floats, from the NumPy tweens.
+    if draw_mode == DRAW_BATCHED:
+        _fill_blocks(cr, blocks)
+    elif draw_mode == DRAW_BLOCKS:
+        _fill_each_block(cr, blocks)
+    else:
+        _draw_sprites(cr, sprites, blocks)
+
+
+def _fill_blocks(cr, blocks):
+    # Draws blocks with a single path and fill for each color.
+    paths = {}
+    for (x, y, scale, value) in blocks:
+        if scale > 0.0:
+            paths.setdefault(int(value), []).append((x, y, scale))
+    for (value, cells) in paths.items():
+        cr.set_source_rgb(*color.colors[value])
+        for (x, y, scale) in cells:
+            inset = 0.5 + scale * (_BLOCK_GAP - 0.5)
+            size = 1.0 - inset * 2
+            cr.rectangle(x + inset, y + inset, size, size)
+        cr.fill()
+
+
+def _fill_each_block(cr, blocks):
+    # Draws blocks with a fill for each one.
+    for (x, y, scale, value) in blocks:
+        if scale > 0.0:
+            cr.set_source_rgb(*color.colors[int(value)])
+            inset = 0.5 + scale * (_BLOCK_GAP - 0.5)
+            size = 1.0 - inset * 2
+            cr.rectangle(x + inset, y + inset, size, size)
+            cr.fill()
+
+
+def _draw_sprites(cr, sprites, blocks):
+    # Draws (x, y, scale, value) blocks, where x and y are in the board space
+    # set up on cr, by copying their sprites to whole pixel positions.  The
+    # board space is only ever scaled and translated.
+    matrix = cr.get_matrix()
+    cell_size = int(round(abs(matrix.xx)))
+    if cell_size < 1:
+        return
+    target = cr.get_target()
+    cr.save()
+    cr.identity_matrix()
+    for (x, y, scale, value) in blocks:
+        bucket = int(round(scale * _SCALE_BUCKETS))
+        if bucket <= 0:
+            continue
+        sprite = sprites.get(target, int(value), cell_size, bucket)
+        x1 = int(round(min(matrix.xx * x, matrix.xx * (x + 1)) + matrix.x0))
+        y1 = int(round(min(matrix.yy * y, matrix.yy * (y + 1)) + matrix.y0))
+        cr.set_source_surface(sprite, x1, y1)
+        cr.rectangle(x1, y1, cell_size, cell_size)
+        cr.fill()
+    cr.restore()
+
+
+class _SpriteCache(object):
+    # Pre-rendered images of blocks, keyed on the block color, the cell size
+    # in pixels, the scale bucket of the block and the device scale of the
+    # surface drawn on.  The owner gives it the cell size whenever the board
+    # transform is set up, and it is cleared when the cell size changes, as
+    # the sprites for the old size won't be used again.  A new board of the
+    # same size keeps the sprites.
+    def __init__(self):
+        self._sprites = {}
+        self._cell_size = None
+
+    def clear(self):
+        self._sprites = {}
+
+    def set_cell_size(self, scale):
+        # Sets the cell size from the scale of the board transform.
+        cell_size = int(round(abs(scale)))
+        if cell_size != self._cell_size:
+            self._cell_size = cell_size
+            self.clear()
+
+    def get(self, target, value, cell_size, bucket):
+        try:
+            device_scale = target.get_device_scale()
+        except AttributeError:
+            device_scale = (1.0, 1.0)
+        key = (value, cell_size, bucket, device_scale)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            if len(self._sprites) >= _MAX_SPRITES:
+                self._sprites = {}
+            sprite = _render_sprite(target, value, cell_size, bucket)
+            self._sprites[key] = sprite
+        return sprite
+
+
+def _render_sprite(target, value, cell_size, bucket):
+    # Returns a surface like the target holding the block for a cell of the
+    # given size, shrunk by the given scale bucket.
+    sprite = target.create_similar(cairo.CONTENT_COLOR_ALPHA, cell_size,
+                                   cell_size)
+    cr = cairo.Context(sprite)
+    scale = float(bucket) / _SCALE_BUCKETS
+    inset = (0.5 + scale * (_BLOCK_GAP - 0.5)) * cell_size
+    cr.set_source_rgb(*color.colors[value])
+    cr.rectangle(inset, inset, cell_size - inset * 2, cell_size - inset * 2)
+    cr.fill()
+    return sprite
+
+
+class _BoardTransform(object):
+    # Represents a transformation from board space to screen space.
+    def __init__(self):
+        self.scale_x = 1
+        self.scale_y = 1
+        self.offset_x = 0
+        self.offset_y = 0
+        self.to_center_x = 0
+        self.to_center_y = 0
+        self.from_center_x = 0
+        self.from_center_y = 0
+
+    def set_up_cairo(self, cr):
+        cr.translate(self.to_center_x,
+                     self.to_center_y)
+        cr.scale(self.scale_x,
+                 self.scale_y)
+        cr.translate(self.from_center_x,
+                     self.from_center_y)
+
+    def setup(self, width, height, cells_across, cells_down):
+        if cells_across == 0 or cells_down == 0:
+            self.scale_x = 1
+            self.scale_y = 1
+            self.offset_x = 0
+            self.offset_y = 0
+            return
+
+        border = min(float(width) * _BORDER, float(height) * _BORDER)
+        internal_width = width - border * 2
+        internal_height = height - border * 2
+
+        scale_x = float(internal_width) / cells_across
+        scale_y = float(internal_height) / cells_down
+
+        scale = min(scale_x, scale_y)
+
+        self.scale_x = scale
+        self.scale_y = -scale
+        self.offset_x = (width - cells_across * scale) / 2
+        self.offset_y = height - (height - cells_down * scale) / 2
+
+        self.to_center_x = float(width) / 2
+        self.to_center_y = self.offset_y
+        self.from_center_x = -float(cells_across) / 2
+        self.from_center_y = 0
+
+    def transform(self, x, y):
+        x1 = int(float(x) * self.scale_x + self.offset_x)
+        y1 = int(float(y) * self.scale_y + self.offset_y)
+        return (x1, y1)
+
+    def inverse_transform(self, x, y):
+        if self.scale_x == 0 or self.scale_y == 0:
+            return (0, 0)
+        x1 = int((float(x) - self.offset_x) / self.scale_x)
+        y1 = int((float(y) - self.offset_y) / self.scale_y)
+        return (x1, y1)
+
+
+def _tween(trans1, trans2, w):
+    t = _BoardTransform()
+    inv_w = 1.0 - w
+    t.scale_x = trans1.scale_x * inv_w + trans2.scale_x * w
+    t.scale_y = trans1.scale_y * inv_w + trans2.scale_y * w
+    t.offset_x = trans1.offset_x * inv_w + trans2.offset_x * w
+    t.offset_y = trans1.offset_y * inv_w + trans2.offset_y * w
+    t.to_center_x = trans1.to_center_x * inv_w + trans2.to_center_x * w
+    t.to_center_y = trans1.to_center_y * inv_w + trans2.to_center_y * w
+    t.from_center_x = trans1.from_center_x * inv_w + trans2.from_center_x * w
+    t.from_center_y = trans1.from_center_y * inv_w + trans2.from_center_y * w
+    return t
+
+
+def _interleave(*args):
+    # From Richard Harris' recipe:
+    # http://aspn.activestate.com/ASPN/Cookbook/Python/Recipe/511480
+    for idx in range(0, max(len(arg) for arg in args)):
+        for arg in args:
+            try:
+                yield arg[idx]
+            except IndexError:
+                continue
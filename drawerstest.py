@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import unittest
+
+import boardgen
+import drawers
+import history
+
+
+class TestDrawers(unittest.TestCase):
+
+    def setUp(self):
+        self.size = (400, 300)
+        self.rects = []
+
+    def _get_size(self):
+        return self.size
+
+    def _make_drawer(self, drawer_class):
+        return drawer_class(self._get_size, self.rects.append)
+
+    def testSetBoard(self):
+        (b, winning_moves) = _make_board()
+        drawer = self._make_drawer(drawers.BoardDrawer)
+        drawer.set_board(b)
+        self.assertEqual(self.rects, [drawers.Rect(0, 0, 400, 300)])
+
+    def testSelection(self):
+        (b, winning_moves) = _make_board()
+        drawer = self._make_drawer(drawers.BoardDrawer)
+        drawer.set_board(b)
+        del self.rects[:]
+        (x, y) = drawer.get_block_coord(*winning_moves[0])
+        self.assertTrue(drawer.set_mouse_selection(x, y))
+        self.assertEqual(drawer.get_selected_cell(), winning_moves[0])
+        self.assertEqual(len(self.rects), 1)
+        for rect in self.rects:
+            self.assertTrue(rect.width > 0 and rect.height > 0)
+            self.assertTrue(0 <= rect.x and rect.x + rect.width <= 400)
+            self.assertTrue(0 <= rect.y and rect.y + rect.height <= 300)
+        self.assertFalse(drawer.set_mouse_selection(x, y))
+
+    def testRemovalStages(self):
+        (b, winning_moves) = _make_board()
+        drawer = self._make_drawer(drawers.RemovalDrawer)
+        drawer.init(b, history.get_transition(
+            b, b.get_contiguous(*winning_moves[0])))
+        self.assertTrue(drawer.get_anim_length() > 0)
+        stages = 1
+        while drawer.next_stage():
+            stages += 1
+        self.assertTrue(stages >= 2)
+
+    def testRemovalResize(self):
+        # Resizing changes only the transforms, not the frames worked out
+        # from the move.
+        (b, winning_moves) = _make_board()
+        drawer = self._make_drawer(drawers.RemovalDrawer)
+        drawer.init(b, history.get_transition(
+            b, b.get_contiguous(*winning_moves[0])))
+        drawer.set_anim_time(0.1)
+        frames = drawer._anim_frames
+        coords = drawer._anim_coords
+        x = drawer._board_transform.scale_x
+        self.size = (800, 600)
+        drawer.resize(*self.size)
+        self.assertTrue(drawer._anim_frames is frames)
+        self.assertEqual(drawer._anim_coords, coords)
+        self.assertAlmostEqual(drawer._board_transform.scale_x, x * 2)
+
+    def testSpriteCellSize(self):
+        # The sprite cache is only cleared when the cell size in pixels
+        # changes.
+        sprites = drawers._SpriteCache()
+        sprites.set_cell_size(10.2)
+        sprites._sprites['sprite'] = None
+        sprites.set_cell_size(9.8)
+        self.assertEqual(len(sprites._sprites), 1)
+        sprites.set_cell_size(-10.0)
+        self.assertEqual(len(sprites._sprites), 1)
+        sprites.set_cell_size(20.0)
+        self.assertEqual(len(sprites._sprites), 0)
+
+    def testFillBlocks(self):
+        # Filling one path per color draws the same blocks as filling each
+        # block on its own.
+        (b, winning_moves) = _make_board()
+        drawer = self._make_drawer(drawers.RemovalDrawer)
+        drawer.init(b, history.get_transition(
+            b, b.get_contiguous(*winning_moves[0])))
+        drawer.set_anim_time(0.05)
+        blocks = drawer._anim_coords
+        fills = []
+        for mode in (drawers.DRAW_BLOCKS, drawers.DRAW_BATCHED):
+            cr = _RecordingContext()
+            drawers._draw_blocks(cr, mode, None, blocks)
+            fills.append(cr.fills)
+        self.assertEqual(len(fills[0]), len(blocks))
+        self.assertEqual(len(fills[1]), len(set(value for (x, y, scale, value)
+                                                in blocks)))
+        self.assertEqual(
+            sorted((rgb, rect) for (rgb, rects) in fills[0] for rect in rects),
+            sorted((rgb, rect) for (rgb, rects) in fills[1] for rect in rects))
+
+    def testWinSeed(self):
+        drawer1 = self._make_drawer(drawers.WinDrawer)
+        drawer2 = self._make_drawer(drawers.WinDrawer)
+        drawer1.init(5)
+        drawer2.init(5)
+        self.assertEqual(drawer1.get_win_color(), drawer2.get_win_color())
+        length = drawer1.get_anim_length()
+        drawer1.set_anim_time(length / 2)
+        drawer2.set_anim_time(length / 2)
+        self.assertEqual(drawer1._win_coords, drawer2._win_coords)
+
+    @unittest.skipIf(drawers.numpy is None, "NumPy is not available")
+    def testTweens(self):
+        (b, winning_moves) = _make_board()
+        transition = history.get_transition(
+            b, b.get_contiguous(*winning_moves[0]))
+        coords = []
+        numpy = drawers.numpy
+        try:
+            for module_numpy in (numpy, None):
+                drawers.numpy = module_numpy
+                removal_drawer = self._make_drawer(drawers.RemovalDrawer)
+                removal_drawer.init(b, transition)
+                win_drawer = self._make_drawer(drawers.WinDrawer)
+                win_drawer.init(5)
+                stage_coords = []
+                while True:
+                    for t in (0.0, 0.05, 0.5):
+                        removal_drawer.set_anim_time(t)
+                        stage_coords.append(removal_drawer._anim_coords)
+                    if not removal_drawer.next_stage():
+                        break
+                for t in (0.1, 0.5, 1.0, 2.0):
+                    win_drawer.set_anim_time(t)
+                    stage_coords.append(win_drawer._win_coords)
+                coords.append(stage_coords)
+        finally:
+            drawers.numpy = numpy
+        self.assertEqual(len(coords[0]), len(coords[1]))
+        for (frame1, frame2) in zip(*coords):
+            self.assertEqual(len(frame1), len(frame2))
+            for (coord1, coord2) in zip(frame1, frame2):
+                for (value1, value2) in zip(coord1, coord2):
+                    self.assertAlmostEqual(value1, value2)
+
+
+class _RecordingContext(object):
+    # Stands in for a cairo context, recording the color and rectangles of
+    # each fill.
+    def __init__(self):
+        self.fills = []
+        self._rgb = None
+        self._rects = []
+
+    def set_source_rgb(self, r, g, b):
+        self._rgb = (r, g, b)
+
+    def rectangle(self, x, y, width, height):
+        self._rects.append((x, y, width, height))
+
+    def fill(self):
+        self.fills.append((self._rgb, self._rects))
+        self._rects = []
+
+
+def _make_board():
+    # Returns an easy level board and its winning moves.
+    (size, fragmentation) = boardgen.LEVELS[0]
+    return boardgen.generate_board(seed=1, fragmentation=fragmentation,
+                                   max_size=size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Frame time statistics for animations, for diagnosing dropped frames.
+
+
+class FrameStats(object):
+    """Object that collects the times between the frames of an animation."""
+    def __init__(self):
+        self._last_time = None
+        self._intervals = []
+        self._dropped_frames = 0
+
+    def add_frame(self, frame_time, refresh_interval=None):
+        """Records a frame shown at the given time, in seconds.
+           refresh_interval is the time between frames at the full frame rate,
+           if known; intervals of one and a half times that or more count as
+           dropping frames."""
+        if self._last_time is not None:
+            interval = frame_time - self._last_time
+            self._intervals.append(interval)
+            if refresh_interval:
+                self._dropped_frames += max(
+                    0, int(round(interval / refresh_interval)) - 1)
+        self._last_time = frame_time
+
+    def get_frame_count(self):
+        return len(self._intervals) + (self._last_time is not None)
+
+    def get_dropped_frames(self):
+        return self._dropped_frames
+
+    def get_mean_interval(self):
+        """Returns the mean time between frames in seconds, or None."""
+        if not self._intervals:
+            return None
+        return sum(self._intervals) / len(self._intervals)
+
+    def get_percentile_interval(self, percent):
+        """Returns the time between frames, in seconds, that the given
+           percentage of intervals are no longer than, or None."""
+        if not self._intervals:
+            return None
+        intervals = sorted(self._intervals)
+        index = max(0, -(-len(intervals) * percent // 100) - 1)
+        return intervals[int(index)]
+
+    def get_summary(self):
+        """Returns a dictionary of the statistics, for logging."""
+        return {
+            'frames': self.get_frame_count(),
+            'dropped_frames': self._dropped_frames,
+            'mean_interval': self.get_mean_interval(),
+            'p95_interval': self.get_percentile_interval(95),
+        }
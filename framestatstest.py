@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import unittest
+
+from framestats import FrameStats
+
+
+class TestFrameStats(unittest.TestCase):
+
+    def testEmpty(self):
+        stats = FrameStats()
+        self.assertEqual(stats.get_summary(), {
+            'frames': 0,
+            'dropped_frames': 0,
+            'mean_interval': None,
+            'p95_interval': None,
+        })
+
+    def testIntervals(self):
+        stats = FrameStats()
+        t = 0.0
+        for i in range(40):
+            t += 0.05 if i == 20 else 0.01
+            stats.add_frame(t, 0.01)
+        self.assertEqual(stats.get_frame_count(), 40)
+        # The long interval dropped four frames.
+        self.assertEqual(stats.get_dropped_frames(), 4)
+        self.assertAlmostEqual(stats.get_mean_interval(), 0.43 / 39)
+        self.assertAlmostEqual(stats.get_percentile_interval(95), 0.01)
+        self.assertAlmostEqual(stats.get_percentile_interval(100), 0.05)
+
+    def testNoRefreshInterval(self):
+        stats = FrameStats()
+        for t in (0.0, 0.1, 0.5):
+            stats.add_frame(t)
+        self.assertEqual(stats.get_dropped_frames(), 0)
+        self.assertAlmostEqual(stats.get_percentile_interval(50), 0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -31,8 +31,9 @@ import time
 
 import powerd
 import board
+import history
 from anim import Anim
-from gridwidget import BoardDrawer, RemovalDrawer, WinDrawer
+from drawers import BoardDrawer, RemovalDrawer, WinDrawer
 
 if 'SUGAR_BUNDLE_PATH' in os.environ:
     from sugar3.graphics import style
@@ -522,9 +523,11 @@ def _remove_piece(x, y):
     # Returns a function to animate the removal of the given piece.
     def action(stage):
         contiguous = stage.board.get_contiguous(x, y)
+        board = stage.board.clone()
+        transition = history.make_move(board, contiguous).transition
         removal_drawer = stage.preview.removal_drawer
         stage.preview.set_drawer(removal_drawer)
-        removal_drawer.init(stage.board, contiguous)
+        removal_drawer.init(stage.board, transition)
         removal_drawer.set_anim_time(0.0)
         start_time = time.time()
 
@@ -542,10 +545,6 @@ def _remove_piece(x, y):
         def local_end_anim_func(anim_stopped):
             stage.preview.set_drawer(stage.preview.board_drawer)
             stage.undo_stack.append(stage.board)
-            board = stage.board.clone()
-            board.clear_pieces(contiguous)
-            board.drop_pieces()
-            board.remove_empty_columns()
             stage.set_board(board)
             if not anim_stopped:
                 stage.next_action()
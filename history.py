@@ -0,0 +1,118 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Undo/redo history entries.  Rather than a copy of the board before each
+# move, we keep just what the move removed, which is enough to put the board
+# back the way it was.
+
+
+def make_move(b, contiguous):
+    """Removes the given set of contiguous blocks from the board, dropping
+       the blocks above them and removing any emptied columns, and returns a
+       MoveRecord that can undo and redo the move."""
+    # We save the player's move as the lexographically smallest coordinate
+    # of the piece.
+    move = min(contiguous)
+    cells = sorted((x, y, b.get_value(x, y)) for (x, y) in contiguous)
+    size = (b.width, b.height)
+    counts = {}
+    for (x, y, value) in cells:
+        counts[x] = counts.get(x, 0) + 1
+    emptied = [x for (x, count) in counts.items()
+               if count == b.get_column_height(x)]
+    (drop_map, slide_map) = b.apply_move(contiguous)
+    # Emptied columns with no column sliding in from the right were at the
+    # end of the board, so they need no space made for them on undo.
+    removed_columns = sorted(x for x in emptied
+                             if slide_map and x < max(slide_map))
+    transition = MoveTransition(set(contiguous), drop_map, slide_map, size,
+                                (b.width, b.height))
+    return MoveRecord(move, cells, removed_columns, transition)
+
+
+def get_transition(b, contiguous):
+    """Returns the MoveTransition for removing the given set of contiguous
+       blocks from the board, leaving the board unchanged."""
+    return make_move(b.clone(), contiguous).transition
+
+
+def decode_move(data):
+    """Decodes a MoveRecord from a list made by MoveRecord.encode()."""
+    (move_x, move_y, removed_columns, cell_data) = data
+    cells = []
+    for i in range(0, len(cell_data), 3):
+        cells.append(tuple(cell_data[i:i + 3]))
+    return MoveRecord((move_x, move_y), cells, removed_columns)
+
+
+class MoveRecord(object):
+    """Object that records a move made on a board.  Keeps the canonical move
+       coordinate, the cells removed along with their values, and the columns
+       the move emptied (other than the last column of the board, which needs
+       no space made for it).  Records made by make_move() also keep the
+       MoveTransition of the move; decoded records have None."""
+    # Boards are assumed to have no gaps in their columns before the move,
+    # which holds for generated boards and any board reached from them by
+    # moves.
+    def __init__(self, move, cells, removed_columns, transition=None):
+        self.move = move
+        self.cells = cells
+        self.removed_columns = removed_columns
+        self.transition = transition
+
+    def undo(self, b):
+        """Restores the board to its state before the move."""
+        for x in self.removed_columns:
+            b.insert_columns(x, 1)
+        col_cells = {}
+        for (x, y, value) in self.cells:
+            col_cells.setdefault(x, {})[y] = value
+        for (x, removed) in col_cells.items():
+            remaining = [b.get_value(x, y)
+                         for y in range(b.get_column_height(x))]
+            remaining.reverse()
+            for y in range(len(remaining) + len(removed)):
+                if y in removed:
+                    b.set_value(x, y, removed[y])
+                else:
+                    b.set_value(x, y, remaining.pop())
+
+    def redo(self, b):
+        """Makes the move again on the board as it was before the move."""
+        contiguous = b.get_contiguous(*self.move)
+        make_move(b, contiguous)
+
+    def encode(self):
+        """Returns a list of atomic values that represents the move."""
+        cell_data = []
+        for cell in self.cells:
+            cell_data.extend(cell)
+        return [self.move[0], self.move[1], self.removed_columns, cell_data]
+
+
+class MoveTransition(object):
+    """Object that describes how the pieces on a board move in a move, for
+       animating it.  Keeps the set of coordinates removed, the drop and
+       slide maps from Board.apply_move(), and the (width, height) of the
+       board before and after the move."""
+    def __init__(self, removed, drop_map, slide_map, size, new_size):
+        self.removed = removed
+        self.drop_map = drop_map
+        self.slide_map = slide_map
+        self.size = size
+        self.new_size = new_size
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import json
+import random
+import unittest
+
+import boardgen
+import history
+import testutil
+
+
+class TestMoveRecord(unittest.TestCase):
+
+    def testUndoRedo(self):
+        b = testutil.make_board("""1..2
+                                    1.32
+                                    1232""")
+        before = b.clone()
+        record = history.make_move(b, b.get_contiguous(0, 0))
+        self.assertEqual(record.move, (0, 0))
+        self.assertEqual(record.removed_columns, [0])
+        after = b.clone()
+        record.undo(b)
+        self.assertEqual(b, before)
+        record.redo(b)
+        self.assertEqual(b, after)
+
+    def testLastColumn(self):
+        b = testutil.make_board("""21
+                                    21
+                                    31""")
+        before = b.clone()
+        record = history.make_move(b, b.get_contiguous(1, 0))
+        self.assertEqual(record.removed_columns, [])
+        self.assertEqual(b.width, 1)
+        record.undo(b)
+        self.assertEqual(b, before)
+
+    def testTransition(self):
+        b = testutil.make_board("""1..2
+                                    1.32
+                                    1232""")
+        contiguous = b.get_contiguous(0, 0)
+        transition = history.get_transition(b, contiguous)
+        self.assertEqual(b.width, 4)
+        self.assertEqual(transition.removed, contiguous)
+        self.assertEqual(transition.drop_map, {})
+        self.assertEqual(transition.slide_map, {1: 0, 2: 1, 3: 2})
+        self.assertEqual(transition.size, (4, 3))
+        self.assertEqual(transition.new_size, (3, 3))
+        self.assertEqual(history.decode_move(
+            history.make_move(b, contiguous).encode()).transition, None)
+
+    def testGame(self):
+        # Plays out games, then undoes every move (after a round trip through
+        # JSON) and checks each board along the way.
+        r = random.Random(0)
+        for seed in range(10):
+            (b, winning_moves) = boardgen.generate_board(seed=seed,
+                                                         max_size=(12, 10))
+            boards = []
+            records = []
+            while b.has_any_move():
+                boards.append(b.clone())
+                contiguous = r.choice(b.get_all_contiguous())
+                records.append(history.make_move(b, contiguous))
+            data = json.loads(json.dumps([x.encode() for x in records]))
+            records = [history.decode_move(x) for x in data]
+            for (record, expected) in reversed(list(zip(records, boards))):
+                record.undo(b)
+                self.assertEqual(b, expected)
+            for (record, expected) in zip(records, boards):
+                self.assertEqual(b, expected)
+                record.redo(b)
+
+
+if __name__ == '__main__':
+    unittest.main()
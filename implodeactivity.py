@@ -33,6 +33,7 @@ from sugar3.graphics.toolbarbox import ToolbarBox
 from implodegame import ImplodeGame
 from helpwidget import HelpWidget
 from collabwrapper import CollabWrapper
+import savegame
 
 import os
 
@@ -49,7 +50,10 @@ class ImplodeActivity(Activity):
         Activity.__init__(self, handle)
 
         self._joining_hide = False
-        self._game = ImplodeGame()
+        # The cache path is given up front, so that the first board and the
+        # first prefetched board are stored too.
+        self._game = ImplodeGame(board_cache_path=os.path.join(
+            self.get_activity_root(), 'data', 'boards'))
         self._collab = CollabWrapper(self)
         self._collab.connect('message', self._message_cb)
 
@@ -109,23 +113,33 @@ class ImplodeActivity(Activity):
             self.unbusy()
 
     def read_file(self, file_path):
-        # Loads the game state from a file.
-        f = open(file_path, 'r')
-        file_data = json.loads(f.read())
+        # Loads the game state from a file, in either the compact format or
+        # the older JSON format.
+        f = open(file_path, 'rb')
+        data = f.read()
         f.close()
 
+        if savegame.is_compact(data):
+            try:
+                game_data = savegame.loads(data)
+            except ValueError:
+                _logger.exception('Could not read save game %s', file_path)
+                return
+            self.set_data(game_data)
+            return
+
+        file_data = json.loads(data.decode('utf-8'))
         (file_type, version, game_data) = file_data
-        if file_type == 'Implode save game' and version <= [1, 0]:
+        if file_type == 'Implode save game' and version <= [1, 1]:
             self.set_data(game_data)
 
     def write_file(self, file_path):
-        # Writes the game state to a file.
-        data = self.get_data()
-        file_data = ['Implode save game', [1, 0], data]
+        # Writes the game state to a file in the compact format.
+        data = savegame.dumps(self.get_data())
         last_game_path = self._get_last_game_path()
         for path in (file_path, last_game_path):
-            f = open(path, 'w')
-            f.write(json.dumps(file_data))
+            f = open(path, 'wb')
+            f.write(data)
             f.close()
 
     def _show_stuck_cb(self, state, data=None):
@@ -21,13 +21,19 @@ _logger = logging.getLogger('implode-activity.implodegame')
 
 from gi.repository import Gtk
 from gi.repository import GObject
+from gi.repository import GLib
 import random
 import time
 
 from anim import Anim
 import board
+import boardcache
 import boardgen
 import gridwidget
+import history
+import instrument
+import solver
+import solverworker
 
 # Amount of time to wait after the player is stuck to display the "stuck"
 # dialog, in seconds.
@@ -37,6 +43,14 @@ _STUCK_DELAY = 0.5
 # state after the player gets stuck, in seconds.
 _UNDO_DELAY = 0.3
 
+# Limit on the number of boards the puzzle solver examines when testing each
+# of the player's boards for solvability.
+_SOLVER_MAX_NODES = 1000
+
+# Limit on the number of boards the puzzle solver examines in all when
+# working out how many of the player's moves to undo.
+_SOLVER_MAX_TOTAL_NODES = 5000
+
 
 class ImplodeGame(Gtk.EventBox):
     """Gtk widget for playing the implode game."""
@@ -50,18 +64,24 @@ class ImplodeGame(Gtk.EventBox):
         'cell-selected': (GObject.SignalFlags.RUN_LAST, None, (int, int)),
     }
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, board_cache_path=None, **kwargs):
+        """board_cache_path is the directory in which to keep generated
+           boards from one session to the next, or None to keep them in
+           memory only.  It is set before the first board is generated."""
         super(ImplodeGame, self).__init__(*args, **kwargs)
         self._animate = True
         self._anim = None
 
         self._board = None
-        # Undo and redo stacks are pairs of (board state, subsequent move).
+        # Undo and redo stacks are lists of history.MoveRecord objects.  The
+        # top of the undo stack is the move that led to the current board, and
+        # the top of the redo stack is the move that follows it.
         self._undo_stack = []
         self._redo_stack = []
         self._winning_moves = []
 
         self._random = random.Random()
+        self._board_cache = boardcache.BoardCache(board_cache_path)
         self._difficulty = 0
         self._size = (8, 6)
         self._fragmentation = 0
@@ -74,6 +94,12 @@ class ImplodeGame(Gtk.EventBox):
         self._grid.connect('cell-selected', self._cell_selected_cb)
         self.add(self._grid)
 
+        # Tests the player's boards for solvability in the background, so
+        # that we can tell the player they are stuck as soon as the board
+        # can no longer be cleared.
+        self._solver_worker = solverworker.SolverWorker(GLib.idle_add)
+        self.connect('destroy', self._destroy_cb)
+
         self._seed = self._random.randint(0, 99999)
         self.new_game()
 
@@ -94,12 +120,8 @@ class ImplodeGame(Gtk.EventBox):
     def new_game(self):
         self._hide_stuck()
         self._stop_animation()
-        size_frag_dict = {
-            0: ((8, 6), 0),
-            1: ((12, 10), 0),
-            2: ((20, 15), 2),
-        }
-        (self._size, self._fragmentation) = size_frag_dict[self._difficulty]
+        (self._size, self._fragmentation) = \
+            boardgen.LEVELS[self._difficulty]
         self._reset_board()
 
     def replay_game(self):
@@ -118,50 +140,83 @@ class ImplodeGame(Gtk.EventBox):
     def undo_to_solvable_state(self):
         # Undoes the player's moves until the puzzle is in a solvable state.
         #
-        # Actually, we undo moves until the player's moves so far match the
-        # beginning of a list of moves known to solve the puzzle, as given by
-        # the puzzle generator.  Since each puzzle can potentially be solved
-        # through many different sequences of moves, we will almost certainly
-        # be undoing more moves than we need to.  One possible improvement
-        # would be to write a generic puzzle solver that can test some of the
-        # player's later board states for solvability, so that we don't need to
-        # undo as many moves.
-
+        # We work back through the player's moves, asking the puzzle solver
+        # whether each board along the way can still be cleared, and undo
+        # just enough moves to reach the first one that can.  Since the
+        # solver can give up on hard boards, we also stop at any board where
+        # the player's moves so far match the beginning of the list of moves
+        # known to solve the puzzle, as given by the puzzle generator.
+        #
+        # The search runs in the solver worker.  Its answer is never more
+        # moves than it takes to get back to the winning moves, so we start
+        # undoing towards those straight away, and head for the answer
+        # instead when it comes back, redoing any moves we went past.
         self._hide_stuck()
         self._stop_animation()
         if len(self._undo_stack) == 0:
             return
 
+        moves = [record.move for record in self._undo_stack]
+        prefix_length = solver.get_winning_prefix_length(
+            moves, self._winning_moves)
+        state = {'undone': 0, 'target': len(moves) - prefix_length,
+                 'board_hash': self._board.hash(), 'animating': False}
+
+        def result_cb(undo_count):
+            self._undo_count_cb(state, undo_count)
+        self._solver_worker.submit_undo_count(
+            self._board, self._undo_stack, self._winning_moves, result_cb,
+            _SOLVER_MAX_NODES, _SOLVER_MAX_TOTAL_NODES)
+        self._animate_undo(state)
+
+    def _undo_count_cb(self, state, undo_count):
+        # Heads for the given number of undone moves, if the board is still
+        # the one left by the undo animation.
+        if state['board_hash'] != self._board.hash():
+            return
+        state['target'] = undo_count
+        if not state['animating'] and state['undone'] != undo_count:
+            self._animate_undo(state)
+
+    def _animate_undo(self, state):
+        # Undoes or redoes moves, one at a time, until the number of moves
+        # undone reaches the target.
         start_time = time.time()
 
+        def step():
+            if state['undone'] < state['target']:
+                self._undo_last_move()
+                state['undone'] += 1
+            else:
+                self._redo_last_move()
+                state['undone'] -= 1
+            state['board_hash'] = self._board.hash()
+
         def update_func(start_time_ref=[start_time]):
+            if state['undone'] == state['target']:
+                return False
             delta = time.time() - start_time_ref[0]
             if delta > _UNDO_DELAY:
-                self._undo_last_move()
-                moves = self._get_moves_so_far()
-                if moves == self._winning_moves[:len(moves)]:
+                step()
+                if state['undone'] == state['target']:
                     return False
                 start_time_ref[0] = time.time()
             return True
 
         def end_anim_func(anim_stopped):
-            moves = self._get_moves_so_far()
-            while moves != self._winning_moves[:len(moves)]:
-                self._undo_last_move()
-                moves = self._get_moves_so_far()
+            while state['undone'] != state['target']:
+                step()
+            state['animating'] = False
 
+        state['animating'] = True
         self._anim = Anim(update_func, end_anim_func)
         self._anim.start()
 
-    def _get_moves_so_far(self):
-        # Returns a list of the moves so far.
-        return [move for (board, move) in self._undo_stack]
-
     def _undo_last_move(self):
-        # Undoes the most recent move and stores the state on the undo stack.
-        (board, move) = self._undo_stack.pop()
-        self._redo_stack.append((self._board, move))
-        self._board = board
+        # Undoes the most recent move and stores it on the redo stack.
+        record = self._undo_stack.pop()
+        record.undo(self._board)
+        self._redo_stack.append(record)
 
         # Force board refresh.
         self._grid.set_board(self._board)
@@ -173,15 +228,19 @@ class ImplodeGame(Gtk.EventBox):
         if len(self._redo_stack) == 0:
             return
 
-        (board, move) = self._redo_stack.pop()
-        self._undo_stack.append((self._board, move))
-        self._board = board
+        self._redo_last_move()
+        self._check_for_lose_state()
+
+    def _redo_last_move(self):
+        # Redoes the most recently undone move and stores it on the undo
+        # stack.
+        record = self._redo_stack.pop()
+        record.redo(self._board)
+        self._undo_stack.append(record)
 
         # Force board refresh.
         self._grid.set_board(self._board)
 
-        self._check_for_lose_state()
-
     def set_level(self, level):
         self._difficulty = level
 
@@ -204,8 +263,8 @@ class ImplodeGame(Gtk.EventBox):
             'size': self._size,
             'fragmentation': self._fragmentation,
             'board': encode_board(self._board, None),
-            'undo_stack': [encode_board(b, m) for b, m in self._undo_stack],
-            'redo_stack': [encode_board(b, m) for b, m in self._redo_stack],
+            'undo_moves': [record.encode() for record in self._undo_stack],
+            'redo_moves': [record.encode() for record in self._redo_stack],
             'win_draw_flag': self._grid.get_win_draw_flag(),
             'win_color': self._grid.get_win_color(),
             'winning_moves': self._winning_moves
@@ -224,19 +283,37 @@ class ImplodeGame(Gtk.EventBox):
             data = state[2:]
             for i in range(h):
                 for j in range(w):
-                    b.set_value(j, i, data.pop(0))
-            if len(data) == 2:
+                    b.set_value(j, i, data[i * w + j])
+            if len(data) == w * h + 2:
                 # Return appended move.
-                return b, tuple(data)
+                return b, tuple(data[w * h:])
             else:
                 return b, None
         self._difficulty = state['difficulty']
         self.set_seed(state['seed'])
         self._size = state['size']
         self._fragmentation = state['fragmentation']
+        self._solver_worker.cancel()
         (self._board, dummy) = decode_board(state['board'])
-        self._undo_stack = [decode_board(x) for x in state['undo_stack']]
-        self._redo_stack = [decode_board(x) for x in state['redo_stack']]
+        if 'undo_moves' in state:
+            self._undo_stack = [history.decode_move(x)
+                                for x in state['undo_moves']]
+            self._redo_stack = [history.decode_move(x)
+                                for x in state['redo_moves']]
+        else:
+            # Prior to version 1.1 of the save format, the stacks held a copy
+            # of the board for each move, from which we recover the moves.
+            self._undo_stack = []
+            for x in state['undo_stack']:
+                (b, move) = decode_board(x)
+                self._undo_stack.append(
+                    history.make_move(b, b.get_contiguous(*move)))
+            self._redo_stack = []
+            b = self._board.clone()
+            for x in reversed(state['redo_stack']):
+                (dummy, move) = decode_board(x)
+                self._redo_stack.insert(
+                    0, history.make_move(b, b.get_contiguous(*move)))
         self._grid.set_board(self._board)
         self._grid.set_win_state(state['win_draw_flag'], state['win_color'])
         if 'winning_moves' in state:
@@ -249,14 +326,28 @@ class ImplodeGame(Gtk.EventBox):
 
     def _reset_board(self):
         # Regenerates the board with the current seed.
+        self._solver_worker.cancel()
         (self._board, self._winning_moves) = \
-            boardgen.generate_board(
+            self._board_cache.generate_board(
                 seed=self._seed, fragmentation=self._fragmentation,
                 max_size=self._size)
         self._grid.set_board(self._board)
         self._grid.set_win_draw_flag(False)
         self._undo_stack = []
         self._redo_stack = []
+        self._prefetch_next_board()
+
+    def _prefetch_next_board(self):
+        # Starts generating the board that the next reseed() and new_game()
+        # will make, while the player plays this one.  The next seed comes
+        # from a copy of our random number generator, so peers that were
+        # given our seed prefetch the same board.
+        r = random.Random()
+        r.setstate(self._random.getstate())
+        (size, fragmentation) = boardgen.LEVELS[self._difficulty]
+        self._board_cache.prefetch(seed=r.randint(0, 99999),
+                                   fragmentation=fragmentation,
+                                   max_size=size)
 
     def _piece_selected_cb(self, widget, x, y):
         # Handles piece selection.
@@ -264,7 +355,7 @@ class ImplodeGame(Gtk.EventBox):
         # We check contiguous before stopping the animation because we don't
         # want a click on the game board in a losing state to stop the "stuck"
         # animation.
-        if len(self._board.get_contiguous(x, y)) < 3:
+        if len(self._board.group_at(x, y)) < 3:
             return
 
         self.emit('piece-selected', x, y)
@@ -275,17 +366,20 @@ class ImplodeGame(Gtk.EventBox):
         self._stop_animation()
         # We recalc contiguous here because _stop_animation may modify board
         # contents (e.g. the undo-many animation).
-        contiguous = self._board.get_contiguous(x, y)
+        contiguous = self._board.group_at(x, y)
         if len(contiguous) >= 3:
-            def remove_func(anim_stopped=False):
-                self._remove_contiguous(contiguous, anim_stopped)
             if self._animate:
-                self._anim = self._grid.get_removal_anim(self._board,
-                                                         contiguous,
-                                                         remove_func)
+                # The move is made straight away, and the animation drawn
+                # from a copy of the board as it was and the move's
+                # transition.
+                board = self._board.clone()
+                record = self._remove_contiguous(contiguous)
+                self._anim = self._grid.get_removal_anim(
+                    board, record.transition, self._end_move)
                 self._anim.start()
             else:
-                remove_func()
+                self._remove_contiguous(contiguous)
+                self._end_move()
 
     def _undo_key_pressed_cb(self, widget, dummy):
         self.emit('undo-key-pressed', dummy)
@@ -310,19 +404,28 @@ class ImplodeGame(Gtk.EventBox):
         self._grid.set_others_cells(key, fg, bg, x, y)
 
     def _stop_animation(self):
+        # Any solvability test of the current board is out of date once the
+        # player does something.  Stopping an animation can start a new test
+        # (as at the end of a move), so we cancel after stopping it.
         if self._anim is not None:
             self._anim.stop()
+        self._solver_worker.cancel()
+
+    def _destroy_cb(self, widget):
+        self._solver_worker.stop()
 
-    def _remove_contiguous(self, contiguous, anim_stopped=False):
-        # Removes the given set of contiguous blocks from the board.
+    @instrument.timed('implodegame.ImplodeGame._remove_contiguous')
+    def _remove_contiguous(self, contiguous):
+        # Removes the given set of contiguous blocks from the board, and
+        # returns the history.MoveRecord of the move.
         self._redo_stack = []
-        # We save the player's move as the lexographically smallest coordinate
-        # of the piece.
-        move = min(contiguous)
-        self._undo_stack.append((self._board.clone(), move))
-        self._board.clear_pieces(contiguous)
-        self._board.drop_pieces()
-        self._board.remove_empty_columns()
+        record = history.make_move(self._board, contiguous)
+        self._undo_stack.append(record)
+        return record
+
+    def _end_move(self, anim_stopped=False):
+        # Shows the board after a move, once any removal animation is done,
+        # and checks whether the game has been won or lost.
 
         # Force board refresh.
         self._grid.set_board(self._board)
@@ -337,10 +440,24 @@ class ImplodeGame(Gtk.EventBox):
             self._check_for_lose_state()
 
     def _check_for_lose_state(self):
-        if not self._board.is_empty():
-            all_contiguous = self._board.get_all_contiguous()
-            if len(all_contiguous) == 0:
-                self._init_lose()
+        if self._board.is_empty():
+            return
+        if not self._board.has_any_move():
+            self._init_lose()
+        else:
+            board_hash = self._board.hash()
+
+            def result_cb(solvable):
+                self._solver_result_cb(board_hash, solvable)
+            self._solver_worker.submit(self._board, result_cb)
+
+    def _solver_result_cb(self, board_hash, solvable):
+        # Handles the result of testing the board with the given hash for
+        # solvability, if it is still the current board.
+        if board_hash != self._board.hash():
+            return
+        if not solvable:
+            self._init_lose()
 
     def _init_win(self, anim_stopped=False):
         self._grid.set_win_draw_flag(True)
@@ -0,0 +1,209 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Opt-in timing of the hot paths.
+#
+# Functions decorated with timed() record how long each call takes, when
+# instrumentation is on.  It is turned on by setting the IMPLODE_INSTRUMENT
+# environment variable, to 1 or to the path of a file to dump the timings to
+# as JSON when the process exits, or by calling enable().  When it is off, a
+# timed function costs one extra call and test.
+#
+# The most recent calls are kept in a ring buffer, along with the count,
+# total and maximum time for each name.  A summary of those is logged every
+# so often as calls are recorded, in the logger of the module that made the
+# calls (such as implode-activity.board).
+
+import atexit
+import collections
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+_logger = logging.getLogger('implode-activity.instrument')
+
+# Environment variable that turns instrumentation on.
+_ENV_VAR = 'IMPLODE_INSTRUMENT'
+
+# Number of calls kept in the ring buffer.
+_MAX_RECORDS = 10000
+
+# Minimum time between logged summaries, in seconds.
+_SUMMARY_INTERVAL = 60.0
+
+_enabled = False
+_dump_path = None
+_registered = False
+
+# (name, start time, seconds) tuples for the most recent calls.
+_records = collections.deque(maxlen=_MAX_RECORDS)
+
+# Map from names to [count, total seconds, maximum seconds] lists.
+_totals = {}
+
+# Calls may be recorded from the board cache's background threads.
+_lock = threading.Lock()
+
+_last_summary_time = time.time()
+
+
+def enable(dump_path=None):
+    """Turns instrumentation on.  If dump_path is given, the timings are
+       written to that file as JSON when the process exits."""
+    global _enabled, _dump_path, _registered
+    _enabled = True
+    if dump_path is not None:
+        _dump_path = dump_path
+    if not _registered:
+        atexit.register(_at_exit)
+        _registered = True
+
+
+def disable():
+    """Turns instrumentation off, keeping the timings recorded so far."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Forgets the timings recorded so far."""
+    with _lock:
+        _records.clear()
+        _totals.clear()
+
+
+def timed(name):
+    """Returns a decorator that records the time taken by each call to the
+       decorated function under the given name, which is the module name
+       followed by the function name, such as 'board.get_all_contiguous'.
+       Summaries are logged in the module's logger."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, start_time, time.perf_counter() - start_time)
+        return wrapper
+    return decorator
+
+
+def record(name, start_time, seconds):
+    """Records a call under the given name that started at the given
+       time.perf_counter() time and took the given number of seconds."""
+    global _last_summary_time
+    with _lock:
+        _records.append((name, start_time, seconds))
+        totals = _totals.get(name)
+        if totals is None:
+            _totals[name] = [1, seconds, seconds]
+        else:
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+        now = time.time()
+        if now - _last_summary_time < _SUMMARY_INTERVAL:
+            return
+        _last_summary_time = now
+        summary = _get_summary()
+    _log_summary(summary)
+
+
+def get_summary():
+    """Returns a dictionary mapping each name to a dictionary of the count,
+       total, mean and maximum time of its calls, in seconds."""
+    with _lock:
+        return _get_summary()
+
+
+def get_records():
+    """Returns a list of (name, start time, seconds) tuples for the most
+       recent calls, oldest first."""
+    with _lock:
+        return list(_records)
+
+
+def dump(path):
+    """Writes the summary and the most recent calls to a file as JSON."""
+    with _lock:
+        data = {
+            'summary': _get_summary(),
+            'records': [list(r) for r in _records],
+        }
+    f = open(path, 'w')
+    try:
+        json.dump(data, f, indent=1, sort_keys=True)
+    finally:
+        f.close()
+
+
+def _get_summary():
+    summary = {}
+    for (name, (count, total, maximum)) in _totals.items():
+        summary[name] = {
+            'count': count,
+            'total': total,
+            'mean': total / count,
+            'max': maximum,
+        }
+    return summary
+
+
+def _log_summary(summary):
+    for (name, stats) in sorted(summary.items()):
+        (module, dot, func_name) = name.partition('.')
+        logger = logging.getLogger('implode-activity.' + module)
+        logger.info('%s: %d calls, %.3f ms mean, %.3f ms max, %.3f s total',
+                    func_name, stats['count'], stats['mean'] * 1000,
+                    stats['max'] * 1000, stats['total'])
+
+
+def _at_exit():
+    # Logs a final summary, and writes the dump if there is a file for it.
+    summary = get_summary()
+    if summary:
+        _log_summary(summary)
+    if _dump_path is None:
+        return
+    try:
+        dump(_dump_path)
+    except OSError:
+        _logger.exception('Could not write timings to %s', _dump_path)
+
+
+def _init_from_environment():
+    value = os.environ.get(_ENV_VAR)
+    if not value or value == '0':
+        return
+    if value == '1':
+        enable()
+    else:
+        enable(value)
+
+
+_init_from_environment()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import board
+import instrument
+
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        self.was_enabled = instrument.is_enabled()
+        instrument.reset()
+
+    def tearDown(self):
+        if not self.was_enabled:
+            instrument.disable()
+        instrument.reset()
+
+    def testDisabled(self):
+        instrument.disable()
+        board.make_test_board(8, 6).get_all_contiguous()
+        self.assertEqual(instrument.get_summary(), {})
+
+    def testTimed(self):
+        instrument.enable()
+        b = board.make_test_board(8, 6)
+        for i in range(3):
+            b.get_all_contiguous()
+        summary = instrument.get_summary()
+        stats = summary['board.get_all_contiguous']
+        self.assertEqual(stats['count'], 3)
+        self.assertTrue(0 <= stats['mean'] <= stats['max'] <= stats['total'])
+        records = instrument.get_records()
+        self.assertEqual([r[0] for r in records],
+                         ['board.get_all_contiguous'] * 3)
+
+    def testDump(self):
+        instrument.enable()
+        instrument.record('test.func', 0.0, 0.5)
+        path = tempfile.mkdtemp()
+        try:
+            file_path = os.path.join(path, 'timings.json')
+            instrument.dump(file_path)
+            f = open(file_path)
+            data = json.load(f)
+            f.close()
+        finally:
+            shutil.rmtree(path)
+        self.assertEqual(data['summary']['test.func']['total'], 0.5)
+        self.assertEqual(data['records'], [['test.func', 0.0, 0.5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
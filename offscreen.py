@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Rendering of boards and animations to images, without a display.
+#
+# The drawers are driven the way GridWidget drives them, but draw to a cairo
+# image surface of any size.  This needs only cairo, not GTK, so it can be
+# used for thumbnails, benchmarks and exporting animation frames.
+#
+# Run "python3 offscreen.py" to write PNG images of a generated board, or of
+# the frames of its first removal animation or of the win animation.
+
+import argparse
+import os
+
+import cairo
+
+import boardgen
+import history
+from drawers import BoardDrawer, RemovalDrawer, WinDrawer
+
+# Default number of animation frames per second.
+FRAME_RATE = 25
+
+
+class Canvas(object):
+    """Image surface for drawers to draw on, standing in for a widget."""
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+
+        # Rects invalidated by the drawers since the last draw.
+        self.invalid_rects = []
+
+    def get_size(self):
+        return (self.width, self.height)
+
+    def invalidate_rect(self, rect):
+        self.invalid_rects.append(rect)
+
+    def draw(self, drawer):
+        """Draws the drawer on the surface and returns the surface."""
+        cr = cairo.Context(self.surface)
+        drawer.draw(cr, self.width, self.height)
+        self.surface.flush()
+        self.invalid_rects = []
+        return self.surface
+
+
+def render_board(b, width, height, selected_cell=None):
+    """Returns a new image surface of the given size showing the board."""
+    canvas = Canvas(width, height)
+    drawer = BoardDrawer(canvas.get_size, canvas.invalidate_rect)
+    drawer.set_board(b)
+    if selected_cell is not None:
+        drawer.set_selected_cell(selected_cell)
+    return canvas.draw(drawer)
+
+
+def render_removal(b, contiguous, width, height, frame_rate=FRAME_RATE):
+    """Generates image surfaces of the given size for the frames of the
+       animation of removing the given contiguous pieces from the board.  The
+       same surface is drawn on for each frame, so it must be used before the
+       next frame is asked for."""
+    canvas = Canvas(width, height)
+    drawer = RemovalDrawer(canvas.get_size, canvas.invalidate_rect)
+    drawer.init(b, history.get_transition(b, contiguous))
+    delta = 0.0
+    drawer.set_anim_time(delta)
+    yield canvas.draw(drawer)
+    # Step through the stages as GridWidget.get_removal_anim() does, with
+    # fixed times between frames.
+    while True:
+        delta += 1.0 / frame_rate
+        if delta > drawer.get_anim_length():
+            if not drawer.next_stage():
+                return
+            delta = 0.0
+        drawer.set_anim_time(delta)
+        yield canvas.draw(drawer)
+
+
+def render_win(width, height, frame_rate=FRAME_RATE, seed=None):
+    """Generates image surfaces of the given size for the frames of the win
+       animation, which is chosen at random from the given seed.  The same
+       surface is drawn on for each frame, as for render_removal()."""
+    canvas = Canvas(width, height)
+    drawer = WinDrawer(canvas.get_size, canvas.invalidate_rect)
+    drawer.init(seed)
+    length = drawer.get_anim_length()
+    delta = 0.0
+    while True:
+        drawer.set_anim_time(min(delta, length))
+        yield canvas.draw(drawer)
+        if delta > length:
+            return
+        delta += 1.0 / frame_rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Renders an implode board or animation to PNG images.')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='seed of the board')
+    parser.add_argument('--level', type=int, choices=sorted(boardgen.LEVELS),
+                        default=0, help='difficulty level')
+    parser.add_argument('--size', type=_parse_size, default=(400, 300),
+                        help='image size as WIDTHxHEIGHT')
+    parser.add_argument('--anim', choices=('removal', 'win'),
+                        help='animation to render, one image per frame')
+    parser.add_argument('--frame-rate', type=int, default=FRAME_RATE)
+    parser.add_argument('--output', default='board',
+                        help='output file name, without the .png suffix')
+    args = parser.parse_args(argv)
+    (width, height) = args.size
+    (max_size, fragmentation) = boardgen.LEVELS[args.level]
+    (b, winning_moves) = boardgen.generate_board(
+        seed=args.seed, fragmentation=fragmentation, max_size=max_size)
+
+    if args.anim is None:
+        render_board(b, width, height).write_to_png(args.output + '.png')
+        return
+    if args.anim == 'removal':
+        frames = render_removal(b, b.get_contiguous(*winning_moves[0]),
+                                width, height, args.frame_rate)
+    else:
+        frames = render_win(width, height, args.frame_rate, args.seed)
+    count = 0
+    for surface in frames:
+        surface.write_to_png('%s-%03d.png' % (args.output, count))
+        count += 1
+    print('Wrote %d frames to %s' %
+          (count, os.path.dirname(os.path.abspath(args.output))))
+
+
+def _parse_size(s):
+    # Parses an image size given as WIDTHxHEIGHT.
+    try:
+        (width, height) = [int(x) for x in s.split('x')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('size must be WIDTHxHEIGHT')
+    return (width, height)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import unittest
+
+import boardgen
+import drawers
+
+try:
+    import cairo
+    import offscreen
+except ImportError:
+    offscreen = None
+
+
+@unittest.skipIf(offscreen is None, 'cairo is needed')
+class TestOffscreen(unittest.TestCase):
+
+    def testRenderBoard(self):
+        (b, winning_moves) = _make_board()
+        surface = offscreen.render_board(b, 160, 120, winning_moves[0])
+        self.assertEqual((surface.get_width(), surface.get_height()),
+                         (160, 120))
+        # The pixels aren't all the background color.
+        data = bytes(surface.get_data())
+        stride = surface.get_stride()
+        self.assertNotEqual(data[:4], data[60 * stride + 80 * 4:][:4])
+
+    def testSpriteCache(self):
+        (b, winning_moves) = _make_board()
+        canvas = offscreen.Canvas(160, 120)
+        drawer = drawers.BoardDrawer(canvas.get_size, canvas.invalidate_rect)
+        drawer.set_board(b)
+        data = bytes(canvas.draw(drawer).get_data())
+        colors = set(b.get_value_map().values())
+        self.assertEqual(len(drawer._sprites._sprites), len(colors))
+        self.assertEqual(bytes(canvas.draw(drawer).get_data()), data)
+        # A new board of the same size keeps the sprites.
+        drawer.set_board(b.clone())
+        self.assertEqual(len(drawer._sprites._sprites), len(colors))
+        canvas.width = 80
+        drawer.resize(80, 120)
+        self.assertEqual(len(drawer._sprites._sprites), 0)
+
+    def testBatched(self):
+        (b, winning_moves) = _make_board()
+        canvas = offscreen.Canvas(160, 120)
+        drawer = drawers.BoardDrawer(canvas.get_size, canvas.invalidate_rect)
+        drawer.set_board(b)
+        sprite_data = bytes(canvas.draw(drawer).get_data())
+        drawer.set_draw_mode(drawers.DRAW_BATCHED)
+        batched_data = bytes(canvas.draw(drawer).get_data())
+        # The blocks are in the same places, though they may be antialiased
+        # differently.
+        stride = canvas.surface.get_stride()
+        for (x, y) in b.get_value_map():
+            (px, py) = drawer.get_block_coord(x, y)
+            i = py * stride + px * 4
+            self.assertEqual(batched_data[i:i + 4], sprite_data[i:i + 4])
+
+    def testDrawModes(self):
+        # At this size the cells, the gaps between blocks and the board's
+        # offset are whole pixels, so the sprites and the batched fills
+        # draw exactly what filling each block straight onto the surface
+        # does.
+        (b, winning_moves) = _make_board()
+        (width, height) = (154, 140)
+        transform = drawers._BoardTransform()
+        transform.setup(width, height, b.width, b.height)
+        self.assertEqual((transform.scale_x, transform.offset_x,
+                          transform.offset_y), (20, 7, 130))
+
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+        cr = cairo.Context(surface)
+        drawers._draw_background(cr, width, height)
+        transform.set_up_cairo(cr)
+        blocks = [(x, y, 1.0, value)
+                  for ((x, y), value) in b.get_value_map().items()]
+        drawers._draw_blocks(cr, drawers.DRAW_BLOCKS, None, blocks)
+        surface.flush()
+        expected = bytes(surface.get_data())
+
+        canvas = offscreen.Canvas(width, height)
+        drawer = drawers.BoardDrawer(canvas.get_size, canvas.invalidate_rect)
+        drawer.set_board(b)
+        for mode in (drawers.DRAW_SPRITES, drawers.DRAW_BATCHED,
+                     drawers.DRAW_BLOCKS):
+            drawer.set_draw_mode(mode)
+            self.assertEqual(bytes(canvas.draw(drawer).get_data()), expected,
+                             mode)
+
+    def testBoardSurface(self):
+        (b, winning_moves) = _make_board()
+        canvas = offscreen.Canvas(160, 120)
+        drawer = drawers.BoardDrawer(canvas.get_size, canvas.invalidate_rect)
+        drawer.set_board(b)
+        canvas.draw(drawer)
+        surface = drawer._board_surface
+        drawer.set_selected_cell(winning_moves[0])
+        data = bytes(canvas.draw(drawer).get_data())
+        self.assertTrue(drawer._board_surface is surface)
+        self.assertEqual(
+            data,
+            bytes(offscreen.render_board(b, 160, 120,
+                                         winning_moves[0]).get_data()))
+        drawer.set_board(b)
+        self.assertTrue(drawer._board_surface is None)
+
+    def testRenderRemoval(self):
+        (b, winning_moves) = _make_board()
+        contiguous = b.get_contiguous(*winning_moves[0])
+        count = len(list(offscreen.render_removal(b, contiguous, 80, 60)))
+        fast_count = len(list(offscreen.render_removal(b, contiguous, 80, 60,
+                                                       frame_rate=5)))
+        self.assertTrue(count > fast_count > 1)
+
+    def testRenderWin(self):
+        frames = [bytes(surface.get_data()) for surface in
+                  offscreen.render_win(40, 30, frame_rate=5, seed=1)]
+        self.assertTrue(len(frames) > 2)
+        self.assertNotEqual(frames[0], frames[-1])
+
+
+def _make_board():
+    # Returns an easy level board and its winning moves.
+    (size, fragmentation) = boardgen.LEVELS[0]
+    return boardgen.generate_board(seed=1, fragmentation=fragmentation,
+                                   max_size=size)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,327 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Compact binary save game format.
+#
+# A save game is the game state dictionary from ImplodeGame.get_game_state(),
+# written as a sequence of fields after a magic string and a version:
+#
+#   magic, major version, minor version,
+#   difficulty, seed, size width, size height, fragmentation,
+#   win draw flag, win color,
+#   board, winning moves, undo moves, redo moves
+#
+# Integers are written as zigzag varints (seven bits per byte, low bits
+# first, high bit set on all but the last byte), so small values take a
+# single byte.  A board is its width and height followed by its cells in
+# row order, two to a byte, with 0 for an empty cell and the value plus 1
+# otherwise.  Each list of moves is a count followed by the moves, and the
+# cells and columns of each undo/redo move are sorted and written as
+# differences from the previous one.
+#
+# Decoding reads the data once from front to back.
+#
+# Generated puzzles are stored in the same way, after their own magic string
+# and a version:
+#
+#   magic, major version, minor version,
+#   name, board, winning moves
+#
+# where the name is a UTF-8 string (its length in bytes, then the bytes)
+# identifying how the puzzle was generated.  A puzzle pack holds any number
+# of puzzles:
+#
+#   magic, major version, minor version,
+#   puzzle count, then name, board, winning moves for each puzzle
+
+# Magic string at the start of a compact save game.
+MAGIC = b'Implode\x00'
+
+# Format version written by dumps.  Files with a different major version
+# can't be read.
+_VERSION = (2, 0)
+
+# Magic string at the start of a generated puzzle.
+PUZZLE_MAGIC = b'Implode\x01'
+
+# Puzzle format version written by dumps_puzzle and dumps_puzzle_pack.
+_PUZZLE_VERSION = (1, 0)
+
+# Magic string at the start of a puzzle pack.
+PACK_MAGIC = b'Implode\x02'
+
+
+def is_compact(data):
+    """Returns True if the given bytes are a compact save game."""
+    return data[:len(MAGIC)] == MAGIC
+
+
+def dumps(state):
+    """Returns the given game state dictionary as compact save game bytes."""
+    w = _Writer()
+    w.out.extend(MAGIC)
+    for value in _VERSION:
+        w.write_int(value)
+    for value in (state['difficulty'], state['seed'], state['size'][0],
+                  state['size'][1], state['fragmentation'],
+                  int(bool(state['win_draw_flag'])), state['win_color']):
+        w.write_int(value)
+    _write_board(w, state['board'])
+    _write_moves(w, state['winning_moves'])
+    for key in ('undo_moves', 'redo_moves'):
+        w.write_int(len(state[key]))
+        for data in state[key]:
+            _write_move(w, data)
+    return bytes(w.out)
+
+
+def loads(data):
+    """Returns the game state dictionary stored in the given compact save game
+       bytes.  Raises ValueError if the data isn't a readable save game."""
+    if not is_compact(data):
+        raise ValueError('Not a compact save game')
+    r = _Reader(data, len(MAGIC))
+    (major, minor) = (r.read_int(), r.read_int())
+    if major != _VERSION[0]:
+        raise ValueError('Unsupported save game version %d.%d' %
+                         (major, minor))
+    state = {}
+    state['difficulty'] = r.read_int()
+    state['seed'] = r.read_int()
+    state['size'] = (r.read_int(), r.read_int())
+    state['fragmentation'] = r.read_int()
+    state['win_draw_flag'] = bool(r.read_int())
+    state['win_color'] = r.read_int()
+    state['board'] = _read_board(r)
+    state['winning_moves'] = _read_moves(r)
+    for key in ('undo_moves', 'redo_moves'):
+        state[key] = [_read_move(r) for i in range(r.read_int())]
+    return state
+
+
+def dumps_puzzle(name, board_data, winning_moves):
+    """Returns bytes holding a generated puzzle, given a name saying how it
+       was generated, the board encoded as by ImplodeGame.get_game_state()
+       and the list of winning moves."""
+    w = _Writer()
+    w.out.extend(PUZZLE_MAGIC)
+    for value in _PUZZLE_VERSION:
+        w.write_int(value)
+    _write_puzzle(w, name, board_data, winning_moves)
+    return bytes(w.out)
+
+
+def loads_puzzle(data):
+    """Returns a tuple (name, board data, winning moves) for the generated
+       puzzle stored in the given bytes.  Raises ValueError if the data isn't
+       a readable puzzle."""
+    r = _read_puzzle_header(data, PUZZLE_MAGIC)
+    return _read_puzzle(r)
+
+
+def dumps_puzzle_pack(puzzles):
+    """Returns bytes holding a puzzle pack, given a list of (name, board
+       data, winning moves) tuples as taken by dumps_puzzle()."""
+    w = _Writer()
+    w.out.extend(PACK_MAGIC)
+    for value in _PUZZLE_VERSION:
+        w.write_int(value)
+    w.write_int(len(puzzles))
+    for (name, board_data, winning_moves) in puzzles:
+        _write_puzzle(w, name, board_data, winning_moves)
+    return bytes(w.out)
+
+
+def loads_puzzle_pack(data):
+    """Returns the list of (name, board data, winning moves) tuples stored
+       in the given puzzle pack bytes.  Raises ValueError if the data isn't a
+       readable puzzle pack."""
+    r = _read_puzzle_header(data, PACK_MAGIC)
+    return [_read_puzzle(r) for i in range(r.read_int())]
+
+
+def encode_board(b):
+    """Returns the board as a list of its width, its height and then the
+       values of its cells in row order, as stored in game states."""
+    data = [b.width, b.height]
+    for y in range(b.height):
+        for x in range(b.width):
+            data.append(b.get_value(x, y))
+    return data
+
+
+def _read_puzzle_header(data, magic):
+    # Checks the magic string and version of a puzzle or puzzle pack and
+    # returns a reader for the rest of the data.
+    if data[:len(magic)] != magic:
+        raise ValueError('Not a generated puzzle')
+    r = _Reader(data, len(magic))
+    (major, minor) = (r.read_int(), r.read_int())
+    if major != _PUZZLE_VERSION[0]:
+        raise ValueError('Unsupported puzzle version %d.%d' % (major, minor))
+    return r
+
+
+def _write_puzzle(w, name, board_data, winning_moves):
+    data = name.encode('utf-8')
+    w.write_int(len(data))
+    w.out.extend(data)
+    _write_board(w, board_data)
+    _write_moves(w, winning_moves)
+
+
+def _read_puzzle(r):
+    try:
+        name = bytes(r.read_bytes(r.read_int())).decode('utf-8')
+    except UnicodeDecodeError:
+        raise ValueError('Bad puzzle name')
+    board_data = _read_board(r)
+    return (name, board_data, _read_moves(r))
+
+
+def _write_moves(w, moves):
+    # Writes a list of (x, y) moves.
+    w.write_int(len(moves))
+    for (x, y) in moves:
+        w.write_int(x)
+        w.write_int(y)
+
+
+def _read_moves(r):
+    return [(r.read_int(), r.read_int()) for i in range(r.read_int())]
+
+
+def _write_board(w, data):
+    # Writes a board encoded as by ImplodeGame.get_game_state (width, height,
+    # then the values in row order).
+    (width, height) = data[0:2]
+    w.write_int(width)
+    w.write_int(height)
+    nibbles = []
+    for value in data[2:2 + width * height]:
+        if value is None:
+            nibbles.append(0)
+        elif 0 <= value < 15:
+            nibbles.append(value + 1)
+        else:
+            raise ValueError('Cell value %r cannot be saved' % value)
+    if len(nibbles) % 2:
+        nibbles.append(0)
+    w.out.extend(bytes(nibbles[i] | (nibbles[i + 1] << 4)
+                       for i in range(0, len(nibbles), 2)))
+
+
+def _read_board(r):
+    width = r.read_int()
+    height = r.read_int()
+    count = width * height
+    nibbles = []
+    for byte in r.read_bytes((count + 1) // 2):
+        nibbles.append(byte & 0x0f)
+        nibbles.append(byte >> 4)
+    return [width, height] + [value - 1 if value else None
+                              for value in nibbles[:count]]
+
+
+def _write_move(w, data):
+    # Writes a move encoded as by history.MoveRecord.encode().
+    (move_x, move_y, removed_columns, cell_data) = data
+    w.write_int(move_x)
+    w.write_int(move_y)
+    w.write_int(len(removed_columns))
+    prev_x = 0
+    for x in removed_columns:
+        w.write_int(x - prev_x)
+        prev_x = x
+    w.write_int(len(cell_data) // 3)
+    (prev_x, prev_y) = (0, 0)
+    for i in range(0, len(cell_data), 3):
+        (x, y, value) = cell_data[i:i + 3]
+        # Cells are sorted, so within a column we write the step up from the
+        # previous cell, and otherwise the step across and the height.
+        w.write_int(x - prev_x)
+        if x == prev_x:
+            w.write_int(y - prev_y)
+        else:
+            w.write_int(y)
+        w.write_int(value)
+        (prev_x, prev_y) = (x, y)
+
+
+def _read_move(r):
+    move_x = r.read_int()
+    move_y = r.read_int()
+    removed_columns = []
+    x = 0
+    for i in range(r.read_int()):
+        x += r.read_int()
+        removed_columns.append(x)
+    cell_data = []
+    (x, y) = (0, 0)
+    for i in range(r.read_int()):
+        x_step = r.read_int()
+        if x_step == 0:
+            y += r.read_int()
+        else:
+            y = r.read_int()
+        x += x_step
+        cell_data.extend((x, y, r.read_int()))
+    return [move_x, move_y, removed_columns, cell_data]
+
+
+class _Writer(object):
+    # Accumulates encoded values in a bytearray.
+    def __init__(self):
+        self.out = bytearray()
+
+    def write_int(self, value):
+        value = (value << 1) if value >= 0 else ((-value << 1) - 1)
+        while value >= 0x80:
+            self.out.append((value & 0x7f) | 0x80)
+            value >>= 7
+        self.out.append(value)
+
+
+class _Reader(object):
+    # Reads encoded values from the front of a bytes object.
+    def __init__(self, data, pos=0):
+        self._data = data
+        self._pos = pos
+
+    def read_int(self):
+        value = 0
+        shift = 0
+        while True:
+            if self._pos >= len(self._data):
+                raise ValueError('Truncated save game')
+            byte = self._data[self._pos]
+            self._pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        if value & 1:
+            return -((value + 1) >> 1)
+        return value >> 1
+
+    def read_bytes(self, count):
+        if self._pos + count > len(self._data):
+            raise ValueError('Truncated save game')
+        data = self._data[self._pos:self._pos + count]
+        self._pos += count
+        return data
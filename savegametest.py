@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import json
+import unittest
+
+import boardgen
+import history
+import savegame
+
+
+class TestSaveGame(unittest.TestCase):
+
+    def testRoundTrip(self):
+        state = _make_state()
+        data = savegame.dumps(state)
+        self.assertTrue(savegame.is_compact(data))
+        self.assertEqual(savegame.loads(data), state)
+        self.assertTrue(len(data) < len(json.dumps(state)) / 4)
+
+    def testEmptyBoard(self):
+        state = _make_state()
+        state['board'] = [0, 0]
+        state['undo_moves'] = []
+        state['redo_moves'] = []
+        self.assertEqual(savegame.loads(savegame.dumps(state)), state)
+
+    def testPuzzlePack(self):
+        puzzles = []
+        for seed in range(3):
+            (b, winning_moves) = boardgen.generate_board(seed=seed,
+                                                         max_size=(8, 6))
+            puzzles.append(('seed %d' % seed, savegame.encode_board(b),
+                            winning_moves))
+        data = savegame.dumps_puzzle_pack(puzzles)
+        self.assertEqual(savegame.loads_puzzle_pack(data), puzzles)
+        self.assertRaises(ValueError, savegame.loads_puzzle, data)
+        self.assertRaises(ValueError, savegame.loads_puzzle_pack, data[:-1])
+
+    def testBadData(self):
+        self.assertFalse(savegame.is_compact(b'["Implode save game"]'))
+        data = savegame.dumps(_make_state())
+        self.assertRaises(ValueError, savegame.loads, data[:-1])
+        self.assertRaises(ValueError, savegame.loads, b'{}')
+
+
+def _make_state():
+    # Returns a game state dictionary for a hard level game with a few moves
+    # made and one of them undone.
+    (size, fragmentation) = boardgen.LEVELS[2]
+    (b, winning_moves) = boardgen.generate_board(
+        seed=7, fragmentation=fragmentation, max_size=size)
+    records = []
+    for move in winning_moves[:6]:
+        records.append(history.make_move(b, b.get_contiguous(*move)))
+    records[-1].undo(b)
+    data = [b.width, b.height]
+    for y in range(b.height):
+        for x in range(b.width):
+            data.append(b.get_value(x, y))
+    return {
+        'difficulty': 2,
+        'seed': 7,
+        'size': size,
+        'fragmentation': fragmentation,
+        'board': data,
+        'undo_moves': [record.encode() for record in records[:-1]],
+        'redo_moves': [records[-1].encode()],
+        'win_draw_flag': False,
+        'win_color': 0,
+        'winning_moves': winning_moves,
+    }
+
+
+if __name__ == '__main__':
+    unittest.main()
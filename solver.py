@@ -0,0 +1,240 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Puzzle solver that tests boards for solvability.
+#
+# The solver does a depth first search over the moves that can be made on a
+# board.  Boards are kept as bitboard.BitBoard objects, with empty columns
+# removed after each move the way the game removes them.  To cut the search
+# down we:
+#
+#   - Remember boards that were found to be unsolvable, keyed on their color
+#     bitmasks in sorted order, which doesn't depend on which colors are
+#     which.  The mirror image of each board is remembered with it.
+#   - Give up on a board as soon as any color has only one or two pieces
+#     left, since those pieces can never be part of a removable shape.
+#   - Order the moves to try with a heuristic, such as trying the moves that
+#     leave the fewest pieces of their color first.
+#
+# How long a search takes depends heavily on the move ordering, and the same
+# board can take a handful of boards to solve with one ordering and many
+# thousands with another.  So we search in rounds, each with a limit on the
+# number of boards examined, cycling through the orderings and doubling the
+# limit after each cycle.  The unsolvable boards found are kept from round to
+# round.  The search as a whole can be given a limit on the number of boards
+# it examines.
+
+import sys
+
+import bitboard
+import board
+import history
+
+# Default limit on the number of boards examined by solve().
+MAX_NODES = 20000
+
+# Limit on the number of boards examined in the first round of the search.
+_FIRST_ROUND_NODES = 100
+
+# Move orderings, as sort keys for (color index, bitmask, size) tuples given
+# the number of pieces of each color on the board.
+_ORDERINGS = (
+    lambda counts, g: (counts[g[0]] - g[2], -g[2]),
+    lambda counts, g: 0,
+    lambda counts, g: -g[2],
+    lambda counts, g: g[2],
+)
+
+
+def solve(b, max_nodes=MAX_NODES, is_cancelled=None):
+    """Searches for a sequence of moves that clears the given board.  Returns
+       a tuple (solvable, moves), where solvable is True if the board can be
+       cleared, False if it can't and None if the search gave up after
+       examining max_nodes boards (max_nodes may be None for no limit).  If
+       the board can be cleared, moves is a list of the moves that clear it,
+       each given as the lexographically smallest coordinate of the piece to
+       remove as the game records them; otherwise moves is None.
+
+       If is_cancelled is given, it is a function that is called as the
+       search goes and returns True if the search should give up.  The board
+       must have no holes in its columns, as is the case in play."""
+    return _solve(b, max_nodes, is_cancelled)[:2]
+
+
+def _solve(b, max_nodes, is_cancelled):
+    # Does the work of solve(), also returning the number of boards
+    # examined.
+    state = bitboard.from_board(b)
+    counts = state.get_counts()
+    if any(count < 3 for count in counts):
+        return (False, None, 0)
+
+    search = _Search(is_cancelled)
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, state.width * state.height + 100))
+    try:
+        round_nodes = _FIRST_ROUND_NODES
+        i = 0
+        while max_nodes is None or search.nodes < max_nodes:
+            node_limit = search.nodes + round_nodes
+            if max_nodes is not None:
+                node_limit = min(node_limit, max_nodes)
+            moves = search.search(state, counts, _ORDERINGS[i], node_limit)
+            if moves is not None:
+                moves.reverse()
+                return (True, moves, search.nodes)
+            if not search.gave_up:
+                return (False, None, search.nodes)
+            if search.cancelled:
+                break
+            i = (i + 1) % len(_ORDERINGS)
+            if i == 0:
+                round_nodes *= 2
+    finally:
+        sys.setrecursionlimit(limit)
+    return (None, None, search.nodes)
+
+
+def is_solvable(b, max_nodes=MAX_NODES, is_cancelled=None):
+    """Returns True if the given board can be cleared, False if it can't and
+       None if the search gave up."""
+    return solve(b, max_nodes, is_cancelled)[0]
+
+
+def get_winning_prefix_length(moves, winning_moves):
+    """Returns the number of moves at the start of moves that match the
+       beginning of winning_moves, the list of moves known to clear the
+       puzzle."""
+    count = 0
+    for (move, winning_move) in zip(moves, winning_moves):
+        if tuple(move) != tuple(winning_move):
+            break
+        count += 1
+    return count
+
+
+def get_solvable_undo_count(b, undo_moves, winning_moves,
+                            max_total_nodes=None, max_nodes=MAX_NODES,
+                            is_cancelled=None):
+    """Returns the number of moves to undo to get back from the given board
+       to one that can be cleared, or None if cancelled.  undo_moves is the
+       list of moves that led to the board, oldest first, each encoded as by
+       history.MoveRecord.encode(), and winning_moves the list of moves known
+       to clear the puzzle.  Boards the search gives up on are taken to be
+       unsolvable, unless the moves that led to them match the beginning of
+       winning_moves.  max_nodes is the limit for each board tested, and
+       max_total_nodes (if given) the limit for all of them together, after
+       which we fall back on winning_moves."""
+    b = b.clone()
+    moves = [(data[0], data[1]) for data in undo_moves]
+    prefix_length = get_winning_prefix_length(moves, winning_moves)
+    total_nodes = 0
+    for i in range(len(moves), prefix_length, -1):
+        node_limit = max_nodes
+        if max_total_nodes is not None:
+            if total_nodes >= max_total_nodes:
+                break
+            node_limit = max_total_nodes - total_nodes
+            if max_nodes is not None:
+                node_limit = min(node_limit, max_nodes)
+        (solvable, solution, nodes) = _solve(b, node_limit, is_cancelled)
+        total_nodes += nodes
+        if is_cancelled is not None and is_cancelled():
+            return None
+        if solvable:
+            return len(moves) - i
+        history.decode_move(undo_moves[i - 1]).undo(b)
+    return len(moves) - prefix_length
+
+
+class _Search(object):
+    # Depth first search state, kept across the rounds of a search.
+    def __init__(self, is_cancelled):
+        self._is_cancelled = is_cancelled
+
+        # Number of boards examined so far.
+        self.nodes = 0
+
+        # True if the last round stopped at its limit or was cancelled.
+        self.gave_up = False
+        self.cancelled = False
+
+        # Keys of boards known to be unsolvable, both ways round.
+        self._dead = set()
+
+    def search(self, state, counts, ordering, node_limit):
+        # Returns the moves that clear the board in reverse order, or None.
+        self.gave_up = False
+        return self._search(state, counts, ordering, node_limit)
+
+    def _search(self, state, counts, ordering, node_limit):
+        # Counts holds the number of pieces of each color on the board, and is
+        # restored before returning.
+        if state.is_empty():
+            return []
+        key = state.get_key()
+        if key in self._dead:
+            return None
+        if self.nodes >= node_limit:
+            self.gave_up = True
+            return None
+        if self._is_cancelled is not None and self._is_cancelled():
+            self.gave_up = True
+            self.cancelled = True
+            return None
+        self.nodes += 1
+
+        groups = [(i, group, bitboard.count_bits(group))
+                  for (i, group) in state.groups()]
+        groups.sort(key=lambda g: ordering(counts, g))
+        for (i, group, size) in groups:
+            remaining = counts[i] - size
+            if 0 < remaining < 3:
+                continue
+            counts[i] = remaining
+            moves = self._search(state.remove(group), counts, ordering,
+                                 node_limit)
+            counts[i] += size
+            if moves is not None:
+                moves.append(state.get_min_coord(group))
+                return moves
+            if self.gave_up:
+                return None
+        self._dead.add(key)
+        self._dead.add(state.get_mirrored_key())
+        return None
+
+
+def main():
+    import boardgen
+    import time
+    (size, fragmentation) = boardgen.LEVELS[1]
+    for seed in range(10):
+        (b, winning_moves) = boardgen.generate_board(
+            seed=seed, fragmentation=fragmentation, max_size=size)
+        start = time.time()
+        (solvable, moves) = solve(b, max_nodes=None)
+        print('seed %d: %s, %d moves, %.3fs' %
+              (seed, solvable, len(moves or []), time.time() - start))
+    (b, winning_moves) = boardgen.generate_board(seed=0, max_size=(8, 6))
+    board.dump_board(b)
+    print(solve(b, max_nodes=None))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import random
+import unittest
+
+import bitboard
+import board
+import boardgen
+import history
+import solver
+import testutil
+
+
+class TestSolve(unittest.TestCase):
+
+    def testGenerated(self):
+        (size, fragmentation) = boardgen.LEVELS[1]
+        for seed in range(10):
+            (b, winning_moves) = boardgen.generate_board(
+                seed=seed, fragmentation=fragmentation, max_size=size)
+            (solvable, moves) = solver.solve(b)
+            self.assertTrue(solvable)
+            self._assertClears(b, moves)
+
+    def testNoMoves(self):
+        b = testutil.make_board("""121
+                                    212
+                                    121""")
+        self.assertEqual(solver.solve(b), (False, None))
+
+    def testFewPieces(self):
+        b = testutil.make_board("""2..
+                                    111""")
+        self.assertEqual(solver.solve(b), (False, None))
+
+    def testColumnRemoval(self):
+        b = testutil.make_board("""121
+                                    121
+                                    121""")
+        (solvable, moves) = solver.solve(b)
+        self.assertTrue(solvable)
+        self._assertClears(b, moves)
+
+    def testNodeLimit(self):
+        (size, fragmentation) = boardgen.LEVELS[1]
+        (b, winning_moves) = boardgen.generate_board(
+            seed=0, fragmentation=fragmentation, max_size=size)
+        self.assertEqual(solver.solve(b, max_nodes=1), (None, None))
+
+    def testSmallBoards(self):
+        # Compares the solver with an exhaustive search on small random
+        # boards.
+        r = random.Random(0)
+        for i in range(200):
+            b = board.Board()
+            for x in range(4):
+                for y in range(r.randint(1, 3)):
+                    b.set_value(x, y, r.randint(0, 2))
+            (solvable, moves) = solver.solve(b, max_nodes=None)
+            self.assertEqual(solvable, _can_clear(b))
+            if solvable:
+                self._assertClears(b, moves)
+
+    def testSolvableUndoCount(self):
+        # Plays random moves on small random boards, and compares the number
+        # of moves to undo with an exhaustive search.
+        r = random.Random(0)
+        for i in range(50):
+            b = board.Board()
+            for x in range(4):
+                for y in range(r.randint(1, 3)):
+                    b.set_value(x, y, r.randint(0, 2))
+            boards = [b.clone()]
+            records = []
+            while b.has_any_move():
+                records.append(history.make_move(
+                    b, r.choice(b.get_all_contiguous())))
+                boards.append(b.clone())
+            count = len(records)
+            for k in range(len(records), 0, -1):
+                if _can_clear(boards[k]):
+                    count = len(records) - k
+                    break
+            undo_moves = [record.encode() for record in records]
+            self.assertEqual(solver.get_solvable_undo_count(
+                b, undo_moves, [], max_nodes=None), count)
+            self.assertEqual(b, boards[-1])
+            if records:
+                winning_moves = [record.move for record in records[:1]]
+                self.assertEqual(solver.get_solvable_undo_count(
+                    b, undo_moves, winning_moves, max_nodes=None),
+                    min(count, len(records) - 1))
+
+    def testUndoCountTotalNodes(self):
+        # Once the search has used up its total budget, the answer falls
+        # back on the winning moves.
+        r = random.Random(1)
+        (size, fragmentation) = boardgen.LEVELS[0]
+        (b, winning_moves) = boardgen.generate_board(
+            seed=1, fragmentation=fragmentation, max_size=size)
+        records = [history.make_move(b, b.get_contiguous(*winning_moves[0]))]
+        while b.has_any_move():
+            records.append(history.make_move(
+                b, r.choice(b.get_all_contiguous())))
+        moves = [record.move for record in records]
+        self.assertEqual(
+            solver.get_winning_prefix_length(moves, winning_moves), 1)
+        undo_moves = [record.encode() for record in records]
+        self.assertEqual(solver.get_solvable_undo_count(
+            b, undo_moves, winning_moves, 0), len(records) - 1)
+        count = solver.get_solvable_undo_count(b, undo_moves, winning_moves)
+        self.assertTrue(0 < count < len(records) - 1)
+        self.assertEqual(solver.get_solvable_undo_count(
+            b, undo_moves, winning_moves, solver.MAX_NODES * len(records)),
+            count)
+
+    def testKey(self):
+        state = bitboard.from_columns(((1, 2), (2,), (3, 3, 1)))
+        mirrored = bitboard.from_columns(((2, 2, 3), (1,), (3, 1)))
+        self.assertEqual(state.get_mirrored_key(), mirrored.get_key())
+        self.assertEqual(state.get_key(), mirrored.get_mirrored_key())
+        self.assertNotEqual(
+            state.get_key(),
+            bitboard.from_columns(((1, 2), (2,), (3, 1, 1))).get_key())
+
+    def _assertClears(self, b, moves):
+        b = b.clone()
+        for move in moves:
+            contiguous = b.get_contiguous(*move)
+            self.assertTrue(len(contiguous) >= 3)
+            self.assertEqual(min(contiguous), move)
+            history.make_move(b, contiguous)
+        self.assertTrue(b.is_empty())
+
+
+def _can_clear(b):
+    # Returns True if some sequence of moves clears the board.
+    if b.is_empty():
+        return True
+    for contiguous in b.get_all_contiguous():
+        b2 = b.clone()
+        history.make_move(b2, contiguous)
+        if _can_clear(b2):
+            return True
+    return False
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Runs the puzzle solver in a worker process so that testing boards for
+# solvability, and working out how many moves to undo to get back to a
+# solvable board, don't hold up the user interface.
+#
+# Boards are sent to the worker over a job queue and answers come back over
+# a result queue, where a thread in our process waits for them and hands
+# them to a dispatch function (such as GLib.idle_add) to deliver on the main
+# loop.  Each job has an id, and the id of the current job is kept in shared
+# memory.  Submitting a new job or cancelling makes the earlier job stale,
+# and the worker checks for that as it searches so it can move on to the
+# next job straight away.
+
+import logging
+import multiprocessing
+import threading
+
+import solver
+
+_logger = logging.getLogger('implode-activity.solverworker')
+
+# Time to wait for the worker process to finish when stopping, in seconds.
+_STOP_TIMEOUT = 1.0
+
+
+class SolverWorker(object):
+    """Object that tests boards for solvability in a worker process."""
+    def __init__(self, dispatch=None, max_nodes=solver.MAX_NODES):
+        """dispatch is a function that takes a function and its arguments and
+           arranges for it to be called on the main loop, such as
+           GLib.idle_add.  If dispatch is None, results are delivered from a
+           background thread.  max_nodes is the default limit on the number of
+           boards the solver examines for each board tested."""
+        self._dispatch = dispatch
+        self._max_nodes = max_nodes
+        self._process = None
+        self._jobs = None
+        self._results = None
+        self._reader = None
+        self._current_job = multiprocessing.Value('i', 0)
+        self._callback = None
+
+    def submit(self, b, callback):
+        """Starts testing the given board for solvability, cancelling any
+           earlier test.  callback is called with True if the board can be
+           cleared or False if it can't.  It isn't called if the solver gives
+           up or the test is cancelled."""
+        self._submit(callback, self._max_nodes, solver.is_solvable,
+                     b.clone())
+
+    def submit_undo_count(self, b, undo_moves, winning_moves, callback,
+                          max_nodes=None, max_total_nodes=None):
+        """Starts working out the number of moves to undo to get back from
+           the given board to one that can be cleared, cancelling any earlier
+           job, as solver.get_solvable_undo_count() does.  undo_moves is the
+           list of history.MoveRecord objects that led to the board, oldest
+           first.  callback is called with the number of moves, unless the
+           job is cancelled.  max_nodes overrides the limit given to the
+           constructor, and max_total_nodes limits the boards examined for
+           all the boards tested together."""
+        if max_nodes is None:
+            max_nodes = self._max_nodes
+        self._submit(callback, max_nodes, solver.get_solvable_undo_count,
+                     b.clone(), [record.encode() for record in undo_moves],
+                     list(winning_moves), max_total_nodes)
+
+    def cancel(self):
+        """Cancels the current test, if any."""
+        self._next_job()
+        self._callback = None
+
+    def stop(self):
+        """Cancels the current test and stops the worker process."""
+        self.cancel()
+        if self._process is None:
+            return
+        self._jobs.put(None)
+        self._results.put(None)
+        self._process.join(_STOP_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._reader.join(_STOP_TIMEOUT)
+        self._process = None
+
+    def _submit(self, callback, max_nodes, func, *args):
+        # Queues a job to call func with the given arguments in the worker
+        # process, replacing the current job.
+        self._start()
+        job_id = self._next_job()
+        self._callback = callback
+        self._jobs.put((job_id, max_nodes, func, args))
+
+    def _start(self):
+        # Starts the worker process and result reader thread if needed.
+        if self._process is not None:
+            return
+        self._jobs = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_worker_main,
+            args=(self._jobs, self._results, self._current_job))
+        self._process.daemon = True
+        self._process.start()
+        self._reader = threading.Thread(target=self._read_results)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _next_job(self):
+        # Makes the current job stale and returns the id for the next one.
+        with self._current_job.get_lock():
+            self._current_job.value += 1
+            return self._current_job.value
+
+    def _read_results(self):
+        # Waits for results from the worker process and dispatches them.
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            if self._dispatch is None:
+                self._deliver(*result)
+            else:
+                self._dispatch(self._deliver, *result)
+
+    def _deliver(self, job_id, result):
+        # Calls the callback for the result if the job is still current.
+        callback = self._callback
+        if job_id == self._current_job.value and callback is not None:
+            self._callback = None
+            callback(result)
+        return False
+
+
+def _worker_main(jobs, results, current_job):
+    # Runs the jobs from the job queue until given None.  Each job calls a
+    # solver function, which gives None if it gives up or is cancelled.
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        (job_id, max_nodes, func, args) = job
+
+        def is_cancelled():
+            return current_job.value != job_id
+
+        if is_cancelled():
+            continue
+        try:
+            result = func(*args, max_nodes=max_nodes,
+                          is_cancelled=is_cancelled)
+        except Exception:
+            _logger.exception('Solver failed')
+            continue
+        if result is not None and not is_cancelled():
+            results.put((job_id, result))
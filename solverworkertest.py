@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import queue
+import random
+import unittest
+
+import boardgen
+import history
+import solver
+import solverworker
+import testutil
+
+# Time to wait for a result, in seconds.
+_TIMEOUT = 30
+
+
+class TestSolverWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.worker = solverworker.SolverWorker()
+        self.results = queue.Queue()
+
+    def tearDown(self):
+        self.worker.stop()
+
+    def testSolvable(self):
+        (size, fragmentation) = boardgen.LEVELS[1]
+        (b, winning_moves) = boardgen.generate_board(
+            seed=0, fragmentation=fragmentation, max_size=size)
+        self.worker.submit(b, self.results.put)
+        self.assertEqual(self.results.get(timeout=_TIMEOUT), True)
+
+    def testUnsolvable(self):
+        self.worker.submit(testutil.make_board("""211
+                                                   122
+                                                   211"""), self.results.put)
+        self.assertEqual(self.results.get(timeout=_TIMEOUT), False)
+
+    def testUndoCount(self):
+        # Plays random moves until stuck, and checks the answer from the
+        # worker against the solver run directly.
+        r = random.Random(0)
+        (size, fragmentation) = boardgen.LEVELS[0]
+        (b, winning_moves) = boardgen.generate_board(
+            seed=2, fragmentation=fragmentation, max_size=size)
+        records = []
+        while b.has_any_move():
+            records.append(history.make_move(
+                b, r.choice(b.get_all_contiguous())))
+        expected = solver.get_solvable_undo_count(
+            b, [record.encode() for record in records], winning_moves)
+        self.assertTrue(expected > 0)
+        self.worker.submit_undo_count(b, records, winning_moves,
+                                      self.results.put)
+        self.assertEqual(self.results.get(timeout=_TIMEOUT), expected)
+        moves = [record.move for record in records]
+        self.worker.submit_undo_count(b, records, winning_moves,
+                                      self.results.put, max_total_nodes=0)
+        self.assertEqual(
+            self.results.get(timeout=_TIMEOUT),
+            len(moves) - solver.get_winning_prefix_length(moves,
+                                                          winning_moves))
+
+    def testSupersede(self):
+        # Only the result for the last board submitted is delivered.
+        (size, fragmentation) = boardgen.LEVELS[2]
+        (b, winning_moves) = boardgen.generate_board(
+            seed=0, fragmentation=fragmentation, max_size=size)
+        self.worker.submit(b, lambda solvable: self.results.put('stale'))
+        self.worker.submit(testutil.make_board("""111"""), self.results.put)
+        self.assertEqual(self.results.get(timeout=_TIMEOUT), True)
+        self.worker.submit(b, self.results.put)
+        self.worker.cancel()
+        self.worker.submit(testutil.make_board("""121"""), self.results.put)
+        self.assertEqual(self.results.get(timeout=_TIMEOUT), False)
+        self.assertTrue(self.results.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
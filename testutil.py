@@ -0,0 +1,44 @@
+#!/usr/bin/python3
+#
+# Copyright (C) 2007-2009, Joseph C. Lee
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+"""Helpers shared by the unit tests."""
+
+import board
+
+
+def make_board(s, board_class=board.Board):
+    """Return a board built from the given string, top row first.  '.' is
+       an empty cell, '*' is -1 and a digit is a piece of that color."""
+    b = board_class()
+    lines = [x.strip() for x in s.strip().splitlines()]
+
+    if len(lines) == 0:
+        return b
+
+    # Make sure all lines are the same length.
+    lens = [len(x) for x in lines]
+    assert len(set(lens)) == 1
+
+    val_map = {'.': None, '*': -1}
+    for i in range(1, 9 + 1):
+        val_map[str(i)] = i
+
+    for (i, line) in enumerate(reversed(lines)):
+        for (j, ch) in enumerate(line):
+            b.set_value(j, i, val_map[ch])
+
+    return b